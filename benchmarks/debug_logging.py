@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Cost of the debug calls left on the hot paths while the logging level is INFO. Each debug call is timed against no
+call at all, against an empty call with the same arguments, and against the eager formatting the calls used to do.
+disabled_overhead is what a debug call adds to a hot path compared to no logging, call_overhead the part of it any
+Python call costs.
+
+    python -m benchmarks.debug_logging --number 1000000
+"""
+import json
+import timeit
+import logging
+import argparse
+from collections import namedtuple
+
+from socketio.engine.socket import Socket, logger
+
+FakeSocket = namedtuple('FakeSocket', ['ready_state', 'id'])
+
+packet = {'type': 'message', 'data': u'2["chat message",{"text":"hello","room":"lobby"}]'}
+
+
+def noop(self, message, *args):
+    pass
+
+
+def eager(self, message):
+    logger.debug(u"[EngineSocket][%s][id:%s] %s" % (self.ready_state, self.id, message))
+
+
+def measure(number):
+    socket = FakeSocket('open', 'Fyh1aq_Gcb8CYTYIAAAA')
+    debug = Socket.debug.__func__
+    cases = [
+        ('none', lambda: None),
+        ('noop', lambda: noop(socket, 'Received packet: %s', packet)),
+        ('lazy', lambda: debug(socket, 'Received packet: %s', packet)),
+        ('eager', lambda: eager(socket, 'Received packet: %s' % str(packet))),
+    ]
+    # Best of 3 runs, in nanoseconds per call
+    return dict((name, min(timeit.repeat(case, number=number, repeat=3)) / number * 1e9) for name, case in cases)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time debug calls with the logging level at INFO')
+    parser.add_argument('--number', type=int, default=1000000, help='calls per run')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = measure(args.number)
+    results = dict((name, round(ns, 1)) for name, ns in results.items())
+    results['disabled_overhead'] = round(results['lazy'] - results['none'], 1)
+    results['call_overhead'] = round(results['noop'] - results['none'], 1)
+    print(json.dumps(results, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+# coding=utf-8
+"""
+End-to-end scenarios, run by benchmarks.run against a benchmarks.server. The clients are engine clients speaking
+socket.io on the default namespace, so the measures don't include the socket.io client's own bookkeeping.
+
+    handshake   sessions opened per second over polling
+    throughput  echoed messages per second over one connection, with a window of messages in flight
+    latency     round trip of one message at a time
+    fanout      time from a broadcast until each of sockets clients received it
+
+Times are in milliseconds.
+"""
+import json
+import time
+import logging
+
+import gevent
+from gevent.event import Event, AsyncResult
+from gevent.lock import Semaphore
+from gevent.pool import Pool
+
+from socketio_client.engine.socket import Socket
+
+__all__ = ['Connection', 'percentiles', 'handshake', 'throughput', 'latency', 'fanout']
+
+logger = logging.getLogger(__name__)
+
+
+def percentiles(values):
+    """
+    :param values: list of milliseconds
+    :return: dict of count, mean, p50, p90, p99 and max
+    """
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def at(share):
+        return round(values[min(len(values) - 1, int(len(values) * share))], 3)
+
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': at(.5),
+        'p90': at(.9),
+        'p99': at(.99),
+        'max': round(values[-1], 3),
+    }
+
+
+class Connection(object):
+    """
+    One client session, events of the default namespace are dispatched to handlers
+    """
+
+    def __init__(self, host, port, transport='websocket'):
+        self.socket = Socket(host=host, port=port, transports=(transport,), upgrade=False)
+        self.opened = Event()
+        self.handlers = {}  # event -> callable receiving the event's data
+        self.job = None
+        self.socket.on('open', self.opened.set)
+        self.socket.on('message', self.on_message)
+
+    def open(self, timeout=10):
+        self.job = gevent.spawn(self.socket.open)
+        if not self.opened.wait(timeout):
+            self.close()
+            raise RuntimeError('session not open after %ss' % timeout)
+        return self
+
+    def on_message(self, data):
+        # socket.io EVENT packets of the default namespace, '2["event",data]'
+        if data[:1] == '2' and data[1:2] == '[':
+            event, payload = json.loads(data[1:])[:2]
+            handler = self.handlers.get(event, None)
+            if handler is not None:
+                handler(payload)
+
+    def emit(self, event, data):
+        self.socket.send('2' + json.dumps([event, data]))
+
+    def close(self):
+        if self.socket.ready_state == 'open':
+            self.socket.send_packet('close')
+        self.socket.close()
+        if self.job is not None:
+            self.job.kill(block=False)
+
+
+def open_connections(host, port, count, transport='websocket', concurrency=100, timeout=10):
+    """
+    :return: (open connections, number of sessions which failed to open)
+    """
+    connections = []
+    failed = [0]
+
+    def connect(index):
+        try:
+            connections.append(Connection(host, port, transport).open(timeout))
+        except Exception:
+            failed[0] += 1
+
+    Pool(concurrency).map(connect, xrange(count))
+    return connections, failed[0]
+
+
+def handshake(host, port, count=1000, concurrency=50):
+    times = []
+    failed = [0]
+
+    def connect(index):
+        started = time.time()
+        try:
+            connection = Connection(host, port, 'polling').open()
+        except Exception:
+            failed[0] += 1
+            return
+        times.append((time.time() - started) * 1000)
+        connection.close()
+
+    started = time.time()
+    Pool(concurrency).map(connect, xrange(count))
+    seconds = time.time() - started
+    return {
+        'handshakes': len(times),
+        'failed': failed[0],
+        'per_second': round(len(times) / seconds, 1),
+        'handshake_ms': percentiles(times),
+    }
+
+
+def throughput(host, port, transport='websocket', messages=10000, window=100, timeout=60):
+    connection = Connection(host, port, transport).open()
+    in_flight = Semaphore(window)
+    done = Event()
+    received = [0]
+
+    def on_echo(data):
+        received[0] += 1
+        in_flight.release()
+        if received[0] == messages:
+            done.set()
+    connection.handlers['echo'] = on_echo
+
+    started = time.time()
+    try:
+        for index in xrange(messages):
+            in_flight.acquire()
+            connection.emit('echo', index)
+        done.wait(timeout)
+    finally:
+        seconds = time.time() - started
+        connection.close()
+
+    return {
+        'transport': transport,
+        'messages': received[0],
+        'window': window,
+        'per_second': round(received[0] / seconds, 1),
+    }
+
+
+def latency(host, port, transport='websocket', count=1000, timeout=5):
+    connection = Connection(host, port, transport).open()
+    times = []
+    result = [None]
+
+    def on_echo(data):
+        result[0].set(data)
+    connection.handlers['echo'] = on_echo
+
+    try:
+        for index in xrange(count):
+            result[0] = AsyncResult()
+            started = time.time()
+            connection.emit('echo', index)
+            result[0].get(timeout=timeout)
+            times.append((time.time() - started) * 1000)
+    finally:
+        connection.close()
+
+    return {'transport': transport, 'round_trip_ms': percentiles(times)}
+
+
+def fanout(host, port, sockets=1000, rounds=5, timeout=30):
+    connections, failed = open_connections(host, port, sockets)
+    deliveries = []  # ms from the broadcast to each delivery
+    completions = []  # ms from the broadcast to the last delivery of a round
+    state = {'round': None, 'pending': 0, 'done': Event()}
+
+    def on_fanout(data):
+        if data['round'] != state['round']:
+            return
+        deliveries.append((time.time() - data['sent']) * 1000)
+        state['pending'] -= 1
+        if state['pending'] == 0:
+            completions.append(deliveries[-1])
+            state['done'].set()
+
+    for connection in connections:
+        connection.handlers['fanout'] = on_fanout
+
+    try:
+        for index in xrange(rounds if connections else 0):
+            state.update({'round': index, 'pending': len(connections), 'done': Event()})
+            connections[0].emit('broadcast', {'round': index, 'sent': time.time()})
+            if not state['done'].wait(timeout):
+                logger.warning('fanout round %d: %d sockets not reached after %ss', index, state['pending'], timeout)
+    finally:
+        for connection in connections:
+            connection.close()
+
+    return {
+        'sockets': len(connections),
+        'failed': failed,
+        'rounds': rounds,
+        'delivery_ms': percentiles(deliveries),
+        'complete_ms': percentiles(completions),
+    }
@@ -0,0 +1,247 @@
+# coding=utf-8
+"""
+Micro benchmarks of the hot paths: engine parser, socket.io encoder and decoder, binary (de)construction, has_bin, event
+emitter and adapter broadcast. Each case is calibrated to run at least min_time seconds, the best of repeat runs is
+reported as ops per second.
+
+Allocations per operation are not measured, CPython 2 has no allocation counter. Next to the rate each case reports
+net_gc_objects_per_op: the change of the collector's generation 0 count over the runs, with the collector disabled,
+per operation. That count goes up when a gc tracked object (dict, list, ...) is created and down when one is freed, so
+temporaries freed within the operation cancel out. What shows is what outlives it: reference cycles only the collector
+frees (eg. recursive closures), growing caches, leaks.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --case engine_ --case broadcast --output micro.jsonl
+"""
+import gc
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+from collections import OrderedDict, namedtuple
+
+from socketio import has_bin
+from socketio import parser as socketio_parser
+from socketio.binary import Binary
+from socketio.engine.parser import Parser
+from socketio.event_emitter import EventEmitter
+
+__all__ = ['cases', 'measure', 'main']
+
+timer = timeit.default_timer
+
+text = '2["chat message",{"text":"hello everyone","room":"lobby","at":1413187461}]'
+blob = bytearray('\x00\x01\x02\x03' * 256)
+event_data = ['chat message', {'text': 'hello everyone', 'room': 'lobby', 'tags': ['a', 'b', 'c'],
+                               'author': {'id': 42, 'name': 'lily'}}]
+binary_data = ['upload', {'name': 'picture.png', 'chunks': [blob, blob], 'meta': {'size': 2048}}]
+
+
+def engine_cases():
+    text_packet = {'type': 'message', 'data': text}
+    binary_packet = {'type': 'message', 'data': blob}
+    text_payload = Parser.encode_payload([text_packet] * 10, supports_binary=False)
+    binary_payload = Parser.encode_payload([text_packet, binary_packet] * 5, supports_binary=True)
+    encoded_text = Parser.encode_packet(text_packet)
+    encoded_binary = Parser.encode_packet(binary_packet)
+
+    return [
+        ('engine_encode_packet_text', lambda: Parser.encode_packet(text_packet)),
+        ('engine_encode_packet_binary', lambda: Parser.encode_packet(binary_packet)),
+        ('engine_encode_packet_base64', lambda: Parser.encode_packet(binary_packet, supports_binary=False)),
+        ('engine_decode_packet_text', lambda: Parser.decode_packet(encoded_text)),
+        ('engine_decode_packet_binary', lambda: Parser.decode_packet(encoded_binary)),
+        ('engine_encode_payload_text_10', lambda: Parser.encode_payload([text_packet] * 10, supports_binary=False)),
+        ('engine_encode_payload_binary_10',
+         lambda: Parser.encode_payload([text_packet, binary_packet] * 5, supports_binary=True)),
+        ('engine_decode_payload_text_10', lambda: list(Parser.decode_payload(text_payload))),
+        ('engine_decode_payload_binary_10', lambda: list(Parser.decode_payload(binary_payload))),
+    ]
+
+
+def socketio_cases():
+    event = {'type': socketio_parser.EVENT, 'nsp': '/chat', 'data': event_data}
+    binary_event = {'type': socketio_parser.BINARY_EVENT, 'nsp': '/chat', 'id': 7, 'data': binary_data}
+    encoded_event = socketio_parser.Encoder.encode(event)[0]
+    encoded_binary_event = socketio_parser.Encoder.encode(binary_event)
+
+    decoder = socketio_parser.Decoder()
+    decoder.on('decoded', lambda packet: None)
+
+    def decode_binary():
+        for part in encoded_binary_event:
+            decoder.add(part)
+
+    return [
+        ('socketio_encode_event', lambda: socketio_parser.Encoder.encode(event)),
+        ('socketio_encode_binary_event', lambda: socketio_parser.Encoder.encode(binary_event)),
+        ('socketio_decode_event', lambda: decoder.add(encoded_event)),
+        ('socketio_decode_binary_event', decode_binary),
+    ]
+
+
+def binary_cases():
+    binary_event = {'type': socketio_parser.BINARY_EVENT, 'nsp': '/', 'data': binary_data}
+
+    def reconstruct():
+        # Reconstruction works in place, the placeholder packet is built anew each time
+        packet = {'type': socketio_parser.BINARY_EVENT, 'nsp': '/', 'attachments': 2, 'data': [
+            'upload', {'name': 'picture.png', 'meta': {'size': 2048},
+                       'chunks': [{'_placeholder': True, 'num': 0}, {'_placeholder': True, 'num': 1}]}]}
+        return Binary.reconstruct_packet(packet, [blob, blob])
+
+    nested = {'user': {'id': 42, 'tags': ['a', 'b', 'c'], 'profile': {'name': 'lily', 'friends': range(20)}}}
+    return [
+        ('binary_deconstruct', lambda: Binary.deconstruct_packet(binary_event)),
+        ('binary_reconstruct', reconstruct),
+        ('has_bin_text', lambda: has_bin(['chat message', nested])),
+        ('has_bin_binary', lambda: has_bin(['chat message', nested, blob])),
+    ]
+
+
+def emitter_cases():
+    def listener(*args):
+        pass
+
+    one = EventEmitter()
+    one.on('message', listener)
+    five = EventEmitter()
+    for index in xrange(5):
+        five.on('message', listener)
+
+    return [
+        ('emitter_emit_1_listener', lambda: one.emit('message', 'hello')),
+        ('emitter_emit_5_listeners', lambda: five.emit('message', 'hello')),
+        ('emitter_emit_no_listener', lambda: one.emit('missing', 'hello')),
+    ]
+
+
+FakeServer = namedtuple('FakeServer', ['recovery', 'broadcast_recipients'])
+
+
+class FakeHistogram(object):
+    def observe(self, value):
+        pass
+
+
+class FakeSocket(object):
+    def __init__(self, id):
+        self.id = id
+
+    def packet(self, packet, pre_encoded=False, priority=None):
+        pass
+
+
+class FakeNamespace(object):
+    def __init__(self, sockets):
+        self.name = '/'
+        self.server = FakeServer(None, FakeHistogram())
+        self.connected = dict(('sid%d' % index, FakeSocket('sid%d' % index)) for index in xrange(sockets))
+
+
+def populated_adapter(sockets, rooms):
+    """
+    :param rooms: dict room -> (first socket, last socket) of the sockets joined to it
+    """
+    from socketio.adapter import Adapter
+
+    adapter = Adapter(FakeNamespace(sockets))
+    for index in xrange(sockets):
+        adapter.add('sid%d' % index, 'sid%d' % index)
+    for room, (first, last) in rooms.items():
+        for index in xrange(first, last):
+            adapter.add('sid%d' % index, room)
+    return adapter
+
+
+def broadcast_cases():
+    small = populated_adapter(1000, {})
+    large = populated_adapter(10000, {'lobby': (0, 100), 'game': (0, 1000), 'spectators': (500, 1500)})
+
+    def broadcast(adapter, rooms):
+        adapter.broadcast({'type': socketio_parser.EVENT, 'data': event_data}, {'rooms': rooms, 'flags': set()})
+
+    return [
+        ('broadcast_all_1000', lambda: broadcast(small, [])),
+        ('broadcast_all_10000', lambda: broadcast(large, [])),
+        ('broadcast_room_100_of_10000', lambda: broadcast(large, ['lobby'])),
+        ('broadcast_overlapping_rooms_1500_of_10000', lambda: broadcast(large, ['game', 'spectators'])),
+    ]
+
+
+def cases():
+    """
+    :return: OrderedDict name -> callable running one operation
+    """
+    return OrderedDict(engine_cases() + socketio_cases() + binary_cases() + emitter_cases() + broadcast_cases())
+
+
+def measure(func, min_time=.2, repeat=3):
+    """
+    :return: dict of ops_per_sec and net_gc_objects_per_op, see the module's doc
+    """
+    number = 1
+    while True:
+        started = timer()
+        for _ in xrange(number):
+            func()
+        if timer() - started >= min_time:
+            break
+        number *= 2
+
+    best = None
+    gc.collect()
+    gc.disable()
+    try:
+        before = gc.get_count()[0]
+        for _ in xrange(repeat):
+            started = timer()
+            for _ in xrange(number):
+                func()
+            seconds = timer() - started
+            best = seconds if best is None else min(best, seconds)
+        net_objects = gc.get_count()[0] - before
+    finally:
+        gc.enable()
+
+    return {
+        'ops_per_sec': round(number / best, 1),
+        'net_gc_objects_per_op': round(float(net_objects) / (number * repeat), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the micro benchmarks')
+    parser.add_argument('--case', action='append', dest='cases',
+                        help='run the cases whose name starts with this, repeat for several')
+    parser.add_argument('--min-time', type=float, default=.2, help='seconds each run lasts at least')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='file the results are appended to')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    results = OrderedDict()
+    for name, func in cases().items():
+        if args.cases and not name.startswith(tuple(args.cases)):
+            continue
+        results[name] = measure(func, args.min_time, args.repeat)
+        sys.stderr.write('%-45s %12.1f ops/s %8.3f net gc objects/op\n' % (
+            name, results[name]['ops_per_sec'], results[name]['net_gc_objects_per_op']))
+
+    from benchmarks.run import git_revision
+    report = json.dumps({
+        'started': started,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'results': results,
+    })
+    print(report)
+    if args.output:
+        with open(args.output, 'a') as output:
+            output.write(report + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# coding=utf-8
+"""
+Runs the end-to-end benchmarks against a local benchmarks.server started for the run, and prints the results as one
+json object. --output appends it to a file, one line per run, to track the results over time.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario latency --scenario fanout --sockets 1000 --sockets 10000 --output bench.jsonl
+
+Fan-out at 10000 sockets needs as many file descriptors in both processes, the soft limit is raised up to the hard one.
+"""
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import platform
+import subprocess
+
+__all__ = ['main']
+
+scenarios = ('handshake', 'throughput', 'latency', 'fanout')
+
+
+def raise_file_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def wait_listening(host, port, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), 1).close()
+            return
+        except socket.error:
+            if time.time() > deadline:
+                raise
+            time.sleep(.1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(host, port, args):
+    from benchmarks import e2e
+
+    results = {}
+    if 'handshake' in args.scenarios:
+        results['handshake'] = e2e.handshake(host, port, args.handshakes, args.concurrency)
+    if 'throughput' in args.scenarios:
+        results['throughput'] = [e2e.throughput(host, port, transport, args.messages, args.window)
+                                 for transport in ('websocket', 'polling')]
+    if 'latency' in args.scenarios:
+        results['latency'] = [e2e.latency(host, port, transport, args.round_trips)
+                              for transport in ('websocket', 'polling')]
+    if 'fanout' in args.scenarios:
+        results['fanout'] = [e2e.fanout(host, port, sockets, args.rounds) for sockets in args.sockets or (1000, 10000)]
+    return results
+
+
+def main(argv=None):
+    from gevent.monkey import patch_all
+    patch_all()
+
+    parser = argparse.ArgumentParser(description='Run the end-to-end benchmarks against a local server')
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=scenarios,
+                        help='scenario to run, repeat for several, all by default')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6544)
+    parser.add_argument('--handshakes', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50, help='handshakes in flight')
+    parser.add_argument('--messages', type=int, default=10000, help='messages per throughput run')
+    parser.add_argument('--window', type=int, default=100, help='messages in flight in throughput runs')
+    parser.add_argument('--round-trips', type=int, default=1000)
+    parser.add_argument('--sockets', type=int, action='append', help='fan-out population, 1000 and 10000 by default')
+    parser.add_argument('--rounds', type=int, default=5, help='broadcasts per fan-out population')
+    parser.add_argument('--output', help='file the results are appended to')
+    args = parser.parse_args(argv)
+    args.scenarios = args.scenarios or scenarios
+
+    logging.basicConfig(level=logging.WARNING)
+    raise_file_limit()
+
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.server', '--host', args.host,
+                               '--port', str(args.port)])
+    try:
+        wait_listening(args.host, args.port)
+        started = time.time()
+        results = run(args.host, args.port, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = json.dumps({
+        'started': started,
+        'seconds': round(time.time() - started, 3),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'results': results,
+    }, sort_keys=True)
+    print(report)
+    if args.output:
+        with open(args.output, 'a') as output:
+            output.write(report + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
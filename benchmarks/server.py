@@ -0,0 +1,59 @@
+# coding=utf-8
+"""
+Server the end-to-end benchmarks run against, in a process of its own so the clients don't share its hub. Clients of
+the default namespace can emit:
+
+    echo       emitted back to the sender as echo
+    broadcast  emitted to every client of the namespace as fanout
+
+    python -m benchmarks.server --port 6544
+"""
+import sys
+import logging
+import argparse
+
+
+def application(environ, start_response):
+    body = 'ok'
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def setup(server_context):
+    """
+    Register the benchmark events on the default namespace of server_context
+    """
+    namespace = server_context.of('/')
+
+    def on_connection(socket):
+        def echo(data):
+            socket.emit('echo', data)
+
+        def broadcast(data):
+            namespace.emit('fanout', data)
+
+        socket.on('echo', echo)
+        socket.on('broadcast', broadcast)
+
+    namespace.on('connection', on_connection)
+
+
+def main(argv=None):
+    from gevent.monkey import patch_all
+    patch_all()
+
+    from socketio.server import serve, SocketIOServer
+
+    parser = argparse.ArgumentParser(description='Server for the end-to-end benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6544)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    setup(SocketIOServer.default_server)
+    # No access log, writing it would be measured too
+    serve(application, host=args.host, port=args.port, log=None)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,7 +13,6 @@ setup(
   install_requires=[
     'greenlet==0.4.4',
     'gevent-websocket==0.9.3',
-    'WebOb==1.4',
     'requests==2.4.1',
     'ws4py==0.3.4',
   ],
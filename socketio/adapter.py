@@ -3,6 +3,7 @@
 The fork of socketio-adapter, which keeps track of all the sockets and able to broadcast packets
 """
 import parser
+from .socket import flags_priority
 
 
 class Adapter(object):
@@ -61,11 +62,11 @@ class Adapter(object):
         rooms = self.sids.get(id, None)
         if rooms:
             for room, flag in rooms.items():
-                if room in rooms:
-                    del rooms[room]
+                if room in self.rooms:
+                    self.rooms[room].pop(id, None)
 
-                if not self.rooms[room]:
-                    del self.rooms[room]
+                    if not self.rooms[room]:
+                        del self.rooms[room]
 
         if id in self.sids:
             del self.sids[id]
@@ -85,11 +86,18 @@ class Adapter(object):
         # ids set used to track which socket already send
         ids = set()
 
+        priority = flags_priority(options.get('flags', ()))
+
         packet['nsp'] = self.namespace.name
 
         # Encode once for all sockets
         encoded = parser.Encoder.encode(packet)
 
+        recovery = self.namespace.server.recovery
+        if recovery is not None:
+            # Sessions waiting for their client to reconnect get it replayed later
+            recovery.capture(self.namespace.name, rooms, encoded, exceptions)
+
         if len(rooms) > 0:
             for room in rooms:
                 if room not in self.rooms:
@@ -99,12 +107,17 @@ class Adapter(object):
                         continue
                     socket = self.namespace.connected[id]
                     if socket:
-                        socket.packet(encoded, pre_encoded=True)
+                        socket.packet(encoded, pre_encoded=True, priority=priority)
                         ids.add(socket.id)
+            sent = len(ids)
         else:
+            sent = 0
             for id in self.sids.keys():
                 if id in exceptions:
                     continue
                 socket = self.namespace.connected[id]
                 if socket:
-                    socket.packet(encoded, pre_encoded=True)
+                    socket.packet(encoded, pre_encoded=True, priority=priority)
+                    sent += 1
+
+        self.namespace.server.broadcast_recipients.observe(sent)
@@ -1,11 +1,16 @@
 # coding=utf-8
 import parser as Parser
 import logging
-from engine.socket import Socket as EngineSocket
+from engine.socket import Socket as EngineSocket, PRIORITY_HIGH, PRIORITY_NORMAL
 from .event_emitter import EventEmitter
+from .recovery import recorded_types
+from .engine import tracing
 
 logger = logging.getLogger(__name__)
 
+# Packets flushed ahead of application events
+high_priority_types = (Parser.CONNECT, Parser.ACK, Parser.BINARY_ACK, Parser.ERROR)
+
 
 class Client(EventEmitter):
     """
@@ -22,6 +27,11 @@ class Client(EventEmitter):
         self.namespace_socket = {}
         self.connect_buffer = []
 
+        # Connection state recovery, see socketio.recovery
+        self.session = server.recovery.session(self.id) if server.recovery is not None else None
+        self.recoverable = True
+        self.restored_rooms = {}
+
         self.decoder = Parser.Decoder()
         self.encoder = Parser.Encoder()
         self.setup()
@@ -36,14 +46,15 @@ class Client(EventEmitter):
         self.engine_socket.on('message', self.on_data, id(self))
         self.engine_socket.on('close', self.on_close, id(self))
 
-    def connect(self, name):
+    def connect(self, name, resumed=False):
         """
         Connect the client to a namespace
         :param name:
+        :param resumed: the client is already connected to it in the process which handed the connection over
         :return:
         """
 
-        self.debug('connecting to namespace %s' % name)
+        self.debug('connecting to namespace %s', name)
 
         if name not in self.server.namespaces:
             self.packet({
@@ -63,12 +74,67 @@ class Client(EventEmitter):
             self.sockets.append(socket)
             self.namespace_socket[name] = socket
 
+            for room in self.restored_rooms.pop(name, ()):
+                socket.join(room)
+
             if '/' == namespace.name and self.connect_buffer:
                 for n in self.connect_buffer:
                     self.connect(n)
                 self.connect_buffer = []
 
-        namespace.add(self, callback)
+        namespace.add(self, callback, resumed)
+
+    def recover(self):
+        """
+        Restore rooms and replay missed events if the client reconnects with the private id of its previous session
+        (pid) and the number of events it received (offset) in the query string, see socketio.recovery
+        """
+        pid = self.request.GET.get('pid', None)
+        if self.session is None or pid is None:
+            return
+
+        try:
+            offset = int(self.request.GET.get('offset', 0))
+        except ValueError:
+            return
+
+        restored = self.server.recovery.restore(pid, offset)
+        if restored is None:
+            self.debug('not able to recover the previous session')
+            return
+
+        rooms, missed = restored
+        self.debug('recovered the previous session, replaying %d events', len(missed))
+
+        for name, name_rooms in rooms.items():
+            self.restored_rooms[name] = name_rooms
+
+        for name, socket in self.namespace_socket.items():
+            for room in self.restored_rooms.pop(name, ()):
+                socket.join(room)
+
+        for encoded in missed:
+            self.packet(encoded, pre_encoded=True)
+
+    def resume(self, namespaces):
+        """
+        Connect the namespaces of a session taken over from another process, no connect packets are sent
+        :param namespaces: dict namespace name -> rooms, see state()
+        """
+        for name, rooms in namespaces.items():
+            self.restored_rooms[name] = [room for room in rooms if room != self.id]
+
+        self.connect('/', resumed=True)
+        for name in namespaces:
+            if name != '/':
+                self.connect(name, resumed=True)
+
+    def state(self):
+        """
+        :return: dict namespace name -> rooms of the connected namespaces
+        """
+        return dict((name, socket.adapter.sids.get(socket.id, {}).keys())
+                    for name, socket in self.namespace_socket.items())
 
     def disconnect(self):
         """
@@ -91,40 +157,55 @@ class Client(EventEmitter):
             del self.sockets[index]
             del self.namespace_socket[nsp]
         except ValueError:
-            self.debug('ignoring remove for %s' % socket.id)
+            self.debug('ignoring remove for %s', socket.id)
 
     def close(self):
         """
         Close the client
         :return:
         """
+        self.recoverable = False
         if self.engine_socket.ready_state == EngineSocket.STATE_OPEN:
             self.debug('forcing transport close')
             self.engine_socket.close()
             self.on_close('forced server close')
 
-    def packet(self, packet, pre_encoded=False):
+    def packet(self, packet, pre_encoded=False, priority=None):
         """
         Send out a packet
         :param packet: The packet
         :param pre_encoded: Whether the packet is pre encoded.
+        :param priority: The engine write buffer lane. Defaults to PRIORITY_HIGH for connect, ack and error packets
         :return:
         """
         if self.engine_socket.ready_state == EngineSocket.STATE_OPEN:
-            self.debug('writing packet %s' % str(packet))
+            self.debug('writing packet %s', packet)
 
             if not pre_encoded:
+                if priority is None:
+                    priority = PRIORITY_HIGH if packet['type'] in high_priority_types else PRIORITY_NORMAL
                 encoded_packets = self.encoder.encode(packet)
             else:
                 encoded_packets = packet
 
+            packet_type = int(encoded_packets[0][0])
+            self.server.packets_sent.inc(label=Parser.types_list[packet_type])
+            if self.session is not None and packet_type in recorded_types:
+                self.session.record(encoded_packets)
+
+            if priority is None:
+                priority = PRIORITY_NORMAL
+
+            # All parts of a binary packet share one lane, so attachments stay right behind their header
             for encoded in encoded_packets:
-                self.engine_socket.write(encoded)
+                self.engine_socket.write(encoded, priority)
 
     def on_data(self, data):
         self.decoder.add(data)
 
     def on_decoded(self, packet):
+        tracing.stage('socketio_decoded')
+        self.server.packets_received.inc(label=Parser.types_list[packet['type']])
         if Parser.CONNECT == packet['type']:
             self.connect(packet['nsp'])
         else:
@@ -137,12 +218,19 @@ class Client(EventEmitter):
             if socket:
                 socket.on_packet(packet)
             else:
-                self.debug('no socket for namespace %s' % packet['nsp'])
+                self.debug('no socket for namespace %s', packet['nsp'])
 
     def on_close(self, reason, *args, **kwargs):
-        self.debug("On Close %s" % reason)
+        self.debug("On Close %s", reason)
         self.destroy()
 
+        if self.session is not None:
+            if self.recoverable:
+                self.server.recovery.detach(self.session.pid, self.state())
+            else:
+                self.server.recovery.remove(self.session.pid)
+            self.session = None
+
         while self.sockets:
             socket = self.sockets.pop()
             socket.on_close(reason)
@@ -153,5 +241,6 @@ class Client(EventEmitter):
         self.engine_socket.remove_listeners_by_key(id(self))
         self.decoder.remove_listeners_by_key(id(self))
 
-    def debug(self, message):
-        logger.debug("[SocketIOClient][%s] %s" % (self.id, message))
\ No newline at end of file
+    def debug(self, message, *args):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SocketIOClient][%s] %s", self.id, message % args if args else message)
\ No newline at end of file
@@ -0,0 +1,121 @@
+# coding=utf-8
+"""
+Access log of the engine requests. Request greenlets only format a line and append it to a batch, a writer greenlet
+hands each batch to the hub's thread pool, so neither the request greenlets nor the hub wait on the disk.
+
+One line per request, gevent's access log format followed by the engine fields:
+
+    <client> - - [<time>] "<request line>" <status> <bytes> <seconds> <sid> <transport> <wait seconds>
+
+wait is how long the request was parked for the socket's response, the time a poll waited for packets to send. sid,
+transport and wait are - for requests which did not reach a session.
+
+Successful polls can be sampled, handshakes, websocket connections and errors are always logged.
+"""
+import time
+import random
+import logging
+
+import gevent
+from gevent.event import Event
+
+from .monitor import track
+
+__all__ = ['AccessLog']
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLog(object):
+    """
+    output: path of the log file, or a file like object
+    sample_rate: share of the successful polls logged, from 0 to 1
+    batch_size: lines written at once, the writer wakes up when a batch is full
+    flush_interval: seconds after which a partial batch is written
+    max_pending: lines kept while the writer falls behind, the following ones are dropped
+    """
+
+    def __init__(self, output, sample_rate=1, batch_size=500, flush_interval=1, max_pending=10000):
+        self.owns_file = isinstance(output, basestring)
+        self.file = open(output, 'a') if self.owns_file else output
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.lines = []
+        self.dropped = 0  # since the last batch
+        self.batch_full = Event()
+        self.job = None
+
+    def start(self):
+        if self.job is None:
+            self.job = track(gevent.spawn(self._run), 'access_log')
+
+    def stop(self):
+        if self.job is not None:
+            self.job.kill()
+            self.job = None
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+
+    def log(self, handler):
+        """
+        Queue the line of the request handler just answered
+        :param handler: engine.handler.EngineHandler, after the response is sent
+        """
+        status = (handler.status or '000').split(' ', 1)[0]
+        sid, transport, wait, handshake = handler.access_info or ('-', '-', None, False)
+        if (transport == 'polling' and not handshake and not status.startswith(('4', '5'))
+                and self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+
+        if len(self.lines) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        client_address = handler.client_address
+        if isinstance(client_address, tuple):
+            client_address = client_address[0]
+        finished = handler.time_finish or time.time()
+        self.lines.append('%s - - [%s] "%s" %s %s %.6f %s %s %s\n' % (
+            client_address or '-',
+            time.strftime('%d/%b/%Y %H:%M:%S', time.localtime(finished)),
+            handler.requestline or '',
+            status,
+            handler.response_length or '-',
+            finished - handler.time_start if handler.time_start else 0,
+            sid,
+            transport,
+            '%.6f' % wait if wait is not None else '-'))
+
+        if len(self.lines) >= self.batch_size:
+            self.batch_full.set()
+
+    def flush(self):
+        """
+        Write the queued lines, blocks the calling greenlet until they are written
+        """
+        if self.dropped:
+            logger.warning('[AccessLog] writer fell behind, dropped %d lines', self.dropped)
+            self.dropped = 0
+        if not self.lines:
+            return
+
+        lines, self.lines = self.lines, []
+        try:
+            gevent.get_hub().threadpool.apply(self._write, (''.join(lines),))
+        except Exception:
+            logger.exception('[AccessLog] writing %d lines failed', len(lines))
+
+    def _write(self, data):
+        # Runs in the thread pool
+        self.file.write(data)
+        self.file.flush()
+
+    def _run(self):
+        while True:
+            self.batch_full.wait(self.flush_interval)
+            self.batch_full.clear()
+            self.flush()
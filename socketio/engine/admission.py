@@ -0,0 +1,87 @@
+# coding=utf-8
+"""
+Admission control for handshakes. Under overload new sessions are refused with a 503 and a Retry-After hint at once,
+the sessions already open keep being served.
+"""
+import time
+import random
+import logging
+
+__all__ = ['AdmissionControl']
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionControl(object):
+    """
+    max_sessions: open sessions from which on handshakes are refused, None for no limit
+    rate: handshakes per second allowed from one client address, bursts up to burst. None for no limit
+    max_lag: seconds the hub may lag behind before handshakes are refused, None to not measure the lag. The lag is
+        the server's hub_lag, see engine.monitor.HubLag
+    retry_after: seconds refused clients are told to wait, randomized up to twice that so they don't come back at once
+    max_addresses: client addresses tracked for rate limiting, idle ones are dropped beyond that
+    """
+
+    def __init__(self, max_sessions=None, rate=None, burst=None, max_lag=None, retry_after=5, max_addresses=100000):
+        self.max_sessions = max_sessions
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.max_lag = max_lag
+        self.retry_after = retry_after
+        self.max_addresses = max_addresses
+
+        self.buckets = {}  # client address -> [tokens, time of the last refill]
+        self.overloaded = False  # refusing handshakes because of the lag
+
+    def check(self, server_context, address):
+        """
+        :param server_context: The engine Server
+        :param address: The client address
+        :return: None if the handshake is admitted, otherwise (reason, seconds the client should wait)
+        """
+        if self.max_lag is not None:
+            hub_lag = server_context.hub_lag
+            hub_lag.start()
+            overloaded = hub_lag.latest > self.max_lag
+            if overloaded and not self.overloaded:
+                logger.warning('[AdmissionControl] hub lagging %.3fs, refusing handshakes', hub_lag.latest)
+            self.overloaded = overloaded
+            if overloaded:
+                return 'server overloaded', self.retry_hint()
+
+        if self.max_sessions is not None and len(server_context.engine_sockets) >= self.max_sessions:
+            return 'too many sessions', self.retry_hint()
+
+        if self.rate is not None and not self._take_token(address):
+            return 'too many handshakes', max(1.0 / self.rate, self.retry_hint())
+
+        return None
+
+    def retry_hint(self):
+        return self.retry_after * random.uniform(1, 2)
+
+    def _take_token(self, address):
+        now = time.time()
+        bucket = self.buckets.get(address, None)
+        if bucket is None:
+            if len(self.buckets) >= self.max_addresses:
+                self._prune(now)
+            bucket = self.buckets[address] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _prune(self, now):
+        """
+        Drop the addresses whose bucket refilled, they are in the same state as an unknown address
+        """
+        refill = self.burst / float(self.rate)
+        for address, (tokens, refilled_at) in self.buckets.items():
+            if now - refilled_at >= refill:
+                del self.buckets[address]
+        logger.debug('[AdmissionControl] %d addresses tracked after pruning', len(self.buckets))
@@ -0,0 +1,162 @@
+# coding=utf-8
+"""
+Traffic capture. Records the engine packets of every session, inbound and outbound, with their time into a text file
+replayable by engine.replay. Paths ending in .gz are gzipped.
+
+One record per line, fields separated by spaces:
+
+    <ms since the capture started> <session number> O <sid> <transport>    session opened
+    <ms> <session number> < <packet>                                       packet from the client
+    <ms> <session number> > <packet>                                       packet to the client
+    <ms> <session number> C                                                session closed
+
+Packets are engine encoded with binary data in base64, then string escaped so they stay on one line.
+
+Like engine.access_log, the socket greenlets only format records and append them to a batch, a writer greenlet hands
+each batch to the hub's thread pool, so compressing and writing the file doesn't hold the hub.
+
+Like engine.monitor.track, the functions here return at once when no capture runs.
+"""
+import gzip
+import time
+import logging
+import itertools
+
+import gevent
+from gevent.event import Event
+
+from .parser import Parser
+from .monitor import track
+
+__all__ = ['Capture', 'encode_record', 'decode_record']
+
+logger = logging.getLogger(__name__)
+
+_active = None  # the running Capture
+
+header = '# engine capture v1\n'
+
+
+def encode_record(packet):
+    data = packet.get('data', None)
+    if type(data) is unicode:
+        packet = {'type': packet['type'], 'data': data.encode('utf-8')}
+    return Parser.encode_packet(packet, supports_binary=False, utf8_encoding=False).encode('string_escape')
+
+
+def decode_record(field):
+    """
+    :return: The engine packet encoded by encode_record, text data as a utf-8 str
+    """
+    return Parser.decode_packet(field.decode('string_escape'))
+
+
+def opened(socket):
+    if _active is not None:
+        _active.opened(socket)
+
+
+def packet(socket, direction, packet):
+    """
+    :param direction: '<' from the client, '>' to the client
+    """
+    if _active is not None:
+        _active.packet(socket, direction, packet)
+
+
+def closed(socket):
+    if _active is not None:
+        _active.closed(socket)
+
+
+class Capture(object):
+    """
+    Writes the traffic of all engine sockets opened while it runs to path
+
+    batch_size: records written at once, the writer wakes up when a batch is full
+    flush_interval: seconds after which a partial batch is written
+    max_pending: records kept while the writer falls behind, the following ones are dropped
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=1, max_pending=100000):
+        self.path = path
+        self.file = (gzip.open if path.endswith('.gz') else open)(path, 'ab')
+        self.file.write(header)
+        self.started = time.time()
+        self.numbers = itertools.count()
+        self.sessions = {}  # sid -> session number
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.records = []
+        self.dropped = 0  # since the last batch
+        self.batch_full = Event()
+        self.job = None
+
+    def start(self):
+        global _active
+        _active = self
+        if self.job is None:
+            self.job = track(gevent.spawn(self._run), 'capture')
+        logger.debug('[Capture] capturing to %s', self.path)
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+        if self.job is not None:
+            self.job.kill()
+            self.job = None
+        self.flush()
+        self.file.close()
+
+    def flush(self):
+        """
+        Write the queued records, blocks the calling greenlet until they are written
+        """
+        if self.dropped:
+            logger.warning('[Capture] writer fell behind, dropped %d records', self.dropped)
+            self.dropped = 0
+        if not self.records:
+            return
+
+        records, self.records = self.records, []
+        try:
+            gevent.get_hub().threadpool.apply(self._write_batch, (''.join(records),))
+        except Exception:
+            logger.exception('[Capture] writing %d records failed', len(records))
+
+    def _write_batch(self, data):
+        # Runs in the thread pool
+        self.file.write(data)
+        self.file.flush()
+
+    def _run(self):
+        while True:
+            self.batch_full.wait(self.flush_interval)
+            self.batch_full.clear()
+            self.flush()
+
+    def _write(self, number, *fields):
+        if len(self.records) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        self.records.append('%d %d %s\n' % ((time.time() - self.started) * 1000, number, ' '.join(fields)))
+        if len(self.records) >= self.batch_size:
+            self.batch_full.set()
+
+    def opened(self, socket):
+        number = self.sessions[socket.id] = next(self.numbers)
+        self._write(number, 'O', socket.id, socket.transport.name)
+
+    def packet(self, socket, direction, packet):
+        number = self.sessions.get(socket.id, None)
+        if number is not None:
+            self._write(number, direction, encode_record(packet))
+
+    def closed(self, socket):
+        number = self.sessions.pop(socket.id, None)
+        if number is not None:
+            self._write(number, 'C')
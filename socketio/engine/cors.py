@@ -0,0 +1,63 @@
+# coding=utf-8
+"""
+Cross origin rules for engine responses. Header tuples are computed once, when the policy is created.
+"""
+
+__all__ = ['CorsPolicy']
+
+
+class CorsPolicy(object):
+    """
+    origins: '*' allows every origin, the request's origin is echoed back with credentials allowed. Otherwise an
+    iterable of allowed origins, requests from other origins get no CORS headers.
+    max_age: seconds browsers may cache a preflight response
+    """
+
+    def __init__(self, origins='*', max_age=86400, methods='GET, POST, OPTIONS', allow_headers='Content-Type'):
+        self.origins = None if origins == '*' else frozenset(origins)
+        self.max_age = max_age
+
+        self.any_origin_headers = [('Access-Control-Allow-Origin', '*')]
+        self.preflight_only_headers = [
+            ('Access-Control-Allow-Methods', methods),
+            ('Access-Control-Allow-Headers', allow_headers),
+            ('Access-Control-Max-Age', str(max_age)),
+        ]
+
+        self.origin_headers = {}
+        self.preflight_headers = {}
+        for origin in self.origins or ():
+            self.origin_headers[origin] = self._origin_headers(origin)
+            self.preflight_headers[origin] = self.origin_headers[origin] + self.preflight_only_headers
+
+    @staticmethod
+    def _origin_headers(origin):
+        return [
+            ('Access-Control-Allow-Origin', origin),
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Vary', 'Origin'),
+        ]
+
+    def headers(self, origin):
+        """
+        CORS headers for a response
+        :param origin: The Origin request header, None if missing
+        :return: list of header tuples, empty if the origin is not allowed
+        """
+        if origin is None:
+            return self.any_origin_headers
+        if self.origins is None:
+            return self._origin_headers(origin)
+        return self.origin_headers.get(origin, [])
+
+    def preflight(self, origin):
+        """
+        Headers answering a preflight request
+        :param origin: The Origin request header, None if missing
+        :return: list of header tuples, None if the origin is not allowed
+        """
+        if origin is None:
+            return self.any_origin_headers + self.preflight_only_headers
+        if self.origins is None:
+            return self._origin_headers(origin) + self.preflight_only_headers
+        return self.preflight_headers.get(origin, None)
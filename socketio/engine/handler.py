@@ -1,12 +1,16 @@
 # coding=utf-8
 from __future__ import absolute_import
 
-import gevent
 from gevent.pywsgi import WSGIHandler
 import sys
-from webob import Request
+import json
+import math
+import time
+from .request import Request, parse_query
 from .response import Response
 from .socket import Socket
+from .sid import worker_of
+from .handoff import MarkedReader, buffered_bytes
 from ..event_emitter import EventEmitter
 from .transports import WebsocketTransport
 import logging
@@ -28,6 +32,7 @@ class EngineHandler(WSGIHandler, EventEmitter):
         EventEmitter.__init__(self)
 
         self.server_context = server_context
+        self.access_info = None  # (sid, transport, wait, handshake) of the current request, see log_request
 
         if self.server_context.transports:
             self.transports = self.server_context.transports
@@ -37,18 +42,37 @@ class EngineHandler(WSGIHandler, EventEmitter):
         # This is why we define /socket.io url in web frameworks and points them to a view
         logger.debug("[EngineHandler] Bind the framework specific info to engine socket")
         self.environ['engine_socket'] = socket
+        socket.context_bound_at = time.time()
 
         try:
 
             def start_response(status, headers):
-                logger.debug("[EngineHandler] [%s] [%s]" % (status, headers))
+                logger.debug("[EngineHandler] [%s] [%s]", status, headers)
 
             res = self.application(self.environ, start_response)
-            logger.debug("[EngineHandler] %s" % res)
+            logger.debug("[EngineHandler] %s", res)
         except Exception, e:
-            logger.debug("[EngineHandler] bind framework info met exception %s" % e)
+            logger.debug("[EngineHandler] bind framework info met exception %s", e)
             self.handle_error(*sys.exc_info())
 
+    def should_bind_framework_info(self, socket):
+        """
+        Whether the framework application should run again for a request of an existing socket, according to the
+        server's framework_refresh policy:
+        None: only at handshake, or after socket.refresh_context()
+        'always': on every request
+        number: when the context is older than that many seconds
+        """
+        if socket.context_bound_at is None:
+            return True
+
+        policy = self.server_context.framework_refresh
+        if policy is None:
+            return False
+        if policy == 'always':
+            return True
+        return time.time() - socket.context_bound_at > policy
+
     def handle_one_response(self):
         """
         There are 3 situations we get a new request:
@@ -58,24 +82,51 @@ class EngineHandler(WSGIHandler, EventEmitter):
 
         After the transport been upgraded, all data transferring handled by the WebSocketTransport
         """
+        self.access_info = None
         path = self.environ.get('PATH_INFO')
+        prefix = self.server_context.resource_prefix
+
+        if path.startswith('//'):
+            # Clients joining a base url ending with / to the resource send //socket.io/
+            path = '/' + path.lstrip('/')
 
-        if not path.lstrip('/').startswith(self.server_context.resource + '/'):
+        if not path.startswith(prefix):
             return super(EngineHandler, self).handle_one_response()
 
-        # Create a request and a response
-        request = Request(self.get_environ())
+        if self.environ['REQUEST_METHOD'] == 'OPTIONS':
+            return self._handle_preflight()
+
+        metrics_path = self.server_context.metrics_path
+        if metrics_path is not None and path == prefix + metrics_path:
+            return self._handle_metrics()
 
-        setattr(request, 'handler', self)
-        setattr(request, 'response', Response())
+        admin_path = self.server_context.admin_path
+        if admin_path is not None and path == prefix + admin_path:
+            return self._handle_admin()
 
-        logger.debug("[EngineHandler] Incoming request with %s" % request.GET)
+        # Create a request and a response, reusing the environ gevent already built for this request
+        request = Request(self.environ, handler=self, response=Response())
+
+        logger.debug("[EngineHandler] Incoming request with %s", request.GET)
+
+        if request.GET.get('sid', None) is None:
+            refusal = self.server_context.admit(self.remote_address())
+            if refusal is not None:
+                return self._refuse_handshake(*refusal)
 
         # Upgrade the websocket if needed
         is_websocket = False
         if request.GET.get("transport", None) == "websocket":
             if 'Upgrade' in request.headers:
+                if self._handoff_upgrade(request):
+                    return
+
                 logger.debug("[EngineHandler] It is a websocket upgrade request")
+                if self.server_context.takeover is not None:
+                    # Keep track of partly read messages, so the connection can be handed to a new process
+                    self.rfile = MarkedReader(self.socket, buffered_bytes(self.rfile))
+                    request.reader = self.rfile
+
                 # This is the ws upgrade request, here we handles the upgrade
                 ws_handler = self.server_context.ws_handler_class(self.socket, self.client_address, self.server)
                 ws_handler.__dict__.update(self.__dict__)
@@ -95,22 +146,18 @@ class EngineHandler(WSGIHandler, EventEmitter):
 
         socket = self.server_context.engine_sockets.get(sid, None)
 
-        # FIXME CHECK WHETHER WE NEED THIS?
         if socket and not is_websocket:
-            # We spawn a new gevent here, let socket do its own business.
-            # In current event loop, we will wait on request.response, which is set in socket.set_request
+            # Processed inline: POSTs and GETs with buffered data end the response right here, only a GET with
+            # nothing to send parks below until the socket flushes into it
             logger.debug("[EngineHandler] Found existing socket")
-            self.bind_framework_info(socket)
-            gevent.spawn(socket.process_request, request)
+            if self.should_bind_framework_info(socket):
+                self.bind_framework_info(socket)
+            socket.process_request(request)
 
         else:
             if socket is None:
                 logger.debug("[EngineHandler] No existing socket, handshake")
-                socket = self._do_handshake(b64=b64, request=request)
-
-                if not is_websocket:
-                    logger.debug("[EngineHandler] The incoming request not websocket, bind framework info")
-                    self.bind_framework_info(socket)
+                socket = self._do_handshake(b64=b64, request=request, is_websocket=is_websocket)
 
             if is_websocket and socket.transport.name != 'websocket':
                 logger.debug("[EngineHandler] websocket, proceed as upgrade")
@@ -121,7 +168,18 @@ class EngineHandler(WSGIHandler, EventEmitter):
 
         # wait till the response ends
         logger.debug("[EngineHandler] Waiting for the response signal")
+        waiting = time.time()
         request.response.join()
+        self.access_info = (socket.id, request.GET.get('transport', None), time.time() - waiting, sid is None)
+
+        if getattr(request, 'handed_off', False):
+            # Another process owns the connection now, drop it without a word
+            logger.debug("[EngineHandler] Connection handed off")
+            self.close_connection = True
+            self.socket.close()
+            self.socket = None
+            self.emit('cleanup')
+            return
 
         # The response object can be used as a wsgi application which will send out the buffer
         self.application = request.response
@@ -131,29 +189,123 @@ class EngineHandler(WSGIHandler, EventEmitter):
 
         self.emit('cleanup')
 
-    def _do_handshake(self, b64, request):
+    def log_request(self):
+        """
+        Called by gevent once the response is sent. Goes to the server's access log when one runs, it writes in the
+        background, see engine.access_log
+        """
+        access_log = self.server_context.access_log
+        if access_log is None:
+            return super(EngineHandler, self).log_request()
+        access_log.log(self)
+
+    def remote_address(self):
+        """
+        The client address, the router's peer address when the worker runs behind it
+        """
+        if self.server_context.behind_router:
+            forwarded = self.environ.get('HTTP_X_FORWARDED_FOR', None)
+            if forwarded:
+                return forwarded
+        return self.environ.get('REMOTE_ADDR', None)
+
+    def _handoff_upgrade(self, request):
+        """
+        Pass a websocket upgrade for a session owned by another worker to that worker
+        :return: True if the connection was handed off, it must not be used anymore
+        """
+        handoff = self.server_context.handoff
+        sid = request.GET.get('sid', None)
+        if handoff is None or sid is None or sid in self.server_context.engine_sockets:
+            return False
+
+        worker_id = worker_of(sid)
+        if worker_id is None or worker_id == self.server_context.worker_id:
+            return False
+
+        if not handoff.send(worker_id, self):
+            return False
+
+        logger.debug("[EngineHandler] Upgrade handed off to worker %d", worker_id)
+        self.close_connection = True
+        self.socket.close()
+        self.socket = None
+        return True
+
+    def _handle_preflight(self):
+        """
+        Answer a CORS preflight request straight away, no session lookup needed
+        """
+        headers = self.server_context.cors.preflight(self.environ.get('HTTP_ORIGIN', None))
+        if headers is None:
+            self.application = Response(403, 'origin not allowed')
+        else:
+            self.application = Response(204, '', headers)
+        super(EngineHandler, self).handle_one_response()
+
+    def _handle_metrics(self):
+        metrics = self.server_context.metrics
+        self.application = Response(200, metrics.render(), [('Content-Type', metrics.content_type)])
+        super(EngineHandler, self).handle_one_response()
+
+    def _handle_admin(self):
+        try:
+            result = self.server_context.introspect(parse_query(self.environ.get('QUERY_STRING', '')))
+        except ValueError, e:
+            self.application = Response(400, str(e))
+        else:
+            self.application = self._admin_response(result)
+        super(EngineHandler, self).handle_one_response()
+
+    @staticmethod
+    def _admin_response(result):
+        if result is None:
+            return Response(404, 'not found')
+        return Response(200, json.dumps(result), [('Content-Type', 'application/json')])
+
+    def _refuse_handshake(self, reason, retry_after):
+        """
+        Answer a handshake with 503 straight away, no session is created
+        :param retry_after: seconds the client should wait before trying again, sent as Retry-After
+        """
+        logger.debug("[EngineHandler] Handshake refused: %s", reason)
+        self.server_context.metrics.refused_handshakes.inc(label=reason)
+        headers = [('Retry-After', str(int(math.ceil(retry_after))))]
+        headers.extend(self.server_context.cors.headers(self.environ.get('HTTP_ORIGIN', None)))
+        self.application = Response(503, reason, headers)
+        self.close_connection = True
+        super(EngineHandler, self).handle_one_response()
+
+    def _do_handshake(self, b64, request, is_websocket=False):
         """
         handshake with client to build a socket
         :param b64:
         :param request:
+        :param is_websocket: whether the handshake came in as a websocket request
         :return:
         """
+        started = time.time()
         transport_name = request.GET.get('transport', None)
         if transport_name not in self.transports:
             raise ValueError("transport name [%s] not supported" % transport_name)
 
-        socket = Socket(request, supports_binary=not bool(b64))
+        metrics = self.server_context.metrics
+        socket = Socket(request, supports_binary=not bool(b64), flush_window=self.server_context.flush_window,
+                        sid=self.server_context.generate_id(), metrics=metrics)
 
-        self.server_context.engine_sockets[socket.id] = socket
+        self.server_context.engine_sockets.add(socket)
 
-        def remove_socket(*args, **kwargs):
-            self.server_context.engine_sockets.pop(socket.id)
-        socket.on('close', remove_socket)
+        request.response.headers.append(('Set-Cookie', 'io=%s' % socket.id))
 
-        request.response.headers['Set-Cookie'] = 'io=%s' % socket.id
+        if not is_websocket:
+            # Bind once here so connection listeners already see the framework context, it is cached on the socket
+            logger.debug("[EngineHandler] The incoming request not websocket, bind framework info")
+            self.bind_framework_info(socket)
 
         socket.open()
 
         self.emit('connection', socket)
 
+        metrics.handshakes.inc()
+        metrics.handshake_seconds.observe(time.time() - started)
         return socket
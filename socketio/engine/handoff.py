@@ -0,0 +1,262 @@
+# coding=utf-8
+"""
+Connection handoff between pre-fork workers. When a websocket upgrade reaches a worker which doesn't own the session,
+the worker passes the client connection's file descriptor (SCM_RIGHTS over a Unix socket) to the owner together with
+the request head it already read. The owner then handles the request as if it had accepted the connection itself, no
+proxy hop and no data copying.
+
+Each worker listens on directory/worker-<worker id>.sock. Messages are a length prefixed json header followed by the
+fd when the header says so, the receiver answers one byte once it took the connection over.
+"""
+from __future__ import absolute_import
+
+import os
+import json
+import errno
+import struct
+import logging
+from cStringIO import StringIO
+
+from gevent import socket
+from gevent.server import StreamServer
+from _multiprocessing import sendfd, recvfd
+
+__all__ = ['Handoff', 'HeadReader', 'MarkedReader', 'request_head', 'buffered_bytes', 'send_message',
+           'receive_message']
+
+logger = logging.getLogger(__name__)
+
+length_format = '!I'
+length_size = struct.calcsize(length_format)
+
+ACK = '1'
+
+
+def request_head(handler):
+    """
+    Rebuild the raw request head a WSGIHandler has read
+    """
+    return handler.requestline + '\r\n' + ''.join(handler.headers.headers) + '\r\n'
+
+
+def read_exact(connection, size):
+    data = ''
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise socket.error(errno.ECONNRESET, 'handoff connection closed')
+        data += chunk
+    return data
+
+
+def send_message(connection, message, fd=None, family=None):
+    """
+    Send a json message over a Unix socket, with a file descriptor attached
+    :param family: address family of the socket fd refers to, for the receiver's socket.fromfd
+    """
+    message['fd'] = fd is not None
+    if fd is not None:
+        message['family'] = family
+    payload = json.dumps(message, encoding='latin-1')
+    connection.sendall(struct.pack(length_format, len(payload)) + payload)
+    if fd is not None:
+        socket.wait_write(connection.fileno())
+        sendfd(connection.fileno(), fd)
+
+
+def receive_message(connection, timeout=None):
+    """
+    Receive a message sent by send_message
+    :return: (message, fd) fd is None if no descriptor was attached
+    """
+    length, = struct.unpack(length_format, read_exact(connection, length_size))
+    message = json.loads(read_exact(connection, length))
+    fd = None
+    if message['fd']:
+        socket.wait_read(connection.fileno(), timeout=timeout)
+        fd = recvfd(connection.fileno())
+    return message, fd
+
+
+def buffered_bytes(rfile):
+    """
+    Bytes an rfile has read from its connection and not handed out yet
+    """
+    if isinstance(rfile, HeadReader):
+        return rfile.head.read() + buffered_bytes(rfile.rfile)
+    if isinstance(rfile, MarkedReader):
+        return rfile.buffer
+    rbuf = getattr(rfile, '_rbuf', None)
+    return rbuf.getvalue() if rbuf is not None else ''
+
+
+class HeadReader(object):
+    """
+    rfile for a handed off connection: yields the request head which the sending worker already read, then reads on
+    from the connection.
+    """
+
+    def __init__(self, head, rfile):
+        self.head = StringIO(head)
+        self.rfile = rfile
+
+    def readline(self, size=-1):
+        # The head ends with a line break, lines never span both parts
+        line = self.head.readline(size)
+        if line:
+            return line
+        return self.rfile.readline(size)
+
+    def read(self, size=-1):
+        data = self.head.read(size)
+        if size < 0:
+            return data + self.rfile.read()
+        if len(data) < size:
+            data += self.rfile.read(size - len(data))
+        return data
+
+    @property
+    def closed(self):
+        return self.rfile.closed
+
+    def close(self):
+        self.rfile.close()
+
+
+class MarkedReader(object):
+    """
+    rfile of websocket connections which can be taken over by another process. The bytes read since the last mark
+    are kept, so when the reading greenlet is killed in the middle of a message, the new owner reads it again from
+    its start.
+    """
+
+    def __init__(self, connection, data=''):
+        self.connection = connection
+        self.buffer = data  # read from the connection, not handed out yet
+        self.consumed = []  # handed out since the last mark
+        self.closed = False
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.connection.recv(max(size - len(self.buffer), 65536))
+            if not chunk:
+                break
+            self.buffer += chunk
+
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        self.consumed.append(data)
+        return data
+
+    def mark(self):
+        """
+        Called after each complete message
+        """
+        self.consumed = []
+
+    def pending(self):
+        """
+        :return: The bytes a new owner has to read first
+        """
+        return ''.join(self.consumed) + self.buffer
+
+    def close(self):
+        self.closed = True
+
+
+class Handoff(object):
+    """
+    Sends connections to peer workers, and receives theirs once started.
+    """
+
+    def __init__(self, directory, worker_id, timeout=5):
+        """
+        :param directory: directory holding the worker Unix sockets, shared by all workers
+        :param worker_id: id of this worker
+        :param timeout: seconds to wait for a peer to take a connection over
+        """
+        self.directory = directory
+        self.worker_id = worker_id
+        self.timeout = timeout
+        self.wsgi_server = None
+        self.receiver = None
+
+    def path(self, worker_id):
+        return os.path.join(self.directory, 'worker-%d.sock' % worker_id)
+
+    def start(self, wsgi_server):
+        """
+        Listen for connections from peers, they are handled by wsgi_server.handle(socket, address, rfile=rfile)
+        """
+        self.wsgi_server = wsgi_server
+
+        path = self.path(self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(128)
+        self.receiver = StreamServer(listener, self.receive)
+        self.receiver.start()
+
+    def stop(self):
+        if self.receiver is not None:
+            self.receiver.stop()
+            self.receiver = None
+
+    def send(self, worker_id, handler):
+        """
+        Pass the handler's connection to a peer worker
+        :param worker_id: id of the worker to pass the connection to
+        :param handler: WSGIHandler which has read the request head and not answered yet
+        :return: True if the peer took the connection over, the handler must then drop it without answering
+        """
+        message = {
+            'head': request_head(handler),
+            'address': handler.client_address,
+        }
+
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.path(worker_id))
+            send_message(connection, message, handler.socket.fileno(), handler.socket.family)
+            return connection.recv(1) == ACK
+        except (socket.error, OSError), e:
+            logger.warning('[Handoff] passing connection to worker %d failed: %s', worker_id, e)
+            return False
+        finally:
+            connection.close()
+
+    def receive(self, connection, address):
+        connection.settimeout(self.timeout)
+        try:
+            payload, fd = receive_message(connection, self.timeout)
+        except (socket.error, OSError, ValueError), e:
+            logger.warning('[Handoff] receiving connection failed: %s', e)
+            return
+
+        if fd is None:
+            logger.warning('[Handoff] message from %s without a connection attached', payload.get('address', None))
+            connection.close()
+            return
+
+        try:
+            client = socket.fromfd(fd, payload['family'], socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+
+        try:
+            connection.sendall(ACK)
+        except socket.error:
+            pass
+        connection.close()
+
+        logger.debug('[Handoff] took over connection from %s', payload['address'])
+        rfile = HeadReader(payload['head'].encode('latin-1'), client.makefile('rb', -1))
+        try:
+            self.wsgi_server.handle(client, tuple(payload['address']), rfile=rfile)
+        finally:
+            client.close()
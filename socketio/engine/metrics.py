@@ -0,0 +1,158 @@
+# coding=utf-8
+"""
+Metrics in the Prometheus text format. Counters and histograms are updated in place on the hot paths, an increment is a
+dict lookup and an addition. Gauges are callables evaluated only when the metrics are scraped.
+"""
+import bisect
+from collections import defaultdict
+
+__all__ = ['Counter', 'Gauge', 'Histogram', 'MetricsRegistry', 'EngineMetrics']
+
+# Seconds, from a fast local handshake up to an overloaded server
+default_buckets = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def format_value(value):
+    if type(value) is float:
+        return str(int(value)) if value == int(value) else repr(value)
+    return str(value)
+
+
+def format_label(name, value):
+    return '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+
+class Counter(object):
+    """
+    Value only going up. label names one label dimension, inc() then takes its value.
+    """
+    type = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = defaultdict(int)
+
+    def inc(self, amount=1, label=None):
+        self.values[label] += amount
+
+    def samples(self):
+        if self.label is None:
+            yield self.name, self.values[None]
+            return
+        for value, count in sorted(self.values.items()):
+            yield '%s{%s}' % (self.name, format_label(self.label, value)), count
+
+
+class Gauge(object):
+    """
+    Value read from func at scrape time. With a label func returns a dict label value -> value.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, func, label=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.label = label
+
+    def samples(self):
+        if self.label is None:
+            yield self.name, self.func()
+            return
+        for value, count in sorted(self.func().items()):
+            yield '%s{%s}' % (self.name, format_label(self.label, value)), count
+
+
+class Histogram(object):
+    """
+    Distribution of observed values in fixed buckets
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '%s_bucket{le="%s"}' % (self.name, format_value(float(bound))), cumulative
+        yield '%s_bucket{le="+Inf"}' % self.name, self.count
+        yield '%s_sum' % self.name, self.sum
+        yield '%s_count' % self.name, self.count
+
+
+class MetricsRegistry(object):
+    """
+    Holds metrics in registration order and renders them
+    """
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, label=None):
+        return self.register(Counter(name, help, label))
+
+    def gauge(self, name, help, func, label=None):
+        return self.register(Gauge(name, help, func, label))
+
+    def histogram(self, name, help, buckets=default_buckets):
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self):
+        """
+        :return: The metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, value in metric.samples():
+                lines.append('%s %s' % (name, format_value(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+
+class EngineMetrics(MetricsRegistry):
+    """
+    Metrics of one engine Server
+    """
+
+    def __init__(self, server_context):
+        super(EngineMetrics, self).__init__()
+        sockets = server_context.engine_sockets
+
+        self.gauge('engineio_sockets', 'Open engine sockets', lambda: len(sockets))
+        self.gauge('engineio_sockets_by_transport', 'Open engine sockets by transport',
+                   lambda: dict((name, sockets.count_by_transport(name)) for name in ('polling', 'websocket')),
+                   label='transport')
+        self.gauge('engineio_write_buffer_packets', 'Packets waiting in the write buffers of all sockets',
+                   lambda: sum(socket.write_buffer.qsize() for socket in sockets.itervalues()
+                               if socket.write_buffer is not None))
+        self.handshakes = self.counter('engineio_handshakes_total', 'Sessions opened by a handshake')
+        self.handshake_seconds = self.histogram('engineio_handshake_seconds', 'Time to handle a handshake')
+        self.refused_handshakes = self.counter('engineio_refused_handshakes_total', 'Handshakes refused',
+                                               label='reason')
+        self.packets_received = self.counter('engineio_packets_received_total', 'Engine packets received',
+                                             label='type')
+        self.packets_sent = self.counter('engineio_packets_sent_total', 'Engine packets sent', label='type')
+        self.bytes_received = self.counter('engineio_payload_bytes_received_total',
+                                           'Length of the data of received packets')
+        self.bytes_sent = self.counter('engineio_payload_bytes_sent_total', 'Length of the data of sent packets')
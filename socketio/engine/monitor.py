@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+Hub monitor. Finds greenlets which hold the hub for too long, measures how late the hub wakes up sleeping greenlets,
+and counts the live greenlets by origin.
+
+The lag is measured by HubLag, which the engine Server shares between its monitor and its admission control.
+
+A greenlet trace function notes every switch. A real OS thread checks periodically whether the same greenlet has been
+running since longer than threshold, then takes its stack with sys._current_frames while the greenlet is still
+blocking. The report is logged from the hub afterwards, logging's locks may be gevent's.
+
+Greenlets are counted by origin only while a monitor runs, track() is a no-op otherwise.
+"""
+import sys
+import time
+import logging
+import traceback
+from collections import defaultdict, deque
+
+import gevent
+import greenlet
+from gevent import monkey
+
+__all__ = ['HubLag', 'HubMonitor', 'track']
+
+logger = logging.getLogger(__name__)
+
+start_new_thread, get_ident = monkey.get_original('thread', ['start_new_thread', 'get_ident'])
+real_sleep = monkey.get_original('time', 'sleep')
+
+_active = None  # the running HubMonitor
+
+
+def track(job, origin):
+    """
+    Count job among the live greenlets of origin while a monitor runs
+    :param job: gevent.Greenlet
+    :param origin: eg. 'ping_timeout', 'websocket_reader'
+    :return: job
+    """
+    if _active is not None:
+        _active.track(job, origin)
+    return job
+
+
+class HubLag(object):
+    """
+    Measures every interval seconds how late the hub wakes up a sleeping greenlet. latest is the last measure, the
+    listeners are called with each one
+    """
+
+    def __init__(self, interval=.5):
+        self.interval = interval
+        self.latest = 0
+        self.listeners = []
+        self.job = None
+
+    def start(self):
+        if self.job is None:
+            self.job = track(gevent.spawn(self._run), 'hub_lag')
+
+    def stop(self):
+        if self.job is not None:
+            self.job.kill()
+            self.job = None
+
+    def _run(self):
+        while True:
+            started = time.time()
+            gevent.sleep(self.interval)
+            self.latest = max(0, time.time() - started - self.interval)
+            for listener in list(self.listeners):
+                listener(self.latest)
+
+
+class HubMonitor(object):
+    """
+    threshold: seconds a greenlet may run without switching before its stack is logged
+    lag_interval: seconds between two hub lag measures, when no hub_lag is given
+    max_reports: blocking reports kept in reports
+    hub_lag: HubLag shared with other users, eg. the engine Server's
+    """
+
+    def __init__(self, metrics=None, threshold=.1, lag_interval=.5, max_reports=20, hub_lag=None):
+        self.threshold = threshold
+        self.owns_hub_lag = hub_lag is None
+        self.hub_lag = hub_lag if hub_lag is not None else HubLag(lag_interval)
+        self.reports = deque(maxlen=max_reports)  # (time, seconds blocked so far, greenlet, stack)
+        self.unlogged = deque(maxlen=max_reports)
+
+        self.greenlets = defaultdict(int)  # origin -> live greenlets
+        self.switches = 0
+        self.switched_at = time.time()
+        self.current = None  # greenlet switched to last
+        self.hub = gevent.get_hub()
+        self.thread_id = get_ident()
+        self.running = False
+        self.previous_trace = None
+
+        if metrics is not None:
+            metrics.gauge('gevent_greenlets', 'Live greenlets by origin', lambda: dict(self.greenlets),
+                          label='origin')
+            self.blocked = metrics.counter('gevent_hub_blocked_total',
+                                           'Times a greenlet ran longer than the threshold without switching')
+            self.lag = metrics.histogram('gevent_hub_lag_seconds', 'How late the hub woke up a sleeping greenlet')
+        else:
+            self.blocked = self.lag = None
+
+    def start(self):
+        global _active
+        if self.running:
+            return
+        self.running = True
+        _active = self
+        self.previous_trace = greenlet.settrace(self._trace)
+        start_new_thread(self._watch, ())
+        self.hub_lag.listeners.append(self._on_lag)
+        self.hub_lag.start()
+        logger.debug('[HubMonitor] started, threshold %ss', self.threshold)
+
+    def stop(self):
+        global _active
+        if not self.running:
+            return
+        self.running = False
+        if _active is self:
+            _active = None
+        greenlet.settrace(self.previous_trace)
+        self.hub_lag.listeners.remove(self._on_lag)
+        if self.owns_hub_lag:
+            self.hub_lag.stop()
+
+    def track(self, job, origin):
+        greenlets = self.greenlets
+        greenlets[origin] += 1
+
+        def finished(job):
+            greenlets[origin] -= 1
+        job.link(finished)
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            self.switches += 1
+            self.switched_at = time.time()
+            self.current = args[1]
+        if self.previous_trace is not None:
+            self.previous_trace(event, args)
+
+    def _watch(self):
+        reported = None
+        while self.running:
+            real_sleep(self.threshold / 2.0)
+            switches, current = self.switches, self.current
+            if current is None or current is self.hub or switches == reported:
+                continue
+
+            blocked = time.time() - self.switched_at
+            if blocked > self.threshold:
+                reported = switches
+                frame = sys._current_frames().get(self.thread_id, None)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+                report = (time.time(), blocked, repr(current), stack)
+                self.reports.append(report)
+                self.unlogged.append(report)
+                if self.blocked is not None:
+                    self.blocked.inc()
+
+    def _on_lag(self, lag):
+        # Runs in a greenlet of the hub's thread, where logging is safe
+        if self.lag is not None:
+            self.lag.observe(lag)
+
+        while self.unlogged:
+            reported_at, blocked, current, stack = self.unlogged.popleft()
+            logger.warning('[HubMonitor] %s ran for at least %.3fs without yielding:\n%s', current, blocked, stack)
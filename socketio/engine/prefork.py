@@ -0,0 +1,241 @@
+# coding=utf-8
+"""
+Pre-fork mode. The master process binds the listening socket, forks the workers and restarts the ones which die.
+Each worker runs its own gevent hub and WSGIServer, and gets a worker id from 0 to workers - 1 which ends up in the
+session ids it hands out, see engine.sid.
+
+With reuse_port every worker binds its own socket with SO_REUSEPORT and the kernel balances new connections between
+them, otherwise all workers accept on the socket the master bound before forking. With router, an extra process runs
+the StickyRouter on the address and worker n listens on port + 1 + n of the same host, so polling works across
+workers. Without the router, websocket upgrades reaching a worker which doesn't own the session are handed off to the
+owner, see engine.handoff.
+"""
+from __future__ import absolute_import
+
+import os
+import time
+import errno
+import signal
+import socket
+import shutil
+import logging
+import tempfile
+
+import gevent
+
+from .router import StickyRouter
+from .handoff import Handoff
+
+__all__ = ['Prefork', 'bind', 'ROUTER']
+
+# Key of the router process in Prefork.pids
+ROUTER = 'router'
+
+logger = logging.getLogger(__name__)
+
+
+def bind(address, reuse_port=False, backlog=2048):
+    """
+    Create a non blocking listening socket
+    :param address: (host, port)
+    :param reuse_port: set SO_REUSEPORT so that several processes can bind the same address
+    :param backlog: listen backlog
+    :return: socket
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise ValueError('SO_REUSEPORT is not supported on this platform')
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind(address)
+    listener.listen(backlog)
+    listener.setblocking(0)
+    return listener
+
+
+class Prefork(object):
+    """
+    Supervises the worker processes.
+
+    serve_worker(worker_id, listener, handoff) is called in each forked worker and is expected to serve until the
+    process is killed, eg. build a WSGIServer on the listener, start the handoff with it unless it is None and call
+    serve_forever().
+    """
+
+    def __init__(self, address, serve_worker, workers, reuse_port=False, router=False, restart_delay=1,
+                 check_interval=.5, stop_timeout=10):
+        """
+        :param address: (host, port)
+        :param serve_worker: callable(worker_id, listener, handoff), runs in the worker
+        :param workers: number of worker processes
+        :param reuse_port: bind one SO_REUSEPORT socket per worker instead of sharing the master's socket
+        :param router: run a StickyRouter in front of the workers
+        :param restart_delay: seconds to wait before restarting a worker which died right after it started
+        :param check_interval: seconds between checks for dead workers
+        :param stop_timeout: seconds the workers get to exit after SIGTERM, eg. to drain, before they are killed
+        """
+        self.address = address
+        self.serve_worker = serve_worker
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.router = router
+        self.restart_delay = restart_delay
+        self.check_interval = check_interval
+        self.stop_timeout = stop_timeout
+
+        self.listener = None
+        self.handoff_dir = None  # directory of the workers' handoff sockets
+        self.pids = {}  # pid -> worker id, or ROUTER
+        self.started_at = {}  # worker id -> time the worker started
+        self.pending = {}  # worker id -> time it should be restarted
+        self.stopping = False
+
+    def run(self):
+        """
+        Fork the workers and supervise them until the master gets SIGTERM or SIGINT
+        """
+        if self.router or not self.reuse_port:
+            self.listener = bind(self.address)
+        if not self.router and self.workers > 1:
+            self.handoff_dir = tempfile.mkdtemp(prefix='socketio-handoff-')
+
+        signal.signal(signal.SIGTERM, self.on_signal)
+        signal.signal(signal.SIGINT, self.on_signal)
+
+        for worker_id in xrange(self.workers):
+            self.spawn(worker_id)
+        if self.router:
+            self.spawn(ROUTER)
+
+        try:
+            while not self.stopping:
+                time.sleep(self.check_interval)
+                self.reap()
+                self.restart_pending()
+        finally:
+            self.stop()
+
+    def spawn(self, worker_id):
+        master = os.getpid()
+        pid = os.fork()
+        if pid:
+            logger.debug('[Prefork] worker %s started as %d', worker_id, pid)
+            self.pids[pid] = worker_id
+            self.started_at[worker_id] = time.time()
+            return pid
+
+        # In the worker from here on, it never returns to the caller
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            gevent.reinit()
+            gevent.spawn(self._watch_master, master)
+            if worker_id == ROUTER:
+                StickyRouter(self.listener, [self.worker_address(i) for i in xrange(self.workers)]).serve_forever()
+            else:
+                handoff = Handoff(self.handoff_dir, worker_id) if self.handoff_dir is not None else None
+                self.serve_worker(worker_id, self.worker_listener(worker_id), handoff)
+        except Exception:
+            logger.exception('[Prefork] worker %s failed', worker_id)
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _watch_master(self, master):
+        # Don't outlive a master which was killed without a chance to stop the workers
+        while os.getppid() == master:
+            gevent.sleep(self.check_interval)
+        os._exit(0)
+
+    def worker_address(self, worker_id):
+        """
+        The address a worker listens on behind the router
+        """
+        host, port = self.address
+        return host, port + 1 + worker_id
+
+    def worker_listener(self, worker_id):
+        if self.router:
+            return bind(self.worker_address(worker_id))
+        if self.listener is not None:
+            return self.listener
+        return bind(self.address, reuse_port=True)
+
+    def reap(self):
+        """
+        Collect dead workers and schedule their restart
+        """
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ECHILD:
+                    self.pids.clear()
+                    break
+                raise
+
+            if not pid:
+                break
+
+            worker_id = self.pids.pop(pid, None)
+            if worker_id is None:
+                continue
+
+            if self.stopping:
+                logger.debug('[Prefork] worker %s (%d) stopped', worker_id, pid)
+                continue
+
+            logger.warning('[Prefork] worker %s (%d) exited with status %d', worker_id, pid, status)
+            now = time.time()
+            # Don't spin on a worker which fails at start up
+            if now - self.started_at.get(worker_id, 0) < self.restart_delay:
+                self.pending[worker_id] = now + self.restart_delay
+            else:
+                self.pending[worker_id] = now
+
+    def restart_pending(self):
+        now = time.time()
+        for worker_id, restart_at in self.pending.items():
+            if restart_at <= now and not self.stopping:
+                del self.pending[worker_id]
+                self.spawn(worker_id)
+
+    def on_signal(self, signum, frame):
+        logger.debug('[Prefork] got signal %d, stopping', signum)
+        self.stopping = True
+
+    def stop(self, timeout=None):
+        """
+        Terminate the workers and wait for them to exit, the ones still alive after timeout seconds are killed
+        :param timeout: defaults to stop_timeout
+        """
+        if timeout is None:
+            timeout = self.stop_timeout
+        self.stopping = True
+        for pid in self.pids.keys():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+        deadline = time.time() + timeout
+        while self.pids and time.time() < deadline:
+            self.reap()
+            if self.pids:
+                time.sleep(.05)
+
+        for pid in self.pids.keys():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.pids.clear()
+        self.pending.clear()
+
+        if self.handoff_dir is not None:
+            shutil.rmtree(self.handoff_dir, ignore_errors=True)
+            self.handoff_dir = None
@@ -0,0 +1,189 @@
+# coding=utf-8
+"""
+Registry of the engine sockets opened by one server.
+"""
+import time
+import logging
+from collections import defaultdict
+
+import gevent
+
+from .monitor import track
+
+__all__ = ['SocketRegistry']
+
+logger = logging.getLogger(__name__)
+
+
+class SocketRegistry(object):
+    """
+    Holds the open engine sockets of a server, keyed by sid.
+
+    Counts by transport name and ready state are kept up to date from the socket events, so reading them is O(1).
+    Sockets are spread over shards, a sweeper greenlet visits one shard per tick and drops sockets which closed
+    without going through the normal close path or stayed inactive for longer than stale_timeout seconds.
+    """
+
+    def __init__(self, shards=16, sweep_interval=1, stale_timeout=90):
+        self.shards = [{} for _ in xrange(shards)]  # sid -> [socket, transport name, ready state]
+        self.size = 0
+        self.transport_counts = defaultdict(int)
+        self.state_counts = defaultdict(int)
+
+        self.sweep_interval = sweep_interval
+        self.stale_timeout = stale_timeout
+        self.sweep_index = 0
+        self.sweeper = None
+
+    def _shard(self, sid):
+        return self.shards[hash(sid) % len(self.shards)]
+
+    def add(self, socket):
+        """
+        Register the socket, it is removed when the socket closes
+        :param socket: engine socket
+        """
+        shard = self._shard(socket.id)
+        if socket.id in shard:
+            self.remove(socket.id)
+
+        entry = [socket, socket.transport.name, socket.ready_state]
+        shard[socket.id] = entry
+        self.size += 1
+        self.transport_counts[entry[1]] += 1
+        self.state_counts[entry[2]] += 1
+
+        def on_state(state):
+            self.state_counts[entry[2]] -= 1
+            entry[2] = state
+            self.state_counts[state] += 1
+
+        def on_upgrade(transport):
+            self.transport_counts[entry[1]] -= 1
+            entry[1] = transport.name
+            self.transport_counts[transport.name] += 1
+
+        def on_close(*args, **kwargs):
+            self._pop(socket.id)
+            # Removing the listeners while the socket emits 'close' would skip the listeners after this one, they are
+            # removed once the emit returned. The socket emits nothing after 'close'
+            gevent.get_hub().loop.run_callback(socket.remove_listeners_by_key, id(self))
+
+        socket.on('state', on_state, id(self))
+        socket.on('upgrade', on_upgrade, id(self))
+        socket.on('close', on_close, id(self))
+
+        if self.sweeper is None and self.sweep_interval:
+            self.sweeper = track(gevent.spawn(self._sweep_loop), 'registry_sweeper')
+
+    def remove(self, sid):
+        """
+        Unregister the socket
+        :param sid: The socket id
+        :return: The socket, None if not registered
+        """
+        socket = self._pop(sid)
+        if socket is not None:
+            socket.remove_listeners_by_key(id(self))
+        return socket
+
+    def stop(self):
+        """
+        Stop the sweeper, it starts again with the next socket added
+        """
+        if self.sweeper is not None:
+            self.sweeper.kill()
+            self.sweeper = None
+
+    def _pop(self, sid):
+        entry = self._shard(sid).pop(sid, None)
+        if entry is None:
+            return None
+
+        self.size -= 1
+        self.transport_counts[entry[1]] -= 1
+        self.state_counts[entry[2]] -= 1
+        return entry[0]
+
+    def get(self, sid, default=None):
+        entry = self._shard(sid).get(sid, None)
+        return entry[0] if entry is not None else default
+
+    def __getitem__(self, sid):
+        return self._shard(sid)[sid][0]
+
+    def __contains__(self, sid):
+        return sid in self._shard(sid)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def iterkeys(self):
+        for shard in self.shards:
+            for sid in shard:
+                yield sid
+
+    def itervalues(self):
+        """
+        Iterate over the sockets without copying, don't open or close sockets while iterating
+        """
+        for shard in self.shards:
+            for entry in shard.itervalues():
+                yield entry[0]
+
+    def iteritems(self):
+        for shard in self.shards:
+            for sid, entry in shard.iteritems():
+                yield sid, entry[0]
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def count_by_transport(self, name):
+        """
+        :param name: transport name, 'polling' or 'websocket'
+        :return: number of sockets currently using the transport
+        """
+        return self.transport_counts[name]
+
+    def count_by_state(self, state):
+        """
+        :param state: engine socket ready state
+        :return: number of sockets in the state
+        """
+        return self.state_counts[state]
+
+    def sweep(self):
+        """
+        Check one shard for closed or stale sockets
+        """
+        shard = self.shards[self.sweep_index]
+        self.sweep_index = (self.sweep_index + 1) % len(self.shards)
+
+        threshold = time.time() - self.stale_timeout
+        for sid, entry in shard.items():
+            socket = entry[0]
+            if socket.ready_state == socket.STATE_CLOSED or socket.transport is None:
+                logger.debug('[SocketRegistry] dropping leaked socket %s', sid)
+                self.remove(sid)
+            elif socket.last_activity < threshold:
+                logger.debug('[SocketRegistry] closing stale socket %s', sid)
+                # Unregistered by the close listener
+                socket.on_close('stale')
+
+    def _sweep_loop(self):
+        while True:
+            gevent.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('[SocketRegistry] sweep failed')
@@ -0,0 +1,139 @@
+# coding=utf-8
+"""
+Replays a traffic capture (see engine.capture) against a server. Each captured session is opened at its captured time
+by an engine client, which then sends the session's captured client packets at their captured times, divided by
+speed. The server's answers are counted, not compared, they depend on the server state.
+
+    python -m socketio.engine.replay capture.log --host 127.0.0.1 --port 6543 --speed 10
+"""
+import sys
+import json
+import time
+import gzip
+import logging
+import argparse
+from collections import OrderedDict
+
+import gevent
+from gevent.event import Event
+
+from socketio.engine.capture import header, decode_record
+
+__all__ = ['load', 'replay']
+
+logger = logging.getLogger(__name__)
+
+# Handled by the client itself, replaying them would confuse the session
+client_managed_types = ('open', 'ping', 'pong', 'upgrade', 'noop')
+
+
+class Session(object):
+    def __init__(self, sid, transport, opened_at):
+        self.sid = sid
+        self.transport = transport
+        self.opened_at = opened_at  # ms
+        self.closed_at = None
+        self.inbound = []  # (ms, packet) sent by the client
+        self.outbound = 0  # packets the server sent in the capture
+
+
+def load(path):
+    """
+    Read a capture file
+    :return: list of Session in the order they opened
+    """
+    sessions = OrderedDict()
+    with (gzip.open if path.endswith('.gz') else open)(path, 'rb') as capture_file:
+        for line in capture_file:
+            if line == header or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split(' ', 3)
+            at, number, kind = int(fields[0]), int(fields[1]), fields[2]
+            if kind == 'O':
+                sid, transport = fields[3].split(' ')
+                sessions[number] = Session(sid, transport, at)
+            elif number not in sessions:
+                continue
+            elif kind == '<':
+                sessions[number].inbound.append((at, decode_record(fields[3])))
+            elif kind == '>':
+                sessions[number].outbound += 1
+            elif kind == 'C':
+                sessions[number].closed_at = at
+    return sessions.values()
+
+
+def replay(sessions, host='127.0.0.1', port=6543, path='/socket.io/', speed=1, transports=None, open_timeout=10):
+    """
+    Drive the sessions against a server
+    :param speed: 1 for the captured pace, 10 to replay ten times faster
+    :param transports: transports the clients use, defaults to polling then the captured transport
+    :return: dict of counts and the duration
+    """
+    from socketio_client.engine.socket import Socket
+
+    stats = {'sessions': len(sessions), 'failed': 0, 'sent': 0, 'received': 0, 'captured_received': 0}
+    started = time.time()
+
+    def wait_until(at):
+        delay = started + at / 1000.0 / speed - time.time()
+        if delay > 0:
+            gevent.sleep(delay)
+
+    def run(session):
+        wait_until(session.opened_at)
+        stats['captured_received'] += session.outbound
+        client = Socket(host=host, port=port, path=path,
+                        transports=transports or tuple(OrderedDict.fromkeys(('polling', session.transport))))
+        opened = Event()
+        client.on('open', opened.set)
+
+        def on_packet(packet):
+            stats['received'] += 1
+        client.on('packet', on_packet)
+
+        job = gevent.spawn(client.open)
+        try:
+            if not opened.wait(open_timeout):
+                stats['failed'] += 1
+                return
+            for at, packet in session.inbound:
+                if packet['type'] in client_managed_types:
+                    continue
+                wait_until(at)
+                if packet['type'] == 'close':
+                    break
+                client.send_packet(packet['type'], packet.get('data', None))
+                stats['sent'] += 1
+            if session.closed_at is not None:
+                wait_until(session.closed_at)
+                client.send_packet('close')
+        finally:
+            client.close()
+            job.kill()
+
+    gevent.joinall([gevent.spawn(run, session) for session in sessions])
+    stats['seconds'] = round(time.time() - started, 3)
+    return stats
+
+
+def main(argv=None):
+    from gevent.monkey import patch_all
+    patch_all()
+
+    parser = argparse.ArgumentParser(description='Replay an engine traffic capture against a server')
+    parser.add_argument('capture', help='capture file, see socketio.engine.capture')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6543)
+    parser.add_argument('--path', default='/socket.io/')
+    parser.add_argument('--speed', type=float, default=1, help='10 replays ten times faster')
+    parser.add_argument('--transport', action='append', dest='transports',
+                        help='transports the clients use, repeat for several')
+    args = parser.parse_args(argv)
+
+    sessions = load(args.capture)
+    print(json.dumps(replay(sessions, args.host, args.port, args.path, args.speed, args.transports)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+A minimal request built from the WSGI environ, it only exposes what the engine needs.
+"""
+import urllib
+
+__all__ = ['Request', 'parse_query']
+
+
+def parse_query(query_string):
+    """
+    Parse the query string into a dict. Engine query strings are short and rarely escaped, so values are only
+    unquoted when they contain an escape. Blank values are dropped like urlparse.parse_qsl does.
+    :param query_string: The QUERY_STRING
+    :return: dict
+    """
+    result = {}
+    if not query_string:
+        return result
+
+    for pair in query_string.split('&'):
+        key, _, value = pair.partition('=')
+        if not value:
+            continue
+        if '%' in value or '+' in value:
+            value = urllib.unquote_plus(value)
+        if '%' in key or '+' in key:
+            key = urllib.unquote_plus(key)
+        result[key] = value
+    return result
+
+
+# header name -> environ key, filled on first lookup of each name
+_environ_keys = {
+    'content-type': 'CONTENT_TYPE',
+    'content-length': 'CONTENT_LENGTH',
+}
+
+
+class EnvironHeaders(object):
+    """
+    Read only, case insensitive view of the request headers in environ
+    """
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    @staticmethod
+    def _key(name):
+        key = _environ_keys.get(name, None)
+        if key is None:
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            _environ_keys[name] = key
+        return key
+
+    def get(self, name, default=None):
+        return self.environ.get(self._key(name), default)
+
+    def __getitem__(self, name):
+        return self.environ[self._key(name)]
+
+    def __contains__(self, name):
+        return self._key(name) in self.environ
+
+
+class Request(object):
+    """
+    The engine request, one per http request.
+
+    handler: the EngineHandler serving the request
+    response: the engine Response, ended when the request is done
+    """
+
+    def __init__(self, environ, handler=None, response=None):
+        self.environ = environ
+        self.method = environ['REQUEST_METHOD']
+        self.GET = parse_query(environ.get('QUERY_STRING', ''))
+        self.headers = EnvironHeaders(environ)
+        self.handler = handler
+        self.response = response
+        self._body = None
+
+    @property
+    def body(self):
+        """
+        The request body, read from wsgi.input on first access
+        """
+        if self._body is None:
+            length = self.environ.get('CONTENT_LENGTH', None)
+            stream = self.environ['wsgi.input']
+            self._body = stream.read(int(length)) if length else stream.read()
+        return self._body
@@ -1,26 +1,35 @@
 # coding=utf-8
-from webob.response import Response as WSGIResponse
+import httplib
 from gevent.event import Event
 from ..event_emitter import EventEmitter
 
+# Status lines for every known status code, built once
+status_lines = dict((code, '%d %s' % (code, reason)) for code, reason in httplib.responses.items())
 
-class Response(WSGIResponse, EventEmitter):
+
+class Response(EventEmitter):
     """
     The Main reason for this class is make the response waitable. The primary event loop can listen on response
     when end() called anywhere, the main loop activated and it can send the response to client.
+
+    It is also the WSGI application sending itself out: headers is a list of (name, value) tuples, so transports can
+    extend it with precomputed tuples, and body is written in one shot.
     """
 
     class ResponseAlreadyEnded(Exception):
         pass
 
-    def __init__(self, *args, **kwargs):
-        self.event = Event()
-        super(Response, self).__init__(*args, **kwargs)
-        EventEmitter.__init__(self)
+    def __init__(self, status_code=200, body='', headers=None):
+        super(Response, self).__init__()
+        self.ended = False
+        self.event = None  # Only created when someone has to wait for the response
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers if headers is not None else []
 
     def end(self, status_code=None, body=None):
         self.emit('pre_end')
-        if self.event.is_set():
+        if self.ended:
             raise Response.ResponseAlreadyEnded('response already ended, did you call response.end() several times?')
 
         if status_code is not None:
@@ -29,13 +38,20 @@ class Response(WSGIResponse, EventEmitter):
         if body is not None:
             self.body = body
 
-        self.event.set()
+        self.ended = True
+        if self.event is not None:
+            self.event.set()
         self.emit('post_end')
 
     def join(self):
         """
-        Wait on the response object
+        Wait on the response object, returns at once if it already ended
         """
+        if self.ended:
+            return True
+
+        if self.event is None:
+            self.event = Event()
         return self.event.wait()
 
     @property
@@ -43,4 +59,14 @@ class Response(WSGIResponse, EventEmitter):
         """
         :return:  Whether the response object already ended
         """
-        return self.event.is_set()
+        return self.ended
+
+    @property
+    def status(self):
+        return status_lines.get(self.status_code, None) or '%d Unknown' % self.status_code
+
+    def __call__(self, environ, start_response):
+        body = self.body if type(self.body) is str else str(self.body)
+        headers = self.headers + [('Content-Length', str(len(body)))]
+        start_response(self.status, headers)
+        return [body]
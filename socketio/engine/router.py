@@ -0,0 +1,166 @@
+# coding=utf-8
+"""
+Sticky router for pre-fork deployments. Long polling needs every request of a session to reach the process owning
+it, the router sits in front of the workers, reads the sid of each request and forwards the connection to the worker
+named in it, see engine.sid. Handshakes go to the worker with the fewest open forwarded connections. The router
+doesn't see sessions end, a timed out session sends nothing, so this stands in for the sessions a worker owns: an open
+websocket session holds one connection, a polling session holds its parked poll most of the time. Sessions between
+two polls and short requests are missed or counted once more.
+
+Plain requests are forwarded with Connection: close, so a kept alive client connection can't carry requests for
+another session to the wrong worker. Websocket upgrades are piped both ways until either side closes. Every request
+carries the client address in X-Forwarded-For, replacing whatever the client sent, workers read it instead of their
+peer address, which is the router's.
+"""
+from __future__ import absolute_import
+
+import logging
+import urlparse
+
+import gevent
+from gevent import socket
+from gevent.server import StreamServer
+
+from .request import parse_query
+from .sid import worker_of
+
+__all__ = ['StickyRouter', 'read_head', 'rewrite_head']
+
+logger = logging.getLogger(__name__)
+
+# Request heads larger than this are refused
+MAX_HEAD = 65536
+
+BUFFER_SIZE = 65536
+
+hop_by_hop_headers = ('connection', 'keep-alive')
+
+forwarded_header = 'x-forwarded-for'
+
+
+def read_head(connection):
+    """
+    Read from connection until the end of the request head
+    :param connection: The client socket
+    :return: (head, rest) rest is whatever was read past the head, head is None when the client closed first or
+        the head is too large
+    """
+    data = ''
+    while True:
+        chunk = connection.recv(BUFFER_SIZE)
+        if not chunk:
+            return None, data
+        data += chunk
+        end = data.find('\r\n\r\n')
+        if end >= 0:
+            return data[:end + 4], data[end + 4:]
+        if len(data) > MAX_HEAD:
+            return None, data
+
+
+def rewrite_head(head, remote_addr=None, close=True):
+    """
+    Rewrite a request head before forwarding it
+    :param remote_addr: The client address, set as X-Forwarded-For
+    :param close: Replace the connection headers with Connection: close, not for websocket upgrades
+    """
+    lines = head[:-4].split('\r\n')
+    kept = [lines[0]]
+    for line in lines[1:]:
+        name = line.split(':', 1)[0].strip().lower()
+        if name == forwarded_header and remote_addr is not None:
+            continue
+        if close and name in hop_by_hop_headers:
+            continue
+        kept.append(line)
+    if remote_addr is not None:
+        kept.append('X-Forwarded-For: %s' % remote_addr)
+    if close:
+        kept.append('Connection: close')
+    return '\r\n'.join(kept) + '\r\n\r\n'
+
+
+def is_upgrade(head):
+    lower = head.lower()
+    return '\r\nupgrade:' in lower
+
+
+class StickyRouter(StreamServer):
+    """
+    Forwards each connection to the worker owning its session.
+
+    workers: list of worker addresses, indexed by worker id
+    """
+
+    def __init__(self, listener, workers, **kwargs):
+        super(StickyRouter, self).__init__(listener, **kwargs)
+        self.workers = list(workers)
+        self.connections = [0] * len(self.workers)  # open forwarded connections per worker, see the module doc
+        self.next_worker = 0  # where the search for the worker with the fewest connections starts, so ties rotate
+
+    def pick_worker(self, sid):
+        """
+        :param sid: The session id of the request, None for handshakes
+        :return: worker id
+        """
+        worker_id = worker_of(sid)
+        if worker_id is not None and 0 <= worker_id < len(self.workers):
+            return worker_id
+
+        count = len(self.workers)
+        start = self.next_worker
+        self.next_worker = (start + 1) % count
+        return min(((start + i) % count for i in xrange(count)), key=self.connections.__getitem__)
+
+    def handle(self, client, address):
+        try:
+            head, rest = read_head(client)
+        except socket.error:
+            return
+        if head is None:
+            return
+
+        target = head.split(' ', 2)[1] if head.count(' ') >= 2 else ''
+        sid = parse_query(urlparse.urlsplit(target).query).get('sid', None)
+        worker_id = self.pick_worker(sid)
+
+        head = rewrite_head(head, address[0], close=not is_upgrade(head))
+
+        try:
+            upstream = socket.create_connection(self.workers[worker_id])
+        except socket.error, e:
+            logger.warning('[StickyRouter] worker %d unreachable: %s', worker_id, e)
+            client.sendall('HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return
+
+        logger.debug('[StickyRouter] %s sid %s -> worker %d', address, sid, worker_id)
+        self.connections[worker_id] += 1
+        try:
+            upstream.sendall(head + rest)
+            self.pipe(client, upstream)
+        finally:
+            self.connections[worker_id] -= 1
+            upstream.close()
+
+    @staticmethod
+    def _copy(source, destination):
+        try:
+            while True:
+                data = source.recv(BUFFER_SIZE)
+                if not data:
+                    break
+                destination.sendall(data)
+            # Pass the end of stream on
+            destination.shutdown(socket.SHUT_WR)
+        except socket.error:
+            pass
+
+    def pipe(self, client, upstream):
+        """
+        Copy both ways until the worker closes, or the client closes its side
+        """
+        sender = gevent.spawn(self._copy, client, upstream)
+        try:
+            self._copy(upstream, client)
+        finally:
+            sender.kill()
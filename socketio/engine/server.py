@@ -1,8 +1,23 @@
 from __future__ import absolute_import
 
+import json
+import time
+import random
+import signal
+import gevent
 from gevent.pywsgi import WSGIServer
 from geventwebsocket.handler import WebSocketHandler
 from .handler import EngineHandler
+from .sid import SidGenerator
+from .registry import SocketRegistry
+from .cors import CorsPolicy
+from .admission import AdmissionControl
+from .metrics import EngineMetrics
+from .monitor import HubLag, HubMonitor, track
+from .tracing import Tracer
+from .access_log import AccessLog
+from .prefork import Prefork
+from .takeover import Takeover
 import logging
 
 __all__ = ['Server']
@@ -20,13 +35,193 @@ class Server(object):
         'close_timeout': 60,
         'heartbeat_interval': 25,
     }
-    engine_sockets = {}
 
     default_server = None
 
     def __init__(self, *args, **kwargs):
         self.transports = kwargs.pop('transports', None)
         self.resource = kwargs.pop('resource', 'socket.io')
+        self.engine_sockets = SocketRegistry(**kwargs.pop('registry', {}))
+        self.flush_window = kwargs.pop('flush_window', 0)  # microseconds, see engine.socket.Socket
+        self.worker_id = kwargs.pop('worker_id', None)  # embedded in session ids, see engine.sid
+        # Behind engine.router.StickyRouter, the client address is taken from the X-Forwarded-For it sets
+        self.behind_router = kwargs.pop('behind_router', False)
+        # When to run the framework application again for an existing socket, see EngineHandler
+        self.framework_refresh = kwargs.pop('framework_refresh', None)
+        # Allowed origins and preflight cache time, eg. cors={'origins': ['https://example.com'], 'max_age': 600}
+        self.cors = CorsPolicy(**kwargs.pop('cors', {}))
+        # Handshake limits, eg. admission={'max_sessions': 10000, 'rate': 5, 'max_lag': .5}, see AdmissionControl
+        self.admission = AdmissionControl(**kwargs.pop('admission', {}))
+        self.hub_lag = HubLag()  # started by the monitor or by the admission control's max_lag
+        self.metrics = EngineMetrics(self)
+        # Served as text under the resource when set, eg. 'metrics' for /socket.io/metrics
+        self.metrics_path = kwargs.pop('metrics_path', None)
+        # JSON introspection endpoint under the resource when set, eg. 'admin'. Don't expose it publicly
+        self.admin_path = kwargs.pop('admin_path', None)
+        self.monitor = None  # engine.monitor.HubMonitor, see start_monitor
+        self.tracer = None  # engine.tracing.Tracer, see start_tracing
+        self.access_log = None  # engine.access_log.AccessLog, see start_access_log
+        self.handoff = None  # engine.handoff.Handoff of a pre-fork worker, passes upgrades to the session owner
+        self.takeover = None  # engine.takeover.Takeover, hands connections to the next process on reload
+        self.draining = False  # set by drain(), handshakes are refused from then on
+        self.drain_reconnect_delay = (1, 30)
+
+    @property
+    def worker_id(self):
+        return self._worker_id
+
+    @worker_id.setter
+    def worker_id(self, worker_id):
+        # Set by the pre-fork worker at start up, new session ids carry it from then on
+        self._worker_id = worker_id
+        self.sid_generator = SidGenerator(worker_id)
+
+    @property
+    def resource(self):
+        return self._resource
+
+    @resource.setter
+    def resource(self, resource):
+        self._resource = resource
+        # PATH_INFO prefix of engine requests, computed once
+        self.resource_prefix = '/' + resource.strip('/') + '/'
+
+    def generate_id(self):
+        """
+        Generate an id not used by any open socket
+        """
+        sid = self.sid_generator()
+        while sid in self.engine_sockets:
+            sid = self.sid_generator()
+        return sid
+
+    def start_monitor(self, **kwargs):
+        """
+        Start watching the hub for blocking greenlets and count greenlets by origin, reported in the metrics
+        :param kwargs: HubMonitor options, eg. threshold=.1
+        """
+        if self.monitor is None:
+            self.monitor = HubMonitor(self.metrics, hub_lag=self.hub_lag, **kwargs)
+        self.monitor.start()
+        return self.monitor
+
+    def start_tracing(self, sample_rate=.01, exporter=None):
+        """
+        Trace a sample of the received packets through decoding, handlers and flush, see engine.tracing
+        :param sample_rate: share of the received data traced, from 0 to 1
+        :param exporter: callable receiving each span as a dict, defaults to a Collector keeping them in memory
+        """
+        if self.tracer is not None:
+            self.tracer.stop()
+        self.tracer = Tracer(sample_rate, exporter)
+        self.tracer.start()
+        return self.tracer
+
+    def start_access_log(self, output, **kwargs):
+        """
+        Log the engine requests from a background writer instead of gevent's synchronous access log
+        :param output: path of the log file, or a file like object
+        :param kwargs: AccessLog options, eg. sample_rate=.1 to log one successful poll in ten
+        """
+        if self.access_log is not None:
+            self.access_log.stop()
+        self.access_log = AccessLog(output, **kwargs)
+        self.access_log.start()
+        return self.access_log
+
+    def stop(self):
+        """
+        Stop the background greenlets of the server, the registry sweeper, the monitor, the hub lag measure and the
+        access log writer. Called when serve returns
+        """
+        self.engine_sockets.stop()
+        if self.monitor is not None:
+            self.monitor.stop()
+        self.hub_lag.stop()
+        if self.access_log is not None:
+            self.access_log.stop()
+
+    def reconnect_delay_hint(self):
+        """
+        Seconds a client of a draining server should wait before reconnecting, random within drain_reconnect_delay so
+        the clients don't all come back at once
+        """
+        return round(random.uniform(*self.drain_reconnect_delay), 3)
+
+    def admit(self, address):
+        """
+        Decide whether a handshake from address may open a new session
+        :return: None if admitted, otherwise (reason, seconds the client should wait before trying again)
+        """
+        if self.draining:
+            return 'server draining', self.reconnect_delay_hint()
+        return self.admission.check(self, address)
+
+    def drain(self, wave_size=100, interval=1, reconnect_delay=None, close_timeout=10):
+        """
+        Refuse new handshakes and close the open sockets in waves, eg. before shutting down. Each client is told in
+        the close packet how long to wait before reconnecting, see reconnect_delay_hint.
+        Blocks until every socket is closed, spawn it to drain in the background.
+        :param wave_size: sockets closed at once
+        :param interval: seconds between two waves
+        :param reconnect_delay: (min, max) seconds clients wait before reconnecting
+        :param close_timeout: seconds a polling socket waits for the poll delivering its close packet
+        """
+        self.draining = True
+        if reconnect_delay is not None:
+            self.drain_reconnect_delay = reconnect_delay
+
+        engine_sockets = self.engine_sockets.values()
+        logger.debug('draining %d sockets in waves of %d', len(engine_sockets), wave_size)
+        for start in xrange(0, len(engine_sockets), wave_size):
+            if start:
+                gevent.sleep(interval)
+            for engine_socket in engine_sockets[start:start + wave_size]:
+                engine_socket.close(json.dumps({
+                    'reason': 'server drain',
+                    'reconnect_delay': self.reconnect_delay_hint(),
+                }), close_timeout)
+
+        # Polling sockets are closed once their next poll got the close packet
+        deadline = time.time() + close_timeout
+        while len(self.engine_sockets) and time.time() < deadline:
+            gevent.sleep(.1)
+
+    def describe_socket(self, sid):
+        """
+        :return: Details of the socket with sid, see engine.socket.Socket.describe. None if there is no such socket
+        """
+        socket = self.engine_sockets.get(sid, None)
+        return socket.describe() if socket is not None else None
+
+    def introspect(self, query):
+        """
+        Answer of the admin endpoint
+        :param query: the request's query, sid asks for the details of one socket
+        :return: json serializable, None when the thing asked for does not exist
+        """
+        if 'sid' in query:
+            return self.describe_socket(query['sid'])
+        return {
+            'sockets': len(self.engine_sockets),
+            'transports': dict((name, self.engine_sockets.count_by_transport(name))
+                               for name in ('polling', 'websocket')),
+        }
+
+    def session_state(self, engine_socket):
+        """
+        State of the session on top of engine_socket, passed to on_resume in the process taking the connection over.
+        Must be json serializable.
+        """
+        return {}
+
+    def on_resume(self, engine_socket, state):
+        """
+        Called when a connection taken over from another process is open again
+        :param engine_socket: The resumed engine socket
+        :param state: what session_state returned in the other process
+        """
+        pass
 
     def on_connection(self, engine_socket):
         """
@@ -40,18 +235,89 @@ Server.default_server = Server(transports=("polling", "websocket"))
 
 
 class EngineIOWSGIServer(WSGIServer):
-    def handle(self, socket, address):
-        handler = EngineHandler(Server.default_server, socket, address, self)
+    context_class = Server  # the requests are handled by context_class.default_server
+
+    def handle(self, socket, address, rfile=None):
+        track(gevent.getcurrent(), 'handler')
+        handler = EngineHandler(self.context_class.default_server, socket, address, self, rfile=rfile)
         handler.handle()
 
 
-def serve(app, **kw):
+def drain_on_signal(server_context, wsgi_server, options):
+    """
+    On SIGTERM drain server_context, then stop wsgi_server
+    :param options: keyword arguments of Server.drain
+    """
+    def drain():
+        server_context.drain(**options)
+        wsgi_server.stop()
+
+    gevent.signal(signal.SIGTERM, gevent.spawn, drain)
+
+
+def serve_wsgi(wsgi_server_class, app, **kw):
+    """
+    Run app with wsgi_server_class, serving the engine requests with its context_class.default_server
+    :param wsgi_server_class: EngineIOWSGIServer or a subclass
+    :param kw: host, port, workers, reuse_port, router, takeover, drain, monitor, access_log and stop_timeout, the
+        others are passed to wsgi_server_class
+    """
     host = kw.pop('host', '127.0.0.1')
     port = int(kw.pop('port', 6543))
+    workers = kw.pop('workers', None)
+    reuse_port = kw.pop('reuse_port', False)
+    router = kw.pop('router', False)
+    takeover = kw.pop('takeover', None)
+    drain = kw.pop('drain', None)
+    monitor = kw.pop('monitor', None)
+    access_log = kw.pop('access_log', None)
+    stop_timeout = kw.pop('stop_timeout', 10)
+
+    if workers and takeover:
+        raise ValueError('takeover is not supported in pre-fork mode')
+
+    server_context = wsgi_server_class.context_class.default_server
 
-    server = EngineIOWSGIServer((host, port),
-                                app,
-                                **kw)
+    def run(server):
+        if drain is not None:
+            drain_on_signal(server_context, server, drain)
+        if monitor is not None:
+            server_context.start_monitor(**monitor)
+        if access_log is not None:
+            server_context.start_access_log(**access_log)
+        try:
+            server.serve_forever()
+        finally:
+            server_context.stop()
+
+    if workers:
+        def serve_worker(worker_id, listener, handoff):
+            server_context.worker_id = worker_id
+            server_context.handoff = handoff
+            server_context.behind_router = router
+            server = wsgi_server_class(listener, app, **kw)
+            if handoff is not None:
+                handoff.start(server)
+            run(server)
+
+        print('serving on http://%s:%s with %d workers' % (host, port, workers))
+        Prefork((host, port), serve_worker, workers, reuse_port=reuse_port, router=router,
+                stop_timeout=stop_timeout).run()
+        return
+
+    listener = (host, port)
+    if takeover is not None:
+        # Graceful reload, start the new process with the same takeover path and the old one hands over
+        takeover = Takeover(takeover, server_context)
+        listener = takeover.take() or listener
+
+    server = wsgi_server_class(listener, app, **kw)
+    if takeover is not None:
+        takeover.start(server)
 
     print('serving on http://%s:%s' % (host, port))
-    server.serve_forever()
\ No newline at end of file
+    run(server)
+
+
+def serve(app, **kw):
+    serve_wsgi(EngineIOWSGIServer, app, **kw)
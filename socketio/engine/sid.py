@@ -0,0 +1,66 @@
+# coding=utf-8
+"""
+Session id generation. Ids are 120 random bits from os.urandom, optionally prefixed with the id of the worker owning
+the session, so a front proxy or a peer worker can route a request to the owner by looking at the sid only.
+"""
+import os
+import base64
+
+__all__ = ['SidGenerator', 'generate_id', 'worker_of']
+
+# Bytes of randomness per id, a multiple of 3 so the base64 form has no padding
+ID_BYTES = 15
+
+# Separates the worker id from the random part, never produced by urlsafe base64
+SEPARATOR = '.'
+
+
+class SidGenerator(object):
+    """
+    Generates session ids. Random bytes are read from os.urandom in batches to save syscalls.
+    """
+
+    def __init__(self, worker_id=None, batch=256):
+        """
+        :param worker_id: int identifying the worker, None for no prefix
+        :param batch: number of ids worth of random bytes read at once
+        """
+        self.worker_id = worker_id
+        self.prefix = '' if worker_id is None else '%d%s' % (worker_id, SEPARATOR)
+        self.batch = batch
+        self.pool = ''
+        self.offset = 0
+        self.pid = None
+
+    def __call__(self):
+        # Don't share the pool with a forked process, both sides would hand out the same ids
+        if self.offset >= len(self.pool) or self.pid != os.getpid():
+            self.pool = os.urandom(ID_BYTES * self.batch)
+            self.offset = 0
+            self.pid = os.getpid()
+
+        chunk = self.pool[self.offset:self.offset + ID_BYTES]
+        self.offset += ID_BYTES
+        return self.prefix + base64.urlsafe_b64encode(chunk)
+
+
+def worker_of(sid):
+    """
+    Get the worker id embedded in sid
+    :param sid: The session id
+    :return: int worker id, None if the sid carries no worker id
+    """
+    if not sid:
+        return None
+
+    prefix, separator, _ = sid.partition(SEPARATOR)
+    if not separator:
+        return None
+
+    try:
+        return int(prefix)
+    except ValueError:
+        return None
+
+
+generate_id = SidGenerator()
@@ -2,21 +2,35 @@
 Engine socket, a abstract layer for all transports internal api. It is created by Engine.handler with proper parameters
 and used by socketio.socket.
 """
+import os
 import json
+import time
 
-import random
 import logging
+import itertools
 
 import transports
 import gevent
-from gevent.queue import Queue
+from gevent.queue import Queue, PriorityQueue
 from ..event_emitter import EventEmitter
+from .sid import generate_id
+from .monitor import track
+from . import tracing
+from . import capture
 
 
-__all__ = ['Socket']
+__all__ = ['Socket', 'PRIORITY_HIGH', 'PRIORITY_NORMAL', 'PRIORITY_LOW']
 
 logger = logging.getLogger(__name__)
 
+# Write buffer lanes, lower value flushed first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Control packets always go in the high lane, so pongs are not stuck behind bulk data
+control_packet_types = ('open', 'close', 'ping', 'pong', 'upgrade', 'noop')
+
 handler_types = {
     'websocket': transports.WebsocketTransport,
     'polling': transports.XHRPollingTransport,
@@ -76,6 +90,8 @@ class Socket(EventEmitter):
     open: the socket is set up, transport is ready to send data
     packet: received a packet from underlying transport
     message: received a message packet from underlying transport
+    state: the ready_state changed
+    upgrade: the socket switched to the upgraded transport
     close: the socket closed
 
     Event Loop
@@ -100,20 +116,35 @@ class Socket(EventEmitter):
     STATE_CLOSING = "CLOSING"
     STATE_CLOSED = "CLOSED"
 
-    def __init__(self, request, supports_binary=True, ping_interval=5000, ping_timeout=10000, upgrade_timeout=30):
+    def __init__(self, request, supports_binary=True, ping_interval=5000, ping_timeout=10000, upgrade_timeout=30,
+                 flush_window=0, sid=None, metrics=None):
         super(Socket, self).__init__()
 
         self.request = request
 
-        self.id = str(random.random())[2:]
+        self.id = sid if sid is not None else generate_id()
         self.ready_state = self.STATE_NEW
         self.upgraded = False
+        self.last_activity = time.time()
 
         self.ping_interval = ping_interval
         self.ping_timeout = ping_timeout
         self.upgrade_timeout = upgrade_timeout
 
-        self.write_buffer = Queue()  # queue for messages to client
+        # Microseconds to hold written packets before flushing them to transport. 0 means flush once at the end of
+        # the current hub iteration, so all writes made by one handler go out together.
+        self.flush_window = flush_window
+        self.flush_scheduled = False
+
+        self.metrics = metrics  # engine.metrics.EngineMetrics of the server, None to not count packets
+        # Traffic of this socket, payload lengths as in the metrics
+        self.packets_received = 0
+        self.packets_sent = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+        self.write_buffer = PriorityQueue()  # queue for messages to client, items are (priority, seq, packet)
+        self.write_seq = itertools.count()  # keeps FIFO order inside one priority lane
         self.server_queue = Queue()  # queue for messages to server
 
         self.wsgi_app_greenlet = None
@@ -122,8 +153,10 @@ class Socket(EventEmitter):
         self.ping_timeout_eventlet = None
         self.check_eventlet = None
         self.upgrade_eventlet = None
+        self.close_eventlet = None
 
         self.context = {} # Holder for framework specific data.
+        self.context_bound_at = None  # When the framework application last filled the context
 
         transport_name = request.GET.get("transport", None)
 
@@ -132,8 +165,14 @@ class Socket(EventEmitter):
         self._set_transport(transport)
         self.process_request(request)
 
-    def debug(self, message):
-        logger.debug(u"[EngineSocket][%s][id:%s] %s" % (self.ready_state, self.id, message))
+    def _set_ready_state(self, state):
+        self.ready_state = state
+        self.emit('state', state)
+
+    def debug(self, message, *args):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(u"[EngineSocket][%s][id:%s] %s", self.ready_state, self.id,
+                         message % args if args else message)
 
     def _create_transport(self, request, supports_binary, transport_name):
         if transport_name not in handler_types:
@@ -164,7 +203,7 @@ class Socket(EventEmitter):
         The socket is ready to go
         :return:
         """
-        self.ready_state = self.STATE_OPEN
+        self._set_ready_state(self.STATE_OPEN)
         self.send_packet(
             "open",
             json.dumps({
@@ -173,9 +212,81 @@ class Socket(EventEmitter):
                 "pingInterval": 30000,
                 "pingTimeout": 60000})
         )
+        capture.opened(self)
+        self.emit("open")
+        self._set_ping_timeout_eventlet()
+
+    def resume(self, packets=()):
+        """
+        Open a socket taken over from another process, the client already has the handshake
+        :param packets: (priority, packet) the other process had buffered for the client, in the order to send them
+        """
+        self._set_ready_state(self.STATE_OPEN)
+        for priority, packet in packets:
+            self.put_client_msg(packet, priority)
+        self._schedule_flush()
+        capture.opened(self)
         self.emit("open")
         self._set_ping_timeout_eventlet()
 
+    def detach(self):
+        """
+        Stop using the websocket connection without closing it, so another process can resume the session on it.
+        The socket stays open until on_close is called, writes are buffered and never sent.
+        :return: dict with fd (a duplicate the caller has to close) and its address family, pending bytes, buffered
+            (priority, packet) in the order they would have been sent, the request environ and supports_binary. None if
+            the socket can't be detached: not open, not on websocket or the connection was not set up for hand off.
+        """
+        if self.STATE_OPEN != self.ready_state or self.transport.name != 'websocket':
+            return None
+
+        request = self.transport.request
+        connection = request.handler.socket
+        fd = os.dup(connection.fileno())
+        pending = self.transport.detach()
+        if pending is None:
+            os.close(fd)
+            return None
+
+        packets = []
+        while self.write_buffer.qsize():
+            priority, seq, packet, span = self.write_buffer.get()
+            packets.append((priority, packet))
+
+        return {
+            'fd': fd,
+            'family': connection.family,
+            'pending': pending,
+            'packets': packets,
+            'environ': request.environ,
+            'supports_binary': self.transport.supports_binary,
+        }
+
+    def describe(self):
+        """
+        Details of the socket for introspection, read from counters kept up to date
+        """
+        transport = self.transport
+        return {
+            'sid': self.id,
+            'state': self.ready_state,
+            'transport': transport.name if transport is not None else None,
+            'upgraded': self.upgraded,
+            'upgrading': self.upgrade_eventlet is not None and not self.upgrade_eventlet.ready(),
+            'queued_packets': self.write_buffer.qsize() if self.write_buffer is not None else 0,
+            'packets_received': self.packets_received,
+            'packets_sent': self.packets_sent,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'last_activity': self.last_activity,
+        }
+
+    def refresh_context(self):
+        """
+        Run the framework application again on the next polling request to refresh the context, eg. after login
+        """
+        self.context_bound_at = None
+
     def process_request(self, request):
         """
         Process the incoming request
@@ -188,14 +299,23 @@ class Socket(EventEmitter):
         :param packet:
         """
 
-        self.debug("Received packet: %s" % str(packet))
+        self.debug("Received packet: %s", packet)
 
         if self.STATE_OPEN == self.ready_state:
+            self.last_activity = time.time()
+            tracing.stage('engine_decoded', self.id)
+            capture.packet(self, '<', packet)
+            packet_type = packet["type"]
+            size = len(packet.get('data', None) or '')
+            self.packets_received += 1
+            self.bytes_received += size
+            if self.metrics is not None:
+                self.metrics.packets_received.inc(label=packet_type)
+                self.metrics.bytes_received.inc(size)
+
             self.emit("packet", packet)
             self._set_ping_timeout_eventlet()
 
-            packet_type = packet["type"]
-
             if packet_type == 'ping':
                 self.debug("got ping, send pong")
                 self.send_packet('pong')
@@ -213,7 +333,7 @@ class Socket(EventEmitter):
         """
         Invoked when an error message received from transport
         """
-        self.debug("transport error: %s" % error)
+        self.debug("transport error: %s", error)
         self.on_close('transport error', error)
 
     def on_close(self, *args, **kwargs):
@@ -224,7 +344,7 @@ class Socket(EventEmitter):
             self.debug("Socket on close, clean things up")
 
             if self.STATE_CLOSING != self.ready_state:
-                self.ready_state = self.STATE_CLOSING
+                self._set_ready_state(self.STATE_CLOSING)
 
             self.debug("Clean ping job")
             if self.ping_timeout_eventlet:
@@ -241,16 +361,26 @@ class Socket(EventEmitter):
                 gevent.kill(self.upgrade_eventlet)
                 self.upgrade_eventlet = None
 
+            if self.close_eventlet:
+                gevent.kill(self.close_eventlet)
+                self.close_eventlet = None
+
             self.debug("clean transport")
             self._clear_transport()
-            self.ready_state = self.STATE_CLOSED
+            self._set_ready_state(self.STATE_CLOSED)
 
+            capture.closed(self)
             self.debug("Emit close to listeners")
             self.emit("close", "Transport closed", *args, **kwargs)
+
+            # The spans of the packets never sent finish as dropped, see engine.tracing
+            traced = [item[3] for item in self.write_buffer.queue if item[3] is not None]
+            for span in set(traced):
+                span.dropped(traced.count(span))
             self.write_buffer = None
 
     def maybe_upgrade(self, transport):
-        self.debug("might upgrade from %s to %s" % (self.transport.name, transport.name))
+        self.debug("might upgrade from %s to %s", self.transport.name, transport.name)
 
         def fail_upgrade():
             self.debug('client did not complete upgrade - closing transport')
@@ -262,7 +392,7 @@ class Socket(EventEmitter):
             if 'open' == transport.ready_state:
                 transport.close()
 
-        self.upgrade_eventlet = gevent.spawn_later(self.upgrade_timeout, fail_upgrade)
+        self.upgrade_eventlet = track(gevent.spawn_later(self.upgrade_timeout, fail_upgrade), 'upgrade_timeout')
 
         def check():
             if 'polling' == self.transport.name and self.transport.writable:
@@ -286,7 +416,7 @@ class Socket(EventEmitter):
                         gevent.sleep(1)
                         check()
 
-                self.check_eventlet = gevent.Greenlet.spawn(loop)
+                self.check_eventlet = track(gevent.Greenlet.spawn(loop), 'upgrade_check')
 
             elif 'upgrade' == packet["type"] and self.ready_state == self.STATE_OPEN:
                 self.debug("got upgrade packet - upgrading")
@@ -297,6 +427,7 @@ class Socket(EventEmitter):
                 self._set_transport(transport)
 
                 self.upgraded = True
+                self.emit('upgrade', transport)
                 self._set_ping_timeout_eventlet()
                 gevent.kill(self.upgrade_eventlet)
                 self.flush_nowait()
@@ -315,7 +446,8 @@ class Socket(EventEmitter):
 
         def time_out():
             self.on_close('ping timeout')
-        self.ping_timeout_eventlet = gevent.spawn_later(self.ping_interval + self.ping_timeout, time_out)
+        self.ping_timeout_eventlet = track(gevent.spawn_later(self.ping_interval + self.ping_timeout, time_out),
+                                           'ping_timeout')
 
     def __str__(self):
         result = ['sessid=%r' % self.id]
@@ -323,22 +455,25 @@ class Socket(EventEmitter):
             result.append('open')
         return ' '.join(result)
 
-    def send(self, data):
+    def send(self, data, priority=PRIORITY_NORMAL):
         """
         Shortcut for send message packet
         :param data: The data to be send
+        :param priority: The write buffer lane, PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
         :return: None
         """
-        self.send_packet('message', data)
+        self.send_packet('message', data, priority)
 
     # shortcut
     write = send
 
-    def send_packet(self, packet_type, data=None):
+    def send_packet(self, packet_type, data=None, priority=None):
         """
         the primary send_packet method
+        :param priority: The write buffer lane. Defaults to PRIORITY_HIGH for control packets and PRIORITY_NORMAL
+        for messages
         """
-        self.debug('send_packet in socket data [%s]' % data if type(data) is str else "BINARY")
+        self.debug('send_packet in socket data [%s]', data if type(data) is str else "BINARY")
         packet = {
             "type": packet_type
         }
@@ -346,9 +481,30 @@ class Socket(EventEmitter):
         if data is not None:
             packet["data"] = data
 
+        if priority is None:
+            priority = PRIORITY_HIGH if packet_type in control_packet_types else PRIORITY_NORMAL
+
         if self.ready_state != self.STATE_CLOSING:
-            self.put_client_msg(packet)
-            self.flush()
+            self.put_client_msg(packet, priority)
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """
+        Coalesce writes: the buffer is flushed once per hub iteration, or after flush_window microseconds
+        """
+        if self.flush_scheduled:
+            return
+
+        self.flush_scheduled = True
+        if self.flush_window:
+            track(gevent.spawn_later(self.flush_window / 1000000.0, self._scheduled_flush), 'flush_window')
+        else:
+            gevent.get_hub().loop.run_callback(self._scheduled_flush)
+
+    def _scheduled_flush(self):
+        self.flush_scheduled = False
+        if self.ready_state != self.STATE_CLOSED and self.transport is not None:
+            self.flush_nowait()
 
     def flush_nowait(self):
         """
@@ -362,33 +518,76 @@ class Socket(EventEmitter):
         Flush write buffer, if buffer is empty, wait on it.
         :param nowait: Whether wait on write buffer or return directly
         """
-        self.debug("entering flushing buffer to transport " + str(self.transport.writable) + " " + str(self.write_buffer.qsize()))
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.debug("entering flushing buffer to transport %s %s", self.transport.writable,
+                       self.write_buffer.qsize())
         if self.ready_state != self.STATE_CLOSED and self.transport.writable:
             if nowait and self.write_buffer.qsize() == 0:
                 return
 
-            self.debug('wait for the queue %s' % self.write_buffer.qsize())
-            msg = [self.write_buffer.get()]
+            if debug:
+                self.debug('wait for the queue %s', self.write_buffer.qsize())
+            items = [self.write_buffer.get()]
             while self.write_buffer.qsize():
-                msg.append(self.write_buffer.get())
+                items.append(self.write_buffer.get())
+            msg = [item[2] for item in items]
+            if capture._active is not None:
+                for packet in msg:
+                    capture.packet(self, '>', packet)
+
+            metrics = self.metrics
+            for packet in msg:
+                size = len(packet.get('data', None) or '')
+                self.bytes_sent += size
+                if metrics is not None:
+                    metrics.packets_sent.inc(label=packet['type'])
+                    metrics.bytes_sent.inc(size)
+            self.packets_sent += len(msg)
 
             self.debug("flushing buffer to transport")
             self.transport.send(msg)
 
-    def close(self):
+            traced = [item[3] for item in items if item[3] is not None]
+            for span in set(traced):
+                span.sent(traced.count(span))
+
+    def close(self, data=None, timeout=10):
         """
         Close the socket. The ready_state change from STATE_OPEN -> STATE_CLOSING.
         When transport closed, the on_close be called and STATE_CLOSING -> STATE_CLOSED.
+        :param data: sent in a close packet after the buffered packets, eg. the reconnect hint of Server.drain. A
+            polling socket without a pending poll stays CLOSING until the next poll delivered it
+        :param timeout: seconds to wait for that poll before closing anyway
         :return:
         """
         if self.STATE_OPEN == self.ready_state:
-            self.ready_state = self.STATE_CLOSING
+            self._set_ready_state(self.STATE_CLOSING)
+            if data is not None:
+                self.put_client_msg({'type': 'close', 'data': data}, PRIORITY_LOW)
+                if 'polling' == self.transport.name and not self.transport.writable:
+                    self.debug('waiting for the next poll to send the close packet')
+                    # Runs after flush_nowait, the first drain listener, see _set_transport
+                    self.transport.once('drain', self._close_transport, id(self))
+                    self.close_eventlet = track(gevent.spawn_later(timeout, self._close_transport), 'close_timeout')
+                    return
+                self.flush_nowait()
+            self._close_transport()
+
+    def _close_transport(self):
+        if self.close_eventlet is gevent.getcurrent():
+            self.close_eventlet = None
+        if self.STATE_CLOSING == self.ready_state:
             self.transport.close()
             self.on_close('closed by server')
 
-    def put_client_msg(self, msg):
+    def put_client_msg(self, msg, priority=PRIORITY_NORMAL):
         """Writes to the client's pipe, to end up in the browser"""
-        self.write_buffer.put(msg)
+        span = tracing.current()
+        if span is not None:
+            span.queued()
+        # The span of the traced data which caused the write rides along, see engine.tracing
+        self.write_buffer.put((priority, next(self.write_seq), msg, span))
 
     def error(self, error_name, error_message, endpoint=None, msg_id=None,
               quiet=False):
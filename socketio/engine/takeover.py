@@ -0,0 +1,215 @@
+# coding=utf-8
+"""
+Graceful reload. A new process started with the same takeover path connects to the running process, which hands
+over its listening socket, then every websocket connection with the state of its session: the sid, the bytes read
+but not processed yet, the packets buffered for the client and whatever the server's session_state returns, eg. the
+namespaces and rooms. The new process resumes these sessions on the same connections, the clients don't notice.
+Polling sessions can't be moved, they are closed and their clients reconnect to the new process. The old process
+stops once everything is handed over.
+
+Afterwards the new process listens on the takeover path itself, ready for the next reload.
+"""
+from __future__ import absolute_import
+
+import os
+import errno
+import logging
+
+import gevent
+from gevent import socket
+from gevent.server import StreamServer
+from geventwebsocket.websocket import WebSocket, Stream
+
+from .handler import EngineHandler
+from .handoff import MarkedReader, send_message, receive_message
+from .request import Request
+from .response import Response
+from .socket import Socket, PRIORITY_NORMAL
+
+__all__ = ['Takeover']
+
+logger = logging.getLogger(__name__)
+
+
+def encode_packet(packet):
+    """
+    Engine packet to json, binary data and byte strings are passed as latin-1
+    """
+    data = packet.get('data', None)
+    if type(data) is bytearray:
+        return {'type': packet['type'], 'binary': str(data)}
+    if type(data) is str:
+        return {'type': packet['type'], 'bytes': data}
+    return {'type': packet['type'], 'data': data}
+
+
+def decode_packet(message):
+    packet = {'type': str(message['type'])}
+    if 'binary' in message:
+        packet['data'] = bytearray(message['binary'].encode('latin-1'))
+    elif 'bytes' in message:
+        packet['data'] = message['bytes'].encode('latin-1')
+    elif message['data'] is not None:
+        packet['data'] = message['data']
+    return packet
+
+
+class Takeover(object):
+    """
+    Hands the connections of this process to the next one, and takes them over from the previous one.
+    """
+
+    def __init__(self, path, server_context, timeout=10):
+        """
+        :param path: Unix socket path, the same for every generation of the process
+        :param server_context: The engine Server
+        :param timeout: seconds the old process waits for its connections to finish after handing over
+        """
+        self.path = path
+        self.server_context = server_context
+        self.timeout = timeout
+        self.connection = None  # to the previous process, while taking over
+        self.wsgi_server = None
+        self.receiver = None
+
+    def take(self):
+        """
+        Ask the process listening on path to hand over
+        :return: The listening socket of the previous process, None if there is none
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+        except socket.error, e:
+            if e.args[0] not in (errno.ENOENT, errno.ECONNREFUSED):
+                raise
+            connection.close()
+            return None
+
+        message, fd = receive_message(connection)
+        try:
+            listener = socket.fromfd(fd, message['family'], socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+        listener.setblocking(0)
+
+        logger.debug('[Takeover] got the listening socket')
+        self.connection = connection
+        return listener
+
+    def start(self, wsgi_server):
+        """
+        Resume the sessions of the previous process if taking over, and listen on path for the next one
+        :param wsgi_server: The server handling this process' connections
+        """
+        self.wsgi_server = wsgi_server
+        self.server_context.takeover = self
+
+        if self.connection is not None:
+            gevent.spawn(self._take_sessions)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(1)
+        self.receiver = StreamServer(listener, self.give)
+        self.receiver.start()
+
+    def _take_sessions(self):
+        connection, self.connection = self.connection, None
+        count = 0
+        try:
+            while True:
+                message, fd = receive_message(connection)
+                if message['type'] == 'done':
+                    break
+                try:
+                    self.resume(message, fd)
+                    count += 1
+                except Exception:
+                    logger.exception('[Takeover] resuming session %s failed', message.get('sid'))
+        except (socket.error, OSError, ValueError), e:
+            logger.warning('[Takeover] taking sessions over failed: %s', e)
+        finally:
+            connection.close()
+        logger.debug('[Takeover] resumed %d sessions', count)
+
+    def resume(self, message, fd):
+        """
+        Open the engine socket of a session handed over by the previous process on its connection
+        """
+        try:
+            connection = socket.fromfd(fd, message['family'], socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+
+        environ = dict((str(key), value.encode('latin-1')) for key, value in message['environ'].items())
+        address = (environ.get('REMOTE_ADDR', ''), int(environ.get('REMOTE_PORT', 0) or 0))
+
+        handler = EngineHandler(self.server_context, connection, address, self.wsgi_server,
+                                rfile=MarkedReader(connection, message['pending'].encode('latin-1')))
+        handler.environ = environ
+
+        request = Request(environ, handler=handler, response=Response())
+        request.reader = handler.rfile
+        request.websocket = WebSocket(environ, Stream(handler), handler)
+
+        engine_socket = Socket(request, supports_binary=message['supports_binary'],
+                               flush_window=self.server_context.flush_window, sid=str(message['sid']),
+                               metrics=self.server_context.metrics)
+        engine_socket.on('close', lambda *args, **kwargs: connection.close())
+
+        self.server_context.engine_sockets.add(engine_socket)
+        engine_socket.resume([(packet.get('priority', PRIORITY_NORMAL), decode_packet(packet))
+                              for packet in message['packets']])
+        self.server_context.on_resume(engine_socket, message['session'])
+
+    def give(self, connection, address):
+        """
+        Hand this process over to the process which connected
+        """
+        logger.debug('[Takeover] handing over to the next process')
+        listener = self.wsgi_server.socket
+        send_message(connection, {'type': 'listener'}, listener.fileno(), listener.family)
+        self.wsgi_server.stop_accepting()
+
+        engine_sockets = self.server_context.engine_sockets.values()
+
+        # Detach them all before closing any, so what the application does on disconnect doesn't reach clients
+        # which are handed over
+        detached = []
+        for engine_socket in engine_sockets:
+            state = engine_socket.detach()
+            if state is not None:
+                detached.append((engine_socket, state))
+        detached_ids = set(engine_socket.id for engine_socket, state in detached)
+
+        for engine_socket, state in detached:
+            message = {
+                'type': 'session',
+                'sid': engine_socket.id,
+                'pending': state['pending'],
+                'packets': [dict(encode_packet(packet), priority=priority) for priority, packet in state['packets']],
+                'environ': dict((key, value) for key, value in state['environ'].items() if type(value) is str),
+                'supports_binary': state['supports_binary'],
+                'session': self.server_context.session_state(engine_socket),
+            }
+            try:
+                send_message(connection, message, state['fd'], state['family'])
+            except (socket.error, OSError), e:
+                logger.warning('[Takeover] handing session %s over failed: %s', engine_socket.id, e)
+            finally:
+                os.close(state['fd'])
+
+        for engine_socket in engine_sockets:
+            if engine_socket.id in detached_ids:
+                engine_socket.on_close('handed over')
+            else:
+                engine_socket.close()
+
+        send_message(connection, {'type': 'done'})
+        logger.debug('[Takeover] handed over %d sessions', len(detached))
+
+        self.receiver.stop_accepting()
+        gevent.spawn(self.wsgi_server.stop, self.timeout)
@@ -0,0 +1,188 @@
+# coding=utf-8
+"""
+Sampled packet tracing. A span follows one websocket message or one polling payload from its arrival through the
+engine and socket.io decoding, the event handlers and the flush of the packets written meanwhile, with a timestamp at
+each stage:
+
+    received          the transport got the data
+    engine_decoded    the engine socket got the packet
+    socketio_decoded  the socket.io packet is decoded
+    handler           the event handlers are called
+    handled           the event handlers returned
+    processed         everything the data triggered ran
+    queued            a packet was written to the client, once per packet
+    sent              the transport wrote it out, once per flush
+    dropped           the socket closed with some of its packets still buffered
+
+The span is exported once processed and all its packets are sent or dropped, with status 'ok' or 'dropped'. The
+stages in between tell parsing, handler and queueing time apart, sent minus queued is the time spent waiting for the
+flush or for the client's next poll.
+
+Like engine.monitor.track, the functions here return at once when no tracer runs.
+"""
+import json
+import time
+import random
+import logging
+from collections import deque
+
+import gevent
+
+__all__ = ['Tracer', 'Collector', 'FileExporter', 'begin', 'end', 'stage', 'current']
+
+logger = logging.getLogger(__name__)
+
+_active = None  # the running Tracer
+
+
+def begin(transport):
+    """
+    Start a span for the data a transport just received, if it is sampled. It becomes the current span of the greenlet.
+    :param transport: transport name
+    :return: The span, None if not traced
+    """
+    if _active is None:
+        return None
+    return _active.begin(transport)
+
+
+def end(span):
+    """
+    Processing of the data of span finished
+    """
+    if span is not None:
+        span.mark('processed')
+        span.processing = False
+        gevent.getcurrent().trace_span = None
+        span.maybe_finish()
+
+
+def current():
+    """
+    :return: The span of the data the current greenlet processes, None if it is not traced
+    """
+    if _active is None:
+        return None
+    return getattr(gevent.getcurrent(), 'trace_span', None)
+
+
+def stage(name, sid=None):
+    """
+    Record a stage in the current span
+    """
+    if _active is None:
+        return
+    span = getattr(gevent.getcurrent(), 'trace_span', None)
+    if span is not None:
+        if sid is not None:
+            span.sid = sid
+        span.mark(name)
+
+
+class Span(object):
+    __slots__ = ('tracer', 'trace_id', 'transport', 'sid', 'stages', 'pending', 'processing', 'status')
+
+    def __init__(self, tracer, transport):
+        self.tracer = tracer
+        self.trace_id = '%016x' % random.getrandbits(64)
+        self.transport = transport
+        self.sid = None
+        self.stages = [('received', time.time())]
+        self.pending = 0  # packets written and not sent yet
+        self.processing = True
+        self.status = 'ok'
+
+    def mark(self, name):
+        self.stages.append((name, time.time()))
+
+    def queued(self):
+        self.pending += 1
+        self.mark('queued')
+
+    def sent(self, count):
+        self.pending -= count
+        self.mark('sent')
+        self.maybe_finish()
+
+    def dropped(self, count):
+        self.pending -= count
+        self.status = 'dropped'
+        self.mark('dropped')
+        self.maybe_finish()
+
+    def maybe_finish(self):
+        if not self.processing and self.pending <= 0:
+            self.tracer.export(self)
+
+    def to_dict(self):
+        start = self.stages[0][1]
+        return {
+            'trace_id': self.trace_id,
+            'sid': self.sid,
+            'transport': self.transport,
+            'status': self.status,
+            'start': start,
+            # milliseconds since received
+            'stages': [[name, round((at - start) * 1000, 3)] for name, at in self.stages],
+        }
+
+
+class Collector(object):
+    """
+    Keeps the latest spans in memory
+    """
+
+    def __init__(self, max_spans=1000):
+        self.spans = deque(maxlen=max_spans)
+
+    def __call__(self, span):
+        self.spans.append(span)
+
+
+class FileExporter(object):
+    """
+    Appends spans to a file, one json object per line
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def __call__(self, span):
+        self.file.write(json.dumps(span) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Tracer(object):
+    """
+    sample_rate: share of the received data traced, from 0 to 1
+    exporter: callable receiving each finished span as a dict, eg. Collector or FileExporter
+    """
+
+    def __init__(self, sample_rate=.01, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter if exporter is not None else Collector()
+
+    def start(self):
+        global _active
+        _active = self
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+
+    def begin(self, transport):
+        if random.random() >= self.sample_rate:
+            return None
+        span = Span(self, transport)
+        gevent.getcurrent().trace_span = span
+        return span
+
+    def export(self, span):
+        try:
+            self.exporter(span.to_dict())
+        except Exception:
+            logger.exception('[Tracer] exporting span %s failed', span.trace_id)
@@ -7,10 +7,18 @@ import logging
 
 from ..event_emitter import EventEmitter
 from .parser import Parser
+from .monitor import track
+from . import tracing
 from socketio.engine.response import Response
 
 logger = logging.getLogger(__name__)
 
+# Precomputed response header tuples
+text_headers = [('Content-Type', 'text/plain; charset=UTF-8')]
+binary_headers = [('Content-Type', 'application/octet-stream')]
+xss_headers = [('X-XSS-Protection', '0')]
+data_response_headers = [('Content-Type', 'text/html')]
+
 
 class BaseTransport(EventEmitter):
     """
@@ -54,11 +62,13 @@ class BaseTransport(EventEmitter):
         self.writable = False
         self.should_close = False
 
-    def debug(self, message):
+    def debug(self, message, *args):
         """
-        The logging entry
+        The logging entry, message is formatted with args only when debug logging is enabled
         """
-        logger.debug("[Transport:%s][%s][%s] %s" % (self.name, self.ready_state, self.writable, message))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[Transport:%s][%s][%s] %s", self.name, self.ready_state, self.writable,
+                         message % args if args else message)
 
     def send(self, packets):
         """
@@ -81,7 +91,7 @@ class BaseTransport(EventEmitter):
         :return:
         """
         self.ready_state = 'closing'
-        if not self.request.response.is_set:
+        if self.request is not None and not self.request.response.is_set:
             # Close the response when the transport closes
             self.request.response.end(200, 'closed')
         self.do_close()
@@ -110,7 +120,7 @@ class BaseTransport(EventEmitter):
                 'description': message
             })
         else:
-            self.debug("Ignored transoport error %s" % message)
+            self.debug("Ignored transoport error %s", message)
 
     def on_packet(self, packet):
         self.emit('packet', packet)
@@ -188,16 +198,13 @@ class PollingTransport(BaseTransport):
         self.data_request = request
         self.data_request.response.on('post_end', self._cleanup_data)
 
-        chunks = bytearray() if is_binary else ''
+        body = self.data_request.body
+        self.on_data(bytearray(body) if is_binary else body)
 
-        chunks += self.data_request.body
-        self.on_data(chunks)
-        self.data_request.response.headers = self.data_request.headers
-        self.data_request.response.headers.update({
-            'Content-Length': 2,
-            'Content-Type': 'text/html'
-        })
-        self.data_request.response.end(status_code=200, body='ok')
+        response = self.data_request.response
+        response.headers.extend(data_response_headers)
+        response.headers.extend(self.cors_headers(request))
+        response.end(status_code=200, body='ok')
 
     def on_data(self, data):
         """
@@ -206,14 +213,18 @@ class PollingTransport(BaseTransport):
         :return:
         """
 
-        self.debug('received %s' % data)
+        self.debug('received %s', data)
 
-        for packet, index, total in Parser.decode_payload(data):
-            if packet['type'] == 'close':
-                self.debug('got xhr close packet')
-                self.close()
-                break
-            self.on_packet(packet)
+        span = tracing.begin(self.name)
+        try:
+            for packet, index, total in Parser.decode_payload(data):
+                if packet['type'] == 'close':
+                    self.debug('got xhr close packet')
+                    self.close()
+                    break
+                self.on_packet(packet)
+        finally:
+            tracing.end(span)
 
     def send(self, packets):
         """
@@ -231,6 +242,9 @@ class PollingTransport(BaseTransport):
     def write(self, data):
         raise NotImplementedError()
 
+    def cors_headers(self, request):
+        return request.handler.server_context.cors.headers(request.headers.get('origin', None))
+
     def do_close(self):
         self.debug('closing')
 
@@ -250,44 +264,19 @@ class PollingTransport(BaseTransport):
 
 
 class XHRPollingTransport(PollingTransport):
-
-    def process_request(self, request):
-        super(XHRPollingTransport, self).process_request(request)
-
-        if 'OPTIONS' == request.method:
-            request.response.headers = self.handler.request.headers
-            request.response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-            request.response.status = 200
+    # Preflight OPTIONS requests are answered by the EngineHandler
 
     def write(self, data):
-        is_string = type(data) == str
-        content_type = 'text/plain; charset=UTF-8' if is_string else 'application/octet-stream'
-        content_length = str(len(data))
-
-        headers = {
-            'Content-Type': content_type,
-            'Content-Length': content_length
-        }
+        response = self.request.response
+        response.headers.extend(text_headers if type(data) == str else binary_headers)
 
-        ua = self.request.headers['user-agent']
+        ua = self.request.headers.get('user-agent', None)
         if ua and (ua.find(';MSIE') == -1 or ua.find('Trident/') == -1):
-            headers['X-XSS-Protection'] = '0'
-
-        headers = self.merge_headers(self.request, headers)
-        self.request.response.headers = headers
-        self.request.response.body += bytes(data)
-        self.request.response.end()
-
-    def merge_headers(self, request, headers=None):
-        if not headers:
-            headers = {}
+            response.headers.extend(xss_headers)
 
-        if 'origin' in request.headers:
-            headers['Access-Control-Allow-Credentials'] = 'true'
-            headers['Access-Control-Allow-Origin'] = request.headers['origin']
-        else:
-            headers['Access-Control-Allow-Origin'] = '*'
-        return headers
+        response.headers.extend(self.cors_headers(self.request))
+        response.body = data
+        response.end()
 
 
 class JSONPollingTransport(PollingTransport):
@@ -329,6 +318,7 @@ class WebsocketTransport(BaseTransport):
         if hasattr(request, 'websocket'):
             self.websocket = request.websocket
             self.writable = True
+            reader = getattr(request, 'reader', None)  # MarkedReader when the connection can be handed off
 
             def read_from_ws():
                 while True:
@@ -340,7 +330,13 @@ class WebsocketTransport(BaseTransport):
                     if message is None:
                         break
 
-                    self.on_data(message)
+                    if reader is not None:
+                        reader.mark()
+                    span = tracing.begin(self.name)
+                    try:
+                        self.on_data(message)
+                    finally:
+                        tracing.end(span)
 
                 # Here the websocket break, means it is closed
                 self.debug("websocket closed")
@@ -350,7 +346,7 @@ class WebsocketTransport(BaseTransport):
                 except Response.ResponseAlreadyEnded:
                     self.debug("The websocket already ended, ignore this exception")
 
-            job = gevent.spawn(read_from_ws)
+            job = track(gevent.spawn(read_from_ws), 'websocket_reader')
             self.jobs.append(job)
         else:
             request.response.end(500, 'not able to create websocket')
@@ -358,7 +354,7 @@ class WebsocketTransport(BaseTransport):
     def send(self, packets):
         for packet in packets:
             encoded = Parser.encode_packet(packet, self.supports_binary)
-            self.debug('writing %s' % encoded)
+            self.debug('writing %s', encoded)
             self.writable = False
             try:
                 self.websocket.send(encoded)
@@ -373,3 +369,31 @@ class WebsocketTransport(BaseTransport):
             gevent.kill(job)
         self.websocket.close()
         self.on_close()
+
+    def detach(self, timeout=1):
+        """
+        Stop reading and writing without closing the connection, so another process can take it over
+        :param timeout: seconds to wait for a frame being written
+        :return: bytes read from the connection and not processed yet, None if the connection can't be handed off
+        """
+        reader = getattr(self.request, 'reader', None)
+        if reader is None:
+            return None
+
+        # Don't cut a frame in half
+        waited = 0
+        while not self.writable and waited < timeout:
+            gevent.sleep(.01)
+            waited += .01
+        if not self.writable:
+            return None
+
+        self.writable = False
+        gevent.killall(self.jobs)
+        self.jobs = []
+
+        # Release the handler without answering, see EngineHandler
+        self.request.handed_off = True
+        if not self.request.response.is_set:
+            self.request.response.end()
+        return reader.pending()
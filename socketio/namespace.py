@@ -23,6 +23,7 @@ class Namespace(EventEmitter):
         self.acks = {}
         self.rooms = {}
         self.rooms_send_to = []
+        self.flags = set()
         self.jobs = []
         self.adapter = Adapter(self)
 
@@ -34,10 +35,15 @@ class Namespace(EventEmitter):
 
         return self
 
-    def add(self, client, callback=None):
-        self.debug('adding client to namespace %s' % self.name)
+    def add(self, client, callback=None, resumed=False):
+        """
+        Connect the client to this namespace
+        :param resumed: the client was connected in a process which handed it over, see engine.takeover
+        """
+        self.debug('adding client to namespace %s', self.name)
 
         socket = Socket(self, client)
+        socket.resumed = resumed
 
         if client.engine_socket.ready_state == EngineSocket.STATE_OPEN:
             self.sockets.append(socket)
@@ -54,14 +60,14 @@ class Namespace(EventEmitter):
         return socket
 
     def remove(self, socket):
-        self.debug("Removing socket %s from namespace" % socket.id)
+        self.debug("Removing socket %s from namespace", socket.id)
         if socket in self.sockets:
             self.debug("Found socket, remove it")
             self.sockets.remove(socket)
             super(Namespace, self).emit('disconnect', socket)
             self.debug("Socket removed")
         else:
-            self.debug('ignoring remove for %s' % socket.id)
+            self.debug('ignoring remove for %s', socket.id)
 
     def emit(self, event, *args):
         if event in ['connect', 'connection']:
@@ -76,8 +82,10 @@ class Namespace(EventEmitter):
 
             self.adapter.broadcast(packet, {
                 'rooms': self.rooms,
+                'flags': self.flags,
             })
             self.rooms = {}
+            self.flags = set()
 
         return self
 
@@ -86,6 +94,10 @@ class Namespace(EventEmitter):
 
         return self
 
+    def flag(self, flag):
+        self.flags.add(flag)
+        return self
+
     write = send
 
     def get_id(self, increment=False):
@@ -101,5 +113,6 @@ class Namespace(EventEmitter):
 
         return result
 
-    def debug(self, message):
-        logger.debug("[Namespace][id:%d] %s" % (self.ids, message))
+    def debug(self, message, *args):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[Namespace][id:%d] %s", self.ids, message % args if args else message)
@@ -94,7 +94,7 @@ class Encoder(object):
                 string += ','
             string += json.dumps(obj['data'])
 
-        logger.debug('encoded object as %s' % string)
+        logger.debug('encoded object as %s', string)
         return string
 
     @staticmethod
@@ -0,0 +1,202 @@
+# coding=utf-8
+"""
+Connection state recovery. Keeps a bounded, time limited buffer of the events sent to each session together with its
+room membership, so a client reconnecting with the recovery token of its previous session (pid) and the number of
+events it received (offset) gets the missed events replayed and its rooms restored.
+
+The sid is public, other clients learn it and it names a room, so it can't prove a client owns a session. Each session
+gets a random private id instead, sent only to its client in the connect packet of the default namespace:
+
+    0{"pid":"<private id>"}
+"""
+from __future__ import absolute_import
+import os
+import time
+import base64
+import logging
+from collections import deque
+
+from . import parser
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SessionState', 'RecoveryStore']
+
+# Only events are counted and replayed, acks and connects belong to the old session
+recorded_types = (parser.EVENT, parser.BINARY_EVENT)
+
+
+class SessionState(object):
+    """
+    Outbound events and rooms of one session.
+
+    offset counts the events sent in this session, the client counts the events it received the same way.
+    """
+
+    def __init__(self, sid, max_packets, max_age):
+        self.sid = sid
+        self.pid = base64.urlsafe_b64encode(os.urandom(18))  # private id, the client's recovery token
+        self.max_age = max_age
+        self.offset = 0
+        self.packets = deque(maxlen=max_packets)  # (offset, timestamp, encoded packets)
+        self.rooms = {}  # namespace name -> list of rooms, filled when the session detached
+        self.expires_at = None
+
+    def record(self, encoded_packets):
+        self.offset += 1
+        self.packets.append((self.offset, time.time(), encoded_packets))
+
+    def missed(self, offset):
+        """
+        Events sent after offset
+        :param offset: number of events the client received
+        :return: list of encoded packets, None if the buffer no longer covers the gap
+        """
+        threshold = time.time() - self.max_age
+        while self.packets and self.packets[0][1] < threshold:
+            self.packets.popleft()
+
+        if offset > self.offset or offset < 0:
+            return None
+
+        if offset == self.offset:
+            return []
+
+        if not self.packets or self.packets[0][0] > offset + 1:
+            return None
+
+        return [encoded for packet_offset, timestamp, encoded in self.packets if packet_offset > offset]
+
+
+class RecoveryStore(object):
+    """
+    Holds the state of live sessions and of detached sessions waiting for their client to come back, by private id
+    """
+
+    def __init__(self, max_packets=1000, max_age=120):
+        """
+        :param max_packets: max events buffered per session
+        :param max_age: seconds a detached session and its buffered events are kept
+        """
+        self.max_packets = max_packets
+        self.max_age = max_age
+        self.sessions = {}  # pid -> SessionState
+        self.detached = {}  # namespace name -> {room -> set of pids}, rooms of detached sessions
+        self.next_purge = 0
+
+    def session(self, sid):
+        """
+        Create the state of a new live session
+        :param sid: The session id
+        :return: SessionState, its pid goes to the client only
+        """
+        self.purge()
+        state = SessionState(sid, self.max_packets, self.max_age)
+        self.sessions[state.pid] = state
+        return state
+
+    def detach(self, pid, rooms):
+        """
+        The session lost its connection, keep it around for max_age seconds
+        :param pid: The session's private id
+        :param rooms: dict namespace name -> list of rooms
+        """
+        state = self.sessions.get(pid, None)
+        if state is None:
+            return
+
+        state.rooms = rooms
+        state.expires_at = time.time() + self.max_age
+
+        for nsp, nsp_rooms in rooms.items():
+            detached_rooms = self.detached.setdefault(nsp, {})
+            for room in nsp_rooms:
+                detached_rooms.setdefault(room, set()).add(pid)
+
+        self.purge()
+
+    def capture(self, nsp, rooms, encoded_packets, exceptions=()):
+        """
+        Record a broadcast for detached sessions which would have received it
+        :param nsp: The namespace name
+        :param rooms: The rooms broadcast to, empty for the whole namespace
+        :param encoded_packets: The encoded packet
+        :param exceptions: sids the broadcast excludes
+        """
+        self.purge()
+        detached_rooms = self.detached.get(nsp, None)
+        if not detached_rooms:
+            return
+
+        pids = set()
+        if rooms:
+            for room in rooms:
+                pids.update(detached_rooms.get(room, ()))
+        else:
+            for room_pids in detached_rooms.values():
+                pids.update(room_pids)
+
+        for pid in pids:
+            state = self.sessions[pid]
+            if state.sid not in exceptions:
+                state.record(encoded_packets)
+
+    def restore(self, pid, offset):
+        """
+        Take over a detached session
+        :param pid: The private id of the previous session, as the client got it in the connect packet
+        :param offset: Number of events the client received in that session
+        :return: (rooms, missed packets) or None if the session can not be recovered. The rooms don't include the
+            room named after the previous sid
+        """
+        self.purge()
+        state = self.sessions.get(pid, None)
+        if state is None or state.expires_at is None:
+            return None
+
+        self._remove(state)
+
+        if state.expires_at < time.time():
+            return None
+
+        missed = state.missed(offset)
+        if missed is None:
+            logger.debug('session %s can not be recovered from offset %s', state.sid, offset)
+            return None
+
+        rooms = dict((nsp, [room for room in nsp_rooms if room != state.sid]) for nsp, nsp_rooms in state.rooms.items())
+        return rooms, missed
+
+    def remove(self, pid):
+        """
+        The session closed for good
+        """
+        state = self.sessions.get(pid, None)
+        if state is not None:
+            self._remove(state)
+
+    def purge(self):
+        """
+        Drop expired sessions, at most once per second. Called from the other methods, so a new session, a broadcast
+        or a reconnect frees what expired meanwhile
+        """
+        now = time.time()
+        if now < self.next_purge:
+            return
+        self.next_purge = now + 1
+
+        for state in [s for s in self.sessions.values() if s.expires_at is not None and s.expires_at < now]:
+            logger.debug('session %s expired', state.sid)
+            self._remove(state)
+
+    def _remove(self, state):
+        self.sessions.pop(state.pid, None)
+
+        for nsp, nsp_rooms in state.rooms.items():
+            detached_rooms = self.detached.get(nsp, {})
+            for room in nsp_rooms:
+                pids = detached_rooms.get(room, None)
+                if pids is not None:
+                    pids.discard(state.pid)
+                    if not pids:
+                        del detached_rooms[room]
@@ -46,7 +46,7 @@ def autodiscover():
 def socketio(request):
     try:
         socket = request.environ.get('engine_socket', None)
-        logger.debug("[SocketIOView] Got engine_socket %s" % socket)
+        logger.debug("[SocketIOView] Got engine_socket %s", socket)
         if socket is not None:
             logger.debug("[SocketIOView] Set request to context")
             socket.context['request'] = request
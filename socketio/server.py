@@ -1,11 +1,15 @@
 from __future__ import absolute_import
 
+import heapq
 import logging
-from gevent.pywsgi import WSGIServer
+from operator import itemgetter
+import gevent
 from .client import Client
 from .namespace import Namespace
-from .engine.server import Server as EngineServer
+from .recovery import RecoveryStore
+from .engine.server import Server as EngineServer, EngineIOWSGIServer, serve_wsgi
 from .engine.handler import EngineHandler
+from .engine.monitor import track
 
 __all__ = ['SocketIOServer']
 
@@ -23,13 +27,28 @@ class SocketIOServer(EngineServer):
         """
         Initialize an socketio server object.
         :param args:
-        :param kwargs:
+        :param kwargs: recovery: dict of RecoveryStore options to enable connection state recovery, eg.
+            {'max_packets': 1000, 'max_age': 120}
         :return:
         """
+        recovery = kwargs.pop('recovery', None)
+        self.recovery = RecoveryStore(**recovery) if recovery is not None else None
         self.namespaces = {}
         self.root_namespace = self.of('/')
         super(SocketIOServer, self).__init__(*args, **kwargs)
 
+        self.packets_received = self.metrics.counter('socketio_packets_received_total', 'Socket.io packets received',
+                                                     label='type')
+        self.packets_sent = self.metrics.counter('socketio_packets_sent_total', 'Socket.io packets sent to one client',
+                                                 label='type')
+        self.broadcast_recipients = self.metrics.histogram('socketio_broadcast_recipients',
+                                                           'Sockets a broadcast was sent to',
+                                                           buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+        self.metrics.gauge('socketio_rooms', 'Rooms by namespace',
+                           lambda: dict((name, len(namespace.adapter.rooms))
+                                        for name, namespace in self.namespaces.items()),
+                           label='namespace')
+
     def of(self, name):
         """
         Create or get a namespace object for name
@@ -57,6 +76,81 @@ class SocketIOServer(EngineServer):
             for socket in self.namespaces['/'].sockets:
                 socket.on_close(reason='the server closed')
 
+    def describe_namespaces(self):
+        """
+        :return: list of dicts with the name, connected sockets and rooms count of each namespace
+        """
+        return [{
+            'name': name,
+            'sockets': len(namespace.connected),
+            'rooms': len(namespace.adapter.rooms),
+        } for name, namespace in sorted(self.namespaces.items())]
+
+    def describe_rooms(self, name='/', limit=100):
+        """
+        :param name: The namespace name
+        :param limit: how many rooms to return, the biggest first. None for all
+        :return: list of (room, sockets in it), None if there is no such namespace
+        """
+        namespace = self.namespaces.get(name, None)
+        if namespace is None:
+            return None
+
+        sizes = ((room, len(sids)) for room, sids in namespace.adapter.rooms.iteritems())
+        if limit is None:
+            return sorted(sizes, key=itemgetter(1), reverse=True)
+        return heapq.nlargest(limit, sizes, key=itemgetter(1))
+
+    def describe_socket(self, sid):
+        """
+        The engine socket details plus, for each namespace the client connected to, its rooms and pending acks
+        """
+        details = super(SocketIOServer, self).describe_socket(sid)
+        if details is None:
+            return None
+
+        socket = self.root_namespace.connected.get(sid, None)
+        namespaces = {}
+        if socket is not None:
+            for name, nsp_socket in socket.client.namespace_socket.items():
+                namespaces[name] = {
+                    'rooms': nsp_socket.adapter.sids.get(nsp_socket.id, {}).keys(),
+                    'pending_acks': len(nsp_socket.acks),
+                }
+        details['namespaces'] = namespaces
+        return details
+
+    def introspect(self, query):
+        """
+        Answer of the admin endpoint: sid for one socket, namespace for the biggest rooms of a namespace, otherwise
+        the socket counts and the namespaces
+        """
+        if 'namespace' in query:
+            rooms = self.describe_rooms(query['namespace'], int(query.get('limit', 100)))
+            return [{'room': room, 'sockets': size} for room, size in rooms] if rooms is not None else None
+
+        result = super(SocketIOServer, self).introspect(query)
+        if result is not None and 'sid' not in query:
+            result['namespaces'] = self.describe_namespaces()
+        return result
+
+    def session_state(self, engine_socket):
+        """
+        The namespaces and rooms of the client on engine_socket
+        """
+        socket = self.root_namespace.connected.get(engine_socket.id, None)
+        if socket is None:
+            return {}
+        return {'namespaces': socket.client.state()}
+
+    def on_resume(self, engine_socket, state):
+        """
+        Rebuild the client of a connection taken over from another process
+        """
+        logger.debug('resuming connection with id %s', engine_socket.id)
+        client = Client(self, engine_socket)
+        client.resume(state.get('namespaces', {}))
+
     def on_connection(self, engine_socket):
         """
         Called when a new underlying socket connected. It creates a client object and connect it to root namespace
@@ -66,25 +160,21 @@ class SocketIOServer(EngineServer):
         logger.debug('incoming connection with id %s', engine_socket.id)
         client = Client(self, engine_socket)
         client.connect('/')
+        client.recover()
 
 
 SocketIOServer.default_server = SocketIOServer()
 
 
-class SocketIOWSGIServer(WSGIServer):
-    def handle(self, socket, address):
-        handler = EngineHandler(SocketIOServer.default_server, socket, address, self)
-        handler.on('connection', SocketIOServer.default_server.on_connection)
+class SocketIOWSGIServer(EngineIOWSGIServer):
+    context_class = SocketIOServer
+
+    def handle(self, socket, address, rfile=None):
+        track(gevent.getcurrent(), 'handler')
+        handler = EngineHandler(self.context_class.default_server, socket, address, self, rfile=rfile)
+        handler.on('connection', self.context_class.default_server.on_connection)
         handler.handle()
 
 
 def serve(app, **kw):
-    host = kw.pop('host', '127.0.0.1')
-    port = int(kw.pop('port', 6543))
-
-    server = SocketIOWSGIServer((host, port),
-                                app,
-                                **kw)
-
-    print('serving on http://%s:%s' % (host, port))
-    server.serve_forever()
+    serve_wsgi(SocketIOWSGIServer, app, **kw)
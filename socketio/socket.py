@@ -3,11 +3,13 @@ from __future__ import absolute_import
 from .event_emitter import EventEmitter
 from . import has_bin
 from . import parser
+from .engine.socket import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from .engine import tracing
 import logging
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['Socket', 'flags']
+__all__ = ['Socket', 'flags', 'flags_priority']
 
 # these events are preserved for internal usage, socket can't emit these to clients
 events = [
@@ -20,9 +22,24 @@ flags = [
     'json',
     'volatile',  # volatile flag indicates that the upcoming packets are not important, can be lost in some cases
     'broadcast',  # broadcast flag indicates that the upcoming packet should be broadcast to all sockets in the namespace
+    'high_priority',  # the upcoming packet is flushed ahead of normal events, e.g. small control messages
+    'low_priority',  # the upcoming packet is flushed after normal events, e.g. bulk data
 ]
 
 
+def flags_priority(flags):
+    """
+    Map the priority flags to the engine write buffer lane
+    :param flags: set of flags
+    :return: PRIORITY_HIGH | PRIORITY_NORMAL | PRIORITY_LOW
+    """
+    if 'high_priority' in flags:
+        return PRIORITY_HIGH
+    if 'low_priority' in flags:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
 class Socket(EventEmitter):
     """
     [connection, namespace] defines a socket
@@ -42,6 +59,7 @@ class Socket(EventEmitter):
         self.flags = set()
         self.acks = {}
         self.connected = True
+        self.resumed = False  # taken over from another process, the client didn't connect again
 
     def emit(self, event, *args, **kwargs):
         """
@@ -69,7 +87,7 @@ class Socket(EventEmitter):
                 if broadcast:
                     raise RuntimeError('Callback not supported in broadcast packet')
 
-                self.debug('emitting packet with ack id %d' % self.namespace.ids)
+                self.debug('emitting packet with ack id %d', self.namespace.ids)
 
                 packet['id'] = self.namespace.ids
                 self.namespace.ids += 1
@@ -82,7 +100,7 @@ class Socket(EventEmitter):
                     'flags': self.flags
                 })
             else:
-                self.packet(packet)
+                self.packet(packet, priority=flags_priority(self.flags))
 
         self.rooms_send_to = []
         self.flags = set()
@@ -105,20 +123,20 @@ class Socket(EventEmitter):
 
     write = send
 
-    def packet(self, p, pre_encoded=False):
+    def packet(self, p, pre_encoded=False, priority=None):
         if type(p) is dict:
             p['nsp'] = self.namespace.name
-        self.client.packet(p, pre_encoded)
+        self.client.packet(p, pre_encoded, priority)
 
     def join(self, room, callback=None):
-        self.debug('joining room %s' % room)
+        self.debug('joining room %s', room)
         if room in self.rooms:
             return self
 
         def cb(err=None):
             if err:
                 return cb and cb(err)
-            self.debug('joined room %s' % room)
+            self.debug('joined room %s', room)
             self.rooms.append(room)
             callback and callback()
 
@@ -126,13 +144,13 @@ class Socket(EventEmitter):
         return self
 
     def leave(self, room, callback=None):
-        self.debug('leaving room %s' % room)
+        self.debug('leaving room %s', room)
 
         def cb(err):
             if err:
                 return callback and callback(err)
 
-            self.debug('left room %s' % room)
+            self.debug('left room %s', room)
             self.rooms.remove(room)
             callback and callback()
 
@@ -146,11 +164,16 @@ class Socket(EventEmitter):
     def on_connect(self, *args, **kwargs):
         self.debug('socket connected - writing packet')
         self.join(self.id)
-        self.packet({'type': parser.CONNECT})
+        if not self.resumed:
+            packet = {'type': parser.CONNECT}
+            if self.namespace.name == '/' and self.client.session is not None:
+                # The recovery token goes to this client only, see socketio.recovery
+                packet['data'] = {'pid': self.client.session.pid}
+            self.packet(packet)
         self.namespace.connected[self.id] = self
 
     def on_packet(self, packet, *args, **kwargs):
-        self.debug('got packet %s' % packet['type'])
+        self.debug('got packet %s', packet['type'])
 
         _type = packet['type']
 
@@ -175,7 +198,9 @@ class Socket(EventEmitter):
         if len(packet_data) == 1:
             packet_data = packet_data[0]
 
+        tracing.stage('handler')
         super(Socket, self).emit(event, packet_data)
+        tracing.stage('handled')
 
         if 'id' in packet:
             _type = parser.ACK if not has_bin(packet['data']) else parser.BINARY_ACK
@@ -187,11 +212,11 @@ class Socket(EventEmitter):
 
     def on_ack(self, packet):
         if 'id' not in packet or packet['id'] not in self.acks:
-            self.debug('bad ack %s %s' % (packet, self.acks))
+            self.debug('bad ack %s %s', packet, self.acks)
         else:
             _id = packet['id']
             ack = self.acks[_id]
-            self.debug('calling ack %s with %s' % (_id, unicode(packet['data'])))
+            self.debug('calling ack %s with %s', _id, packet['data'])
             event = packet['data'][0]
             if len(packet['data']) > 1:
                 data = packet['data'][1]
@@ -205,12 +230,12 @@ class Socket(EventEmitter):
         self.on_close('client namespace disconnect')
 
     def on_close(self, reason=None, *args, **kwargs):
-        self.debug("On close %s" % reason)
+        self.debug("On close %s", reason)
 
         if not self.connected:
             return
 
-        self.debug('closing socket - reason %s' % reason)
+        self.debug('closing socket - reason %s', reason)
         self.leave_all()
         self.namespace.remove(self)
         self.namespace.connected.pop(self.id)
@@ -241,5 +266,7 @@ class Socket(EventEmitter):
         self.flags.add(flag)
         return self
 
-    def debug(self, message):
-        logger.debug("[SocketIOSocket(%s)][%s][C:%d] %s" % (self.namespace.name, self.id,  int(self.connected), message))
+    def debug(self, message, *args):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[SocketIOSocket(%s)][%s][C:%d] %s", self.namespace.name, self.id, int(self.connected),
+                         message % args if args else message)
@@ -1,4 +1,12 @@
+"""
+Gunicorn worker, run with `gunicorn -k socketio.vender.gunicorn.Worker app:application`.
+
+Given an access log, eg. `--access-logfile /var/log/engine-access.log` ('-' for stdout), each worker logs the engine
+requests there from a background writer, see engine.access_log. Subclass Worker to set the AccessLog options, eg.
+access_log = {'sample_rate': .1}. Without it, requests are logged synchronously to gunicorn's error log.
+"""
 from __future__ import absolute_import
+import sys
 from gevent.pywsgi import WSGIHandler
 from gunicorn.workers.ggevent import GeventPyWSGIWorker
 from socketio.server import SocketIOWSGIServer
@@ -18,3 +26,14 @@ WSGIHandler.log_request = log_request
 
 class Worker(GeventPyWSGIWorker):
     server_class = SocketIOWSGIServer
+    access_log = {}  # AccessLog options but output, which is gunicorn's access log
+
+    def run(self):
+        server_context = self.server_class.context_class.default_server
+        output = self.cfg.accesslog
+        if output:
+            server_context.start_access_log(sys.stdout if output == '-' else output, **self.access_log)
+        try:
+            super(Worker, self).run()
+        finally:
+            server_context.stop()
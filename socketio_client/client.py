@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 class SocketIOClient(EventEmitter):
     def __init__(self, uri, transports=('polling', 'websocket'),
                  auto_connect=False, reconnect=True, reconnect_attempts=None, reconnect_delay=1, reconnect_delay_max=5,
-                 timeout=20, **kwargs):
+                 timeout=20, recover=True, **kwargs):
         super(SocketIOClient, self).__init__()
 
         self._set_uri(uri)
@@ -34,8 +34,16 @@ class SocketIOClient(EventEmitter):
         self.encoder = Parser.Encoder()
         self.skip_reconnect = False
         self.reconnect_job = None
+        self.reconnect_hint = None  # seconds to wait before the next reconnect, sent by a draining server
         self.config = kwargs
 
+        # Connection state recovery, the private id and number of events received of current session and the query for
+        # reconnecting
+        self.recover = recover
+        self.pid = None
+        self.offset = 0
+        self.recovery = None
+
     def _set_uri(self, uri):
         result = urlparse.urlparse(uri)
         self.uri = uri
@@ -62,9 +70,14 @@ class SocketIOClient(EventEmitter):
 
         logger.debug('opening %s', self.uri)
 
+        config = dict(self.config)
+        if self.recovery is not None:
+            # Ask the server to replay events missed since the previous session
+            config['query'] = dict(config.get('query', None) or {}, **self.recovery)
+
         engine_socket = EngineSocket(
             host=self.host, path=self.path, port=self.port,
-            transports=self.transports, **self.config)
+            transports=self.transports, **config)
         self.engine_socket = engine_socket
         self.ready_state = 'opening'
 
@@ -110,6 +123,9 @@ class SocketIOClient(EventEmitter):
         self.cleanup()
 
         self.ready_state = 'open'
+        self.recovery = None
+        self.pid = None
+        self.offset = 0
         self.emit('open')
 
         engine_socket = self.engine_socket
@@ -123,6 +139,12 @@ class SocketIOClient(EventEmitter):
 
     def on_decoded(self, packet):
         # Should only emit to the right socket, otherwise, all namespaces got the message
+        if packet['type'] in (Parser.EVENT, Parser.BINARY_EVENT):
+            self.offset += 1
+        elif packet['type'] == Parser.CONNECT and packet['nsp'] == '/' and isinstance(packet.get('data'), dict):
+            # The server's recovery token for this session, the sid alone doesn't recover it
+            self.pid = packet['data'].get('pid', None)
+
         nsp = packet['nsp']
         if nsp in self.nsps:
             socket = self.nsps[nsp]
@@ -190,8 +212,14 @@ class SocketIOClient(EventEmitter):
 
         self.skip_reconnect = True
 
-    def on_close(self, reason=''):
-        logger.debug('close')
+    def on_close(self, reason='', hint=None):
+        logger.debug('close (%s)', reason)
+        if self.recover and self.pid is not None:
+            self.recovery = {'pid': self.pid, 'offset': self.offset}
+
+        if hint and 'reconnect_delay' in hint:
+            self.reconnect_hint = float(hint['reconnect_delay'])
+
         self.cleanup()
         self.ready_state = 'closed'
         self.emit('close', reason)
@@ -205,14 +233,18 @@ class SocketIOClient(EventEmitter):
 
         self.attempts += 1
 
-        if self.attempts > self.reconnect_attempts:
+        if self.reconnect_attempts is not None and self.attempts > self.reconnect_attempts:
             logger.debug('reconnect failed')
             self.emit_all('reconnect_failed')
             self.reconnecting = False
 
         else:
-            delay = self.attempts * self.reconnect_delay
-            delay = min(delay, self.reconnect_delay_max)
+            if self.reconnect_hint is not None:
+                # Spread out by the server, don't cap it
+                delay, self.reconnect_hint = self.reconnect_hint, None
+            else:
+                delay = self.attempts * self.reconnect_delay
+                delay = min(delay, self.reconnect_delay_max)
 
             logger.debug('will wait %d seconds before reconnect', delay)
             self.reconnecting = True
@@ -80,6 +80,8 @@ class Socket(EventEmitter):
                 pass
             elif packet_type == 'error':
                 self.emit('error', packet['data'])
+            elif packet_type == 'close':
+                self.on_close(packet.get('data', None))
         else:
             logger.debug('packet received with socket readyState "%s"', self.ready_state)
 
@@ -269,3 +271,22 @@ class Socket(EventEmitter):
         # FIXME do a graceful close
         for job in self.jobs:
             gevent.kill(job)
+
+    def on_close(self, data=None):
+        """
+        The server closed the socket
+        :param data: payload of the close packet, a draining server sends the reason and a reconnect delay hint
+        """
+        hint = {}
+        if data:
+            try:
+                hint = json.loads(data)
+            except ValueError:
+                logger.debug('ignoring close packet data %s', data)
+            if not isinstance(hint, dict):
+                logger.debug('ignoring close packet data %s', data)
+                hint = {}
+
+        self.close()
+        self.ready_state = 'closed'
+        self.emit('close', hint.get('reason', 'transport close'), hint)
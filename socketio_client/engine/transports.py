@@ -164,7 +164,9 @@ class PollingTransport(Transport):
                 self.on_open()
 
             if 'close' == packet['type']:
-                self.on_close()
+                # The server closed the session, the socket reads its reason before polling stops
+                self.on_packet(packet)
+                super(PollingTransport, self).on_close()
                 return False
 
             # bypass and handle the message
@@ -221,6 +223,9 @@ class PollingTransport(Transport):
         if self.sid is not None:
             query['sid'] = self.sid
 
+        if self.query:
+            query.update(self.query)
+
         if not self.supports_binary and self.sid is None:
             query["b64"] = 1
 
@@ -358,6 +363,9 @@ class WebsocketTransport(Transport):
         if self.sid:
             query['sid'] = self.sid
 
+        if self.query:
+            query.update(self.query)
+
         if not self.supports_binary:
             query['b64'] = 1
 
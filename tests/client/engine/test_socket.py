@@ -21,8 +21,8 @@ class SocketTest(EngineIOServerBaseTest):
         socket = Socket(host=self.host, port=self.port)
         job = gevent.spawn(socket.open)
         gevent.sleep(.5)
-        self.assertEqual(1, len(Server.engine_sockets.items()))
-        engine_socket = Server.engine_sockets[socket.id]
+        self.assertEqual(1, len(Server.default_server.engine_sockets.items()))
+        engine_socket = Server.default_server.engine_sockets[socket.id]
 
         context = {}
 
@@ -45,7 +45,7 @@ class SocketTest(EngineIOServerBaseTest):
         gevent.sleep(2)
         self.assertEqual('websocket', socket.transport.name)
 
-        engine_socket = Server.engine_sockets[socket.id]
+        engine_socket = Server.default_server.engine_sockets[socket.id]
 
         context = {}
 
@@ -60,3 +60,16 @@ class SocketTest(EngineIOServerBaseTest):
         gevent.sleep(.2)
 
         self.assertEqual(context['message'], message)
+
+    def test_close_data_not_an_object(self):
+        socket = Socket(host=self.host, port=self.port)
+        context = {}
+
+        def on_close(reason, hint):
+            context['close'] = (reason, hint)
+
+        socket.on('close', on_close)
+        socket.on_close('[1, 2]')
+
+        self.assertEqual(('transport close', {}), context['close'])
+        self.assertEqual('closed', socket.ready_state)
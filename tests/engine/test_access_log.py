@@ -0,0 +1,47 @@
+from StringIO import StringIO
+from unittest import TestCase
+from collections import namedtuple
+from socketio.engine.access_log import AccessLog
+
+FakeHandler = namedtuple('FakeHandler', ['status', 'access_info', 'client_address', 'time_start', 'time_finish',
+                                         'requestline', 'response_length'])
+
+
+def handler(status='200 OK', access_info=('sid1', 'polling', .5, False)):
+    return FakeHandler(status, access_info, ('127.0.0.1', 50000), 1000.0, 1000.75,
+                       'GET /socket.io/?EIO=3&transport=polling&sid=sid1 HTTP/1.1', 42)
+
+
+class AccessLogTest(TestCase):
+    def setUp(self):
+        self.output = StringIO()
+
+    def test_line(self):
+        access_log = AccessLog(self.output)
+        access_log.log(handler())
+        self.assertEqual('', self.output.getvalue())
+
+        access_log.flush()
+        line = self.output.getvalue()
+        self.assertTrue(line.startswith('127.0.0.1 - - ['))
+        self.assertTrue(line.endswith('"GET /socket.io/?EIO=3&transport=polling&sid=sid1 HTTP/1.1" '
+                                      '200 42 0.750000 sid1 polling 0.500000\n'))
+
+    def test_sampling_keeps_handshakes_and_errors(self):
+        access_log = AccessLog(self.output, sample_rate=0)
+        access_log.log(handler())
+        access_log.log(handler(access_info=('sid1', 'polling', .1, True)))
+        access_log.log(handler(status='400 Bad Request'))
+        access_log.log(handler(access_info=('sid1', 'websocket', 30, False)))
+        access_log.log(handler(access_info=None))
+        access_log.flush()
+        self.assertEqual(4, len(self.output.getvalue().splitlines()))
+
+    def test_drops_when_behind(self):
+        access_log = AccessLog(self.output, max_pending=2)
+        for i in range(5):
+            access_log.log(handler())
+        self.assertEqual(3, access_log.dropped)
+        access_log.flush()
+        self.assertEqual(2, len(self.output.getvalue().splitlines()))
+        self.assertEqual(0, access_log.dropped)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+from socketio.engine.admission import AdmissionControl
+from socketio.engine.server import Server
+
+
+class AdmissionControlTest(TestCase):
+    def test_admit_all_by_default(self):
+        context = Server(transports=('polling', 'websocket'))
+        for _ in range(100):
+            self.assertIsNone(context.admit('10.0.0.1'))
+
+    def test_max_sessions(self):
+        context = Server(transports=('polling', 'websocket'))
+        admission = AdmissionControl(max_sessions=0, retry_after=2)
+        reason, retry_after = admission.check(context, '10.0.0.1')
+        self.assertEqual('too many sessions', reason)
+        self.assertTrue(2 <= retry_after <= 4)
+
+    def test_rate_per_address(self):
+        context = Server(transports=('polling', 'websocket'))
+        admission = AdmissionControl(rate=1, burst=2)
+        self.assertIsNone(admission.check(context, '10.0.0.1'))
+        self.assertIsNone(admission.check(context, '10.0.0.1'))
+        self.assertEqual('too many handshakes', admission.check(context, '10.0.0.1')[0])
+        self.assertIsNone(admission.check(context, '10.0.0.2'))
+
+    def test_lag(self):
+        context = Server(transports=('polling', 'websocket'))
+        admission = AdmissionControl(max_lag=.1)
+        self.assertIsNone(admission.check(context, '10.0.0.1'))
+        self.assertIsNotNone(context.hub_lag.job)
+        context.hub_lag.latest = .2
+        self.assertEqual('server overloaded', admission.check(context, '10.0.0.1')[0])
+        self.assertTrue(admission.overloaded)
+        context.hub_lag.stop()
+
+    def test_draining(self):
+        context = Server(transports=('polling', 'websocket'))
+        context.draining = True
+        self.assertEqual('server draining', context.admit('10.0.0.1')[0])
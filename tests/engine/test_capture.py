@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from collections import namedtuple
+import gevent
+from socketio.engine import capture
+from socketio.engine.capture import Capture
+from socketio.engine.replay import load
+
+Transport = namedtuple('Transport', ['name'])
+FakeSocket = namedtuple('FakeSocket', ['id', 'transport'])
+
+
+class CaptureTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_capture_loads_back(self):
+        for name in ('capture.log', 'capture.log.gz'):
+            path = os.path.join(self.directory, name)
+            recorder = Capture(path)
+            recorder.start()
+
+            socket = FakeSocket('sid1', Transport('websocket'))
+            capture.opened(socket)
+            capture.packet(socket, '>', {'type': 'open', 'data': '{"sid": "sid1"}'})
+            capture.packet(socket, '<', {'type': 'message', 'data': u'line\nbreak \xe9'})
+            capture.packet(socket, '<', {'type': 'message', 'data': bytearray('\x00\x01')})
+            capture.closed(socket)
+            recorder.stop()
+
+            # Not recorded once stopped
+            capture.packet(socket, '<', {'type': 'message', 'data': 'late'})
+
+            sessions = load(path)
+            self.assertEqual(1, len(sessions))
+            session = sessions[0]
+            self.assertEqual(('sid1', 'websocket'), (session.sid, session.transport))
+            self.assertEqual(1, session.outbound)
+            self.assertEqual([{'type': 'message', 'data': u'line\nbreak \xe9'.encode('utf-8')},
+                              {'type': 'message', 'data': bytearray('\x00\x01')}],
+                             [packet for at, packet in session.inbound])
+            self.assertIsNotNone(session.closed_at)
+
+    def test_written_in_batches(self):
+        path = os.path.join(self.directory, 'capture.log')
+        recorder = Capture(path, batch_size=2, flush_interval=60)
+        recorder.start()
+        try:
+            socket = FakeSocket('sid1', Transport('polling'))
+            capture.opened(socket)
+            # Queued, the socket greenlet doesn't touch the file
+            self.assertEqual(1, len(recorder.records))
+
+            capture.packet(socket, '>', {'type': 'open', 'data': '{"sid": "sid1"}'})
+            gevent.sleep(.1)
+            self.assertEqual([], recorder.records)
+            with open(path) as written:
+                self.assertEqual(3, len(written.readlines()))
+        finally:
+            recorder.stop()
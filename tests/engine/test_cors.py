@@ -0,0 +1,20 @@
+from unittest import TestCase
+from socketio.engine.cors import CorsPolicy
+
+
+class CorsPolicyTest(TestCase):
+    def test_any_origin(self):
+        policy = CorsPolicy()
+        self.assertEqual([('Access-Control-Allow-Origin', '*')], policy.headers(None))
+        headers = dict(policy.headers('http://a.com'))
+        self.assertEqual('http://a.com', headers['Access-Control-Allow-Origin'])
+        self.assertEqual('true', headers['Access-Control-Allow-Credentials'])
+
+    def test_allowed_origins(self):
+        policy = CorsPolicy(origins=['http://a.com'], max_age=600)
+        self.assertEqual('http://a.com', dict(policy.headers('http://a.com'))['Access-Control-Allow-Origin'])
+        self.assertEqual([], policy.headers('http://b.com'))
+
+        preflight = dict(policy.preflight('http://a.com'))
+        self.assertEqual('600', preflight['Access-Control-Max-Age'])
+        self.assertIsNone(policy.preflight('http://b.com'))
@@ -0,0 +1,74 @@
+from gevent.monkey import patch_all
+
+patch_all()
+
+import json
+from unittest import TestCase
+import gevent
+import requests
+from socketio.engine.parser import Parser
+from socketio.engine.server import Server, EngineIOWSGIServer
+from tests import application
+from tests.engine.test_registry import FakeSocket
+
+
+class DrainSocket(FakeSocket):
+    def close(self, data=None, timeout=None):
+        self.close_data = data
+        self.on_close()
+
+
+class DrainTest(TestCase):
+    def test_waves(self):
+        context = Server(transports=('polling', 'websocket'), registry={'sweep_interval': 0})
+        sockets = [DrainSocket(str(i)) for i in range(5)]
+        for socket in sockets:
+            context.engine_sockets.add(socket)
+
+        context.drain(wave_size=2, interval=0, reconnect_delay=(2, 4))
+        self.assertTrue(context.draining)
+        self.assertEqual(0, len(context.engine_sockets))
+        for socket in sockets:
+            hint = json.loads(socket.close_data)
+            self.assertEqual('server drain', hint['reason'])
+            self.assertTrue(2 <= hint['reconnect_delay'] <= 4)
+
+    def test_handshake_refused(self):
+        server = EngineIOWSGIServer(('127.0.0.1', 3060), application, log=None)
+        server.start()
+        Server.default_server.draining = True
+        try:
+            response = requests.get('http://127.0.0.1:3060/socket.io/?transport=polling')
+            self.assertEqual(503, response.status_code)
+            self.assertTrue(int(response.headers['Retry-After']) >= 1)
+        finally:
+            Server.default_server.draining = False
+            server.stop()
+
+    def test_polling_client_gets_hint(self):
+        server = EngineIOWSGIServer(('127.0.0.1', 3061), application, log=None)
+        server.start()
+        context = Server.default_server
+        try:
+            response = requests.get('http://127.0.0.1:3061/socket.io/?transport=polling')
+            packet = next(Parser.decode_payload(bytearray(response.content)))[0]
+            sid = json.loads(packet['data'])['sid']
+
+            # No poll pending, the socket waits for the next one to send the close packet
+            job = gevent.spawn(context.drain, interval=0, reconnect_delay=(2, 4), close_timeout=5)
+            gevent.sleep(.1)
+            self.assertEqual('CLOSING', context.engine_sockets[sid].ready_state)
+
+            response = requests.get('http://127.0.0.1:3061/socket.io/?transport=polling&sid=%s' % sid)
+            packets = [p for p, i, t in Parser.decode_payload(bytearray(response.content))]
+            self.assertEqual('close', packets[-1]['type'])
+            hint = json.loads(packets[-1]['data'])
+            self.assertEqual('server drain', hint['reason'])
+            self.assertTrue(2 <= hint['reconnect_delay'] <= 4)
+
+            job.join(5)
+            self.assertTrue(job.ready())
+            self.assertNotIn(sid, context.engine_sockets)
+        finally:
+            context.draining = False
+            server.stop()
@@ -1,5 +1,5 @@
 from gevent.monkey import patch_all
-from socketio.engine.server import Server
+from socketio.server import SocketIOServer
 
 patch_all()
 
@@ -8,6 +8,7 @@ from unittest import TestCase
 import gevent
 import sys
 from socketio.engine.parser import Parser
+from socketio.engine.socket import PRIORITY_LOW
 from socketio.server import serve
 import requests
 import logging
@@ -15,7 +16,13 @@ import logging
 logging.basicConfig(stream=sys.stderr)
 
 
+framework_calls = {}
+
+
 def application(environ, start_response):
+    socket = environ.get('engine_socket', None)
+    if socket is not None:
+        framework_calls[socket.id] = framework_calls.get(socket.id, 0) + 1
     body = 'ok'
     headers = [('Content-Type', 'text/html; charset=utf8'),
                ('Content-Length', str(len(body)))]
@@ -37,9 +44,11 @@ class EngineHandlerTestCase(TestCase):
 
     def setUp(self):
         self.job = gevent.spawn(serve, application, host=self.host, port=self.port)
+        gevent.sleep(.1)
 
     def tearDown(self):
         gevent.kill(self.job)
+        gevent.sleep(.1)
 
     def test_handshake(self):
         response = requests.get(self.root_url + '?transport=polling')
@@ -49,6 +58,17 @@ class EngineHandlerTestCase(TestCase):
             self.assertEqual(p['type'], 'open')
             data = json.loads(p['data'])
             self.assertIsNotNone(data['sid'])
+            break
+
+    def test_handshake_double_slash(self):
+        response = requests.get('http://%s:%d//socket.io/?transport=polling' % (self.host, self.port))
+        self.assertEqual(response.status_code, 200)
+        packets = [p for p, i, t in Parser.decode_payload(bytearray(response.content))]
+        self.assertEqual('open', packets[0]['type'])
+
+        # Only the leading slashes are collapsed
+        response = requests.get('http://%s:%d/app//socket.io/?transport=polling' % (self.host, self.port))
+        self.assertEqual('ok', response.content)
 
     def test_heartbeat(self):
         response = requests.get(self.root_url + '?transport=polling')
@@ -98,7 +118,7 @@ class EngineHandlerTestCase(TestCase):
             return requests.get(url)
 
         get_job = gevent.spawn(get_request, self.root_url + ('?transport=polling&sid=%s' % sid))
-        socket = Server.engine_sockets[sid]
+        socket = SocketIOServer.default_server.engine_sockets[sid]
         self.assertIsNotNone(socket)
 
         socket.send_packet('message', 'hello')
@@ -116,3 +136,76 @@ class EngineHandlerTestCase(TestCase):
                 found = True
 
         self.assertTrue(found)
+
+    def test_batched_flush(self):
+        response = requests.get(self.root_url + '?transport=polling')
+        sid = None
+        for p, i, t in Parser.decode_payload(bytearray(response.content)):
+            data = json.loads(p['data'])
+            sid = data['sid']
+            break
+
+        socket = SocketIOServer.default_server.engine_sockets[sid]
+
+        # Several writes in one hub iteration end up in one polling response
+        socket.send('hello')
+        socket.send('world')
+        socket.send(bytearray('binary'))
+
+        response = requests.get(self.root_url + ('?transport=polling&sid=%s' % sid))
+        self.assertEqual(response.status_code, 200)
+
+        messages = [p['data'] for p, i, t in Parser.decode_payload(bytearray(response.content))
+                    if p['type'] == 'message']
+        self.assertEqual(['hello', 'world', bytearray('binary')], messages)
+
+    def test_priority_lanes(self):
+        response = requests.get(self.root_url + '?transport=polling')
+        sid = None
+        for p, i, t in Parser.decode_payload(bytearray(response.content)):
+            data = json.loads(p['data'])
+            sid = data['sid']
+            break
+
+        socket = SocketIOServer.default_server.engine_sockets[sid]
+
+        socket.send('bulk', priority=PRIORITY_LOW)
+        socket.send('first')
+        socket.send('second')
+        socket.send_packet('noop')
+
+        response = requests.get(self.root_url + ('?transport=polling&sid=%s' % sid))
+        self.assertEqual(response.status_code, 200)
+
+        packets = [(p['type'], p.get('data')) for p, i, t in Parser.decode_payload(bytearray(response.content))]
+        self.assertEqual([('noop', None), ('message', 'first'), ('message', 'second'), ('message', 'bulk')],
+                         packets)
+
+    def test_framework_bound_at_handshake(self):
+        response = requests.get(self.root_url + '?transport=polling')
+        sid = None
+        for p, i, t in Parser.decode_payload(bytearray(response.content)):
+            data = json.loads(p['data'])
+            sid = data['sid']
+            break
+
+        self.assertEqual(1, framework_calls[sid])
+
+        socket = SocketIOServer.default_server.engine_sockets[sid]
+        for i in range(2):
+            socket.send('hello')
+            requests.get(self.root_url + ('?transport=polling&sid=%s' % sid))
+        self.assertEqual(1, framework_calls[sid])
+
+        socket.refresh_context()
+        socket.send('hello')
+        requests.get(self.root_url + ('?transport=polling&sid=%s' % sid))
+        self.assertEqual(2, framework_calls[sid])
+
+    def test_preflight(self):
+        count = len(SocketIOServer.default_server.engine_sockets)
+        response = requests.options(self.root_url + '?transport=polling', headers={'Origin': 'http://example.com'})
+        self.assertEqual(204, response.status_code)
+        self.assertEqual('http://example.com', response.headers['Access-Control-Allow-Origin'])
+        self.assertEqual('86400', response.headers['Access-Control-Max-Age'])
+        self.assertEqual(count, len(SocketIOServer.default_server.engine_sockets))
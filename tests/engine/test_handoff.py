@@ -0,0 +1,96 @@
+from gevent.monkey import patch_all
+
+patch_all()
+
+import json
+import socket
+import shutil
+import tempfile
+from unittest import TestCase
+import gevent
+import requests
+from ws4py.client.geventclient import WebSocketClient
+from socketio.engine.handler import EngineHandler
+from socketio.engine.handoff import Handoff, HeadReader, send_message
+from socketio.engine.parser import Parser
+from socketio.engine.server import Server, EngineIOWSGIServer
+from tests import application
+
+
+class WorkerServer(EngineIOWSGIServer):
+    """
+    A worker with its own engine server, as after a fork
+    """
+
+    def __init__(self, context, *args, **kwargs):
+        super(WorkerServer, self).__init__(*args, **kwargs)
+        self.context = context
+
+    def handle(self, socket, address, rfile=None):
+        handler = EngineHandler(self.context, socket, address, self, rfile=rfile)
+        handler.handle()
+
+
+class HandoffTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.contexts = []
+        self.servers = []
+        for worker_id in range(2):
+            context = Server(transports=('polling', 'websocket'), worker_id=worker_id)
+            context.handoff = Handoff(self.directory, worker_id)
+            server = WorkerServer(context, ('127.0.0.1', 3051 + worker_id), application, log=None)
+            server.start()
+            context.handoff.start(server)
+            self.contexts.append(context)
+            self.servers.append(server)
+
+    def tearDown(self):
+        for context, server in zip(self.contexts, self.servers):
+            context.handoff.stop()
+            server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_head_reader(self):
+        class File(object):
+            closed = False
+
+            def read(self, size=-1):
+                return 'b' * size
+
+            def readline(self, size=-1):
+                return 'body\n'
+
+        reader = HeadReader('GET / HTTP/1.1\r\n\r\n', File())
+        self.assertEqual('GET / HTTP/1.1\r\n', reader.readline())
+        self.assertEqual('\r\n', reader.readline())
+        self.assertEqual('body\n', reader.readline())
+        self.assertEqual('bb', reader.read(2))
+
+    def test_upgrade_handed_off(self):
+        response = requests.get('http://127.0.0.1:3051/socket.io/?transport=polling')
+        packet = next(Parser.decode_payload(bytearray(response.content)))[0]
+        sid = json.loads(packet['data'])['sid']
+        self.assertTrue(sid.startswith('0.'))
+
+        received = []
+        client = WebSocketClient('ws://127.0.0.1:3052/socket.io/?transport=websocket&sid=%s' % sid)
+        client.connect()
+        client.send('2probe')
+        received.append(client.receive())
+        client.close()
+
+        self.assertEqual('3probe', str(received[0]))
+        self.assertEqual(0, len(self.contexts[1].engine_sockets))
+
+    def test_message_without_connection(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(5)
+        connection.connect(self.contexts[1].handoff.path(1))
+        send_message(connection, {'head': 'GET / HTTP/1.1\r\n\r\n', 'address': ['127.0.0.1', 1234]})
+
+        # Dropped without an ack, the receiver keeps accepting
+        self.assertEqual('', connection.recv(1))
+        connection.close()
+        response = requests.get('http://127.0.0.1:3052/socket.io/?transport=polling')
+        self.assertEqual(200, response.status_code)
@@ -0,0 +1,35 @@
+from unittest import TestCase
+from socketio.engine.metrics import MetricsRegistry
+from socketio.engine.server import Server
+
+
+class MetricsTest(TestCase):
+    def test_render(self):
+        metrics = MetricsRegistry()
+        packets = metrics.counter('packets_total', 'Packets', label='type')
+        latency = metrics.histogram('latency_seconds', 'Latency', buckets=(.1, 1))
+        metrics.gauge('open', 'Open things', lambda: 3)
+
+        packets.inc(label='message')
+        packets.inc(2, label='ping')
+        latency.observe(.05)
+        latency.observe(.5)
+        latency.observe(5)
+
+        lines = metrics.render().splitlines()
+        self.assertIn('# TYPE packets_total counter', lines)
+        self.assertIn('packets_total{type="message"} 1', lines)
+        self.assertIn('packets_total{type="ping"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count 3', lines)
+        self.assertIn('open 3', lines)
+
+    def test_engine_metrics(self):
+        context = Server(transports=('polling', 'websocket'))
+        context.metrics.handshakes.inc()
+        lines = context.metrics.render().splitlines()
+        self.assertIn('engineio_sockets 0', lines)
+        self.assertIn('engineio_sockets_by_transport{transport="websocket"} 0', lines)
+        self.assertIn('engineio_handshakes_total 1', lines)
@@ -0,0 +1,40 @@
+from gevent.monkey import patch_all
+
+patch_all()
+
+import time
+from unittest import TestCase
+import gevent
+from socketio.engine.metrics import MetricsRegistry
+from socketio.engine.monitor import HubMonitor, track
+
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class HubMonitorTest(TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+        self.monitor = HubMonitor(self.metrics, threshold=.05, lag_interval=.05)
+        self.monitor.start()
+
+    def tearDown(self):
+        self.monitor.stop()
+
+    def test_blocking_greenlet_reported(self):
+        gevent.spawn(busy, .3).join()
+        gevent.sleep(.1)
+
+        self.assertTrue(self.monitor.reports)
+        self.assertIn('busy', self.monitor.reports[-1][3])
+        self.assertIn('gevent_hub_blocked_total 1', self.metrics.render().splitlines())
+
+    def test_greenlets_by_origin(self):
+        jobs = [track(gevent.spawn(gevent.sleep, .05), 'sleeper') for _ in range(3)]
+        self.assertEqual(3, self.monitor.greenlets['sleeper'])
+        gevent.joinall(jobs)
+        gevent.sleep(0)
+        self.assertEqual(0, self.monitor.greenlets['sleeper'])
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+from unittest import TestCase
+import requests
+
+worker_script = """
+import os
+from socketio.engine.server import serve, Server
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ['%s:%s' % (Server.default_server.worker_id, os.getpid())]
+
+serve(application, host='127.0.0.1', port=3031, workers=2, reuse_port=True)
+"""
+
+
+class PreforkTest(TestCase):
+    script = worker_script
+
+    def setUp(self):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.master = subprocess.Popen([sys.executable, '-c', self.script], env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.url = 'http://127.0.0.1:3031/'
+
+    def tearDown(self):
+        if self.master.poll() is None:
+            self.master.terminate()
+            self.master.wait()
+
+    def workers(self, expected, timeout=10):
+        """
+        Request until every expected worker id answered, returns worker id -> pid
+        """
+        seen = {}
+        deadline = time.time() + timeout
+        while len(seen) < expected and time.time() < deadline:
+            try:
+                worker_id, pid = requests.get(self.url, timeout=1).text.split(':')
+                seen[int(worker_id)] = int(pid)
+            except requests.RequestException:
+                time.sleep(.1)
+        return seen
+
+    def test_restart_and_stop(self):
+        workers = self.workers(2)
+        self.assertEqual([0, 1], sorted(workers.keys()))
+
+        os.kill(workers[0], signal.SIGKILL)
+        time.sleep(1.5)
+        restarted = self.workers(2)
+        self.assertEqual([0, 1], sorted(restarted.keys()))
+        self.assertNotEqual(workers[0], restarted[0])
+        self.assertEqual(workers[1], restarted[1])
+
+        self.master.terminate()
+        self.master.wait()
+        time.sleep(.5)
+        for pid in restarted.values():
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+
+router_script = """
+from socketio.engine.server import serve
+from tests import application
+
+serve(application, host='127.0.0.1', port=3031, workers=2, router=True)
+"""
+
+
+class PreforkRouterTest(PreforkTest):
+    script = router_script
+
+    def test_restart_and_stop(self):
+        pass
+
+    def test_polling_through_router(self):
+        sids = []
+        deadline = time.time() + 10
+        while len(sids) < 4 and time.time() < deadline:
+            try:
+                response = requests.get(self.url + 'socket.io/?transport=polling', timeout=1)
+            except requests.RequestException:
+                time.sleep(.1)
+                continue
+            sids.append(response.cookies['io'])
+
+        self.assertEqual(4, len(sids))
+        self.assertEqual(set(['0', '1']), set(sid.split('.')[0] for sid in sids))
+
+        for sid in sids:
+            response = requests.post(self.url + 'socket.io/?transport=polling&sid=%s' % sid, data='1:6')
+            self.assertEqual('ok', response.text)
@@ -0,0 +1,94 @@
+from unittest import TestCase
+import time
+import gevent
+from collections import namedtuple
+from socketio.event_emitter import EventEmitter
+from socketio.engine.registry import SocketRegistry
+
+Transport = namedtuple('Transport', ['name'])
+
+
+class FakeSocket(EventEmitter):
+    STATE_CLOSED = 'CLOSED'
+
+    def __init__(self, sid):
+        super(FakeSocket, self).__init__()
+        self.id = sid
+        self.transport = Transport('polling')
+        self.ready_state = 'OPEN'
+        self.last_activity = time.time()
+
+    def set_state(self, state):
+        self.ready_state = state
+        self.emit('state', state)
+
+    def on_close(self, *args):
+        self.set_state(self.STATE_CLOSED)
+        self.emit('close')
+
+
+class SocketRegistryTest(TestCase):
+    def test_counts(self):
+        registry = SocketRegistry(sweep_interval=0)
+        sockets = [FakeSocket(str(i)) for i in range(10)]
+        for socket in sockets:
+            registry.add(socket)
+
+        self.assertEqual(10, len(registry))
+        self.assertEqual(10, registry.count_by_transport('polling'))
+
+        sockets[0].emit('upgrade', Transport('websocket'))
+        self.assertEqual(9, registry.count_by_transport('polling'))
+        self.assertEqual(1, registry.count_by_transport('websocket'))
+
+        sockets[1].on_close()
+        self.assertEqual(9, len(registry))
+        self.assertNotIn('1', registry)
+        self.assertEqual(9, registry.count_by_state('OPEN'))
+        self.assertEqual(0, registry.count_by_state('CLOSED'))
+
+        self.assertIs(sockets[2], registry['2'])
+        self.assertEqual(9, len(list(registry.itervalues())))
+
+    def test_sweep(self):
+        registry = SocketRegistry(shards=1, sweep_interval=0, stale_timeout=60)
+        leaked, stale, alive = FakeSocket('leaked'), FakeSocket('stale'), FakeSocket('alive')
+        for socket in (leaked, stale, alive):
+            registry.add(socket)
+
+        # Closed without emitting 'close'
+        leaked.transport = None
+        stale.last_activity = time.time() - 120
+
+        registry.sweep()
+        self.assertEqual(['alive'], registry.keys())
+        self.assertEqual('CLOSED', stale.ready_state)
+        self.assertEqual(1, len(registry))
+
+        # The close listener detached the registry from the stale socket once the emit returned
+        gevent.sleep(0)
+        self.assertEqual([], stale.listeners('close'))
+        self.assertEqual([], stale.listeners('state'))
+        self.assertEqual([], leaked.listeners('close'))
+
+    def test_close_runs_later_listeners(self):
+        registry = SocketRegistry(sweep_interval=0)
+        socket = FakeSocket('sid')
+        registry.add(socket)
+        closed = []
+        socket.on('close', lambda *args: closed.append(True))
+
+        socket.on_close()
+        self.assertEqual([True], closed)
+        gevent.sleep(0)
+        self.assertEqual(1, len(socket.listeners('close')))
+
+    def test_stop(self):
+        registry = SocketRegistry(sweep_interval=.01)
+        registry.add(FakeSocket('sid'))
+        sweeper = registry.sweeper
+        self.assertFalse(sweeper.dead)
+
+        registry.stop()
+        self.assertTrue(sweeper.dead)
+        self.assertIsNone(registry.sweeper)
@@ -0,0 +1,44 @@
+from unittest import TestCase
+from StringIO import StringIO
+from socketio.engine.request import Request, parse_query
+from socketio.engine.response import Response
+
+
+class RequestTest(TestCase):
+    def test_request(self):
+        request = Request({
+            'REQUEST_METHOD': 'POST',
+            'QUERY_STRING': 'transport=polling&sid=abc&b64=1',
+            'CONTENT_TYPE': 'application/octet-stream',
+            'CONTENT_LENGTH': '5',
+            'HTTP_ORIGIN': 'http://example.com',
+            'wsgi.input': StringIO('hello world'),
+        })
+
+        self.assertEqual('POST', request.method)
+        self.assertEqual({'transport': 'polling', 'sid': 'abc', 'b64': '1'}, request.GET)
+        self.assertEqual('application/octet-stream', request.headers.get('content-type'))
+        self.assertEqual('http://example.com', request.headers['Origin'])
+        self.assertTrue('origin' in request.headers)
+        self.assertFalse('upgrade' in request.headers)
+        self.assertEqual('hello', request.body)
+
+    def test_response_wsgi(self):
+        response = Response(headers=[('Content-Type', 'text/html')])
+        response.end(200, bytearray('ok'))
+
+        context = {}
+
+        def start_response(status, headers):
+            context['status'] = status
+            context['headers'] = headers
+
+        self.assertEqual(['ok'], response({}, start_response))
+        self.assertEqual('200 OK', context['status'])
+        self.assertEqual([('Content-Type', 'text/html'), ('Content-Length', '2')], context['headers'])
+
+    def test_parse_query(self):
+        self.assertEqual({}, parse_query(''))
+        self.assertEqual({'transport': 'polling', 'EIO': '3', 't': '1.79e+12'},
+                         parse_query('transport=polling&EIO=3&t=1.79e%2B12&b64='))
+        self.assertEqual({'a b': 'c d'}, parse_query('a+b=c%20d'))
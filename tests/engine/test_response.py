@@ -18,4 +18,10 @@ class ResponseTest(TestCase):
 
         self.assertRaises(Response.ResponseAlreadyEnded, response.end)
 
+    def test_join_ended(self):
+        response = Response()
+        response.end(status_code=200, body='hello')
 
+        # No waiting needed, so no event is created
+        self.assertTrue(response.join())
+        self.assertIsNone(response.event)
@@ -0,0 +1,57 @@
+from gevent.monkey import patch_all
+
+patch_all()
+
+from unittest import TestCase
+import gevent
+from gevent.pywsgi import WSGIServer
+import requests
+from socketio.engine.router import StickyRouter, rewrite_head
+from socketio.engine.prefork import bind
+
+
+def worker_application(worker_id):
+    def application(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return ['%d %s' % (worker_id, environ.get('QUERY_STRING', ''))]
+    return application
+
+
+class StickyRouterTest(TestCase):
+    def setUp(self):
+        self.servers = [WSGIServer(('127.0.0.1', 3041 + i), worker_application(i), log=None) for i in range(2)]
+        for server in self.servers:
+            server.start()
+        self.router = StickyRouter(bind(('127.0.0.1', 3040)), [('127.0.0.1', 3041), ('127.0.0.1', 3042)])
+        self.router.start()
+        self.url = 'http://127.0.0.1:3040/socket.io/'
+
+    def tearDown(self):
+        self.router.stop()
+        for server in self.servers:
+            server.stop()
+
+    def test_rewrite_head(self):
+        head = 'GET / HTTP/1.1\r\nHost: a\r\nConnection: keep-alive\r\nKeep-Alive: 5\r\n\r\n'
+        self.assertEqual('GET / HTTP/1.1\r\nHost: a\r\nConnection: close\r\n\r\n', rewrite_head(head))
+
+    def test_forwarded_for(self):
+        # What the client claims is replaced by the address the router sees
+        head = 'GET / HTTP/1.1\r\nX-Forwarded-For: 1.2.3.4\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\n'
+        self.assertEqual('GET / HTTP/1.1\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n'
+                         'X-Forwarded-For: 10.0.0.1\r\n\r\n', rewrite_head(head, '10.0.0.1', close=False))
+
+    def test_route_by_sid(self):
+        for worker_id in (1, 0, 1):
+            response = requests.get(self.url + '?transport=polling&sid=%d.abc' % worker_id)
+            self.assertEqual('%d transport=polling&sid=%d.abc' % (worker_id, worker_id), response.text)
+
+    def test_handshake_fewest_connections(self):
+        self.router.connections[0] = 3
+        response = requests.get(self.url + '?transport=polling')
+        self.assertTrue(response.text.startswith('1 '))
+
+        self.router.connections[0] = 0
+        self.router.connections[1] = 3
+        response = requests.post(self.url + '?transport=polling', data='x' * 100000)
+        self.assertTrue(response.text.startswith('0 '))
@@ -0,0 +1,21 @@
+from unittest import TestCase
+from socketio.engine.sid import SidGenerator, worker_of
+
+
+class SidTest(TestCase):
+    def test_unique(self):
+        generate = SidGenerator(batch=4)
+        ids = set(generate() for i in range(1000))
+        self.assertEqual(1000, len(ids))
+
+    def test_worker_id(self):
+        sid = SidGenerator(worker_id=7)()
+        self.assertTrue(sid.startswith('7.'))
+        self.assertEqual(7, worker_of(sid))
+
+    def test_no_worker_id(self):
+        sid = SidGenerator()()
+        self.assertEqual(20, len(sid))
+        self.assertIsNone(worker_of(sid))
+        self.assertIsNone(worker_of(None))
+        self.assertIsNone(worker_of('abc.def'))
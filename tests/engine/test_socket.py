@@ -0,0 +1,40 @@
+import logging
+from unittest import TestCase
+from collections import namedtuple
+from socketio.engine.socket import Socket, logger
+
+FakeSocket = namedtuple('FakeSocket', ['ready_state', 'id', 'transport', 'write_buffer', 'STATE_CLOSED'])
+Transport = namedtuple('Transport', ['writable'])
+
+
+class Exploding(object):
+    """
+    Fails the test when debug logging formats or evaluates it
+    """
+
+    def __str__(self):
+        raise AssertionError('formatted with debug logging off')
+
+    __repr__ = __unicode__ = __str__
+
+    def qsize(self):
+        raise AssertionError('evaluated with debug logging off')
+
+
+class DebugLoggingTest(TestCase):
+    def setUp(self):
+        self.level = logger.level
+        logger.setLevel(logging.INFO)
+        self.socket = FakeSocket('OPEN', 'sid', Transport(False), Exploding(), 'CLOSED')
+
+    def tearDown(self):
+        logger.setLevel(self.level)
+
+    def test_args_not_formatted(self):
+        Socket.debug.__func__(self.socket, 'Received packet: %s', Exploding())
+
+        logger.setLevel(logging.DEBUG)
+        self.assertRaises(AssertionError, Socket.debug.__func__, self.socket, 'Received packet: %s', Exploding())
+
+    def test_flush_args_not_evaluated(self):
+        Socket.flush.__func__(self.socket, nowait=True)
@@ -0,0 +1,116 @@
+from gevent.monkey import patch_all
+
+patch_all()
+
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+import gevent
+from gevent import socket
+from ws4py.client.geventclient import WebSocketClient
+from socketio.engine.handoff import MarkedReader, receive_message
+from socketio.engine.server import Server
+from socketio.engine.socket import PRIORITY_HIGH, PRIORITY_LOW
+from socketio.engine.takeover import Takeover, encode_packet, decode_packet
+from tests import application
+from tests.engine.test_handoff import WorkerServer
+
+
+class Context(Server):
+    def __init__(self, *args, **kwargs):
+        super(Context, self).__init__(*args, **kwargs)
+        self.resumed = []
+
+    def session_state(self, engine_socket):
+        return {'rooms': ['chat']}
+
+    def on_resume(self, engine_socket, state):
+        self.resumed.append(state)
+        # Queued behind the buffered high priority packet and ahead of the others, if their priorities were kept
+        engine_socket.write('resumed', PRIORITY_HIGH)
+        engine_socket.on('message', lambda data: engine_socket.write('new:' + data))
+
+
+class TakeoverTest(TestCase):
+    def test_packet_round_trip(self):
+        for packet in ({'type': 'message', 'data': u'h\xe9llo'},
+                       {'type': 'message', 'data': bytearray('\x00\xff')},
+                       {'type': 'ping', 'data': 'probe'},
+                       {'type': 'noop'}):
+            # As sent to the new process
+            message = json.loads(json.dumps(encode_packet(packet), encoding='latin-1'))
+            self.assertEqual(packet, decode_packet(message))
+
+    def test_marked_reader_pending(self):
+        left, right = socket.socketpair()
+        reader = MarkedReader(left, 'ab')
+        right.sendall('cdef')
+        gevent.sleep(0)
+
+        self.assertEqual('abc', reader.read(3))
+        reader.mark()
+        self.assertEqual('d', reader.read(1))
+        # A message cut in half is read again from its start by the new owner
+        self.assertEqual('def', reader.pending())
+        left.close()
+        right.close()
+
+    def test_websocket_handed_over(self):
+        directory = tempfile.mkdtemp()
+        old = Context(transports=('polling', 'websocket'), registry={'sweep_interval': 0})
+        old_server = WorkerServer(old, ('127.0.0.1', 3071), application, log=None)
+        old_server.start()
+        old_takeover = Takeover(os.path.join(directory, 'old.takeover'), old, timeout=1)
+        old_takeover.start(old_server)
+
+        client = WebSocketClient('ws://127.0.0.1:3071/socket.io/?transport=websocket')
+        client.connect()
+        self.assertEqual('0', str(client.receive())[0])
+
+        old_socket = old.engine_sockets.values()[0]
+        old_socket.on('message', lambda data: old_socket.write('old:' + data))
+        client.send('4hello')
+        self.assertEqual('4old:hello', str(client.receive()))
+
+        # Still buffered when the connection is handed over
+        old_socket.flush_window = 10 ** 7
+        old_socket.write('low', PRIORITY_LOW)
+        old_socket.write('normal')
+        old_socket.write('high', PRIORITY_HIGH)
+
+        # The new process' side of the takeover connection, as Takeover.take leaves it
+        left, right = socket.socketpair()
+        giver = gevent.spawn(old_takeover.give, left, None)
+        message, fd = receive_message(right)
+        self.assertEqual(socket.AF_INET, message['family'])
+        try:
+            listener = socket.fromfd(fd, message['family'], socket.SOCK_STREAM)
+        finally:
+            os.close(fd)
+        listener.setblocking(0)
+
+        new = Context(transports=('polling', 'websocket'), registry={'sweep_interval': 0})
+        new_server = WorkerServer(new, listener, application, log=None)
+        new_takeover = Takeover(os.path.join(directory, 'new.takeover'), new, timeout=1)
+        new_takeover.connection = right
+        new_takeover.start(new_server)
+        new_server.start()
+        try:
+            giver.join(5)
+            self.assertEqual(['4high', '4resumed', '4normal', '4low'], [str(client.receive()) for _ in range(4)])
+
+            client.send('4again')
+            self.assertEqual('4new:again', str(client.receive()))
+            self.assertEqual([old_socket.id], new.engine_sockets.keys())
+            self.assertEqual([{'rooms': ['chat']}], new.resumed)
+            self.assertEqual(0, len(old.engine_sockets))
+        finally:
+            client.close()
+            left.close()
+            new_takeover.receiver.stop()
+            new_server.stop()
+            old_takeover.receiver.stop()
+            old_server.stop()
+            shutil.rmtree(directory)
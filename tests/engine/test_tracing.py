@@ -0,0 +1,54 @@
+from unittest import TestCase
+import gevent
+from socketio.engine import tracing
+from socketio.engine.tracing import Tracer, Collector
+
+
+class TracingTest(TestCase):
+    def setUp(self):
+        self.collector = Collector()
+        self.tracer = Tracer(sample_rate=1, exporter=self.collector)
+        self.tracer.start()
+
+    def tearDown(self):
+        self.tracer.stop()
+
+    def test_span_waits_for_sent_packets(self):
+        span = tracing.begin('websocket')
+        tracing.stage('engine_decoded', 'sid')
+        tracing.current().queued()
+        tracing.end(span)
+        self.assertEqual(0, len(self.collector.spans))
+
+        span.sent(1)
+        exported = self.collector.spans[0]
+        self.assertEqual('sid', exported['sid'])
+        self.assertEqual('ok', exported['status'])
+        self.assertEqual(['received', 'engine_decoded', 'queued', 'processed', 'sent'],
+                         [name for name, at in exported['stages']])
+        self.assertIsNone(tracing.current())
+
+    def test_dropped_packets_finish_span(self):
+        span = tracing.begin('polling')
+        tracing.current().queued()
+        tracing.current().queued()
+        tracing.end(span)
+
+        span.sent(1)
+        self.assertEqual(0, len(self.collector.spans))
+        span.dropped(1)
+        exported = self.collector.spans[0]
+        self.assertEqual('dropped', exported['status'])
+        self.assertEqual('dropped', exported['stages'][-1][0])
+
+    def test_not_sampled(self):
+        self.tracer.sample_rate = 0
+        self.assertIsNone(tracing.begin('polling'))
+        tracing.stage('handler')
+        tracing.end(None)
+        self.assertEqual(0, len(self.collector.spans))
+
+    def test_disabled(self):
+        self.tracer.stop()
+        self.assertIsNone(tracing.begin('polling'))
+        self.assertIsNone(tracing.current())
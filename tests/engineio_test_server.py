@@ -1,7 +1,7 @@
 from unittest import TestCase
 import gevent
 import sys
-from socketio.engine.server import serve
+from socketio.engine.server import serve, Server
 from tests import application
 import logging
 
@@ -21,6 +21,10 @@ class EngineIOServerBaseTest(TestCase):
         self.jobs = []
         super(EngineIOServerBaseTest, self).__init__(*args, **kwarg)
 
+    @property
+    def server(self):
+        return Server.default_server
+
     def start_server(self):
         self.spawn(serve, application, host=self.host, port=self.port)
 
@@ -33,6 +37,11 @@ class EngineIOServerBaseTest(TestCase):
     def tearDown(self):
         print "Killing [%d] jobs" % len(self.jobs)
         gevent.killall(self.jobs)
+
+        # Sockets left open by the test would show up in the next one
+        for socket in self.server.engine_sockets.values():
+            socket.on_close('test finished')
+        self.server.engine_sockets.stop()
         gevent.sleep(.5)
 
     def spawn(self, *args, **kwargs):
@@ -1,9 +1,13 @@
-from socketio.server import serve
+from socketio.server import serve, SocketIOServer
 from tests.engineio_test_server import EngineIOServerBaseTest
 from tests import application
 
 
 class SocketIOServerBaseTest(EngineIOServerBaseTest):
 
+    @property
+    def server(self):
+        return SocketIOServer.default_server
+
     def start_server(self):
         self.spawn(serve, application, host=self.host, port=self.port)
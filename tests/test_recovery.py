@@ -0,0 +1,180 @@
+from unittest import TestCase
+import json
+import time
+from socketio.recovery import RecoveryStore
+from socketio.server import SocketIOServer
+from socketio.client import Client
+from socketio.event_emitter import EventEmitter
+from socketio.engine.socket import Socket as EngineSocket
+import socketio.parser as SocketIOParser
+
+
+class RecoveryStoreTest(TestCase):
+    def test_replay_missed(self):
+        store = RecoveryStore(max_packets=10, max_age=60)
+        session = store.session('sid1')
+        session.record(['2["message","a"]'])
+        session.record(['2["message","b"]'])
+
+        store.detach(session.pid, {'/': ['sid1', 'chat'], '/other': ['sid1']})
+
+        # Broadcast while the client is away
+        store.capture('/', ['chat'], ['2["message","c"]'])
+        store.capture('/', ['lobby'], ['2["message","d"]'])
+        store.capture('/other', [], ['2/other,["message","e"]'])
+
+        rooms, missed = store.restore(session.pid, 1)
+        self.assertEqual(['chat'], rooms['/'])
+        self.assertEqual([['2["message","b"]'], ['2["message","c"]'], ['2/other,["message","e"]']], missed)
+
+        # The session is taken over, it can not be recovered twice
+        self.assertIsNone(store.restore(session.pid, 1))
+        self.assertEqual({}, store.detached['/'])
+
+    def test_sid_not_accepted(self):
+        store = RecoveryStore(max_packets=10, max_age=60)
+        session = store.session('sid1')
+        store.detach(session.pid, {'/': ['sid1']})
+
+        self.assertNotEqual('sid1', session.pid)
+        self.assertIsNone(store.restore('sid1', 0))
+        self.assertIsNotNone(store.restore(session.pid, 0))
+
+    def test_gap_not_covered(self):
+        store = RecoveryStore(max_packets=2, max_age=60)
+        session = store.session('sid1')
+        for i in range(3):
+            session.record(['2["message",%d]' % i])
+        store.detach(session.pid, {'/': ['sid1']})
+
+        self.assertIsNone(store.restore(session.pid, 0))
+
+    def test_broadcast_exceptions_not_captured(self):
+        store = RecoveryStore(max_packets=10, max_age=60)
+        session = store.session('sid1')
+        store.detach(session.pid, {'/': ['sid1', 'chat']})
+
+        store.capture('/', ['chat'], ['2["message","a"]'], exceptions=['sid1'])
+
+        rooms, missed = store.restore(session.pid, 0)
+        self.assertEqual([], missed)
+
+    def test_purged_on_capture(self):
+        store = RecoveryStore(max_packets=10, max_age=60)
+        session = store.session('sid1')
+        store.detach(session.pid, {'/': ['sid1']})
+        session.expires_at = time.time() - 1
+        store.next_purge = 0
+
+        store.capture('/', [], ['2["message","a"]'])
+        self.assertNotIn(session.pid, store.sessions)
+        self.assertEqual({}, store.detached['/'])
+
+    def test_expired(self):
+        store = RecoveryStore(max_packets=10, max_age=60)
+        session = store.session('sid1')
+        store.detach(session.pid, {'/': ['sid1']})
+        session.expires_at = time.time() - 1
+
+        self.assertIsNone(store.restore(session.pid, 0))
+        self.assertNotIn(session.pid, store.sessions)
+
+    def test_live_session_not_restored(self):
+        store = RecoveryStore()
+        session = store.session('sid1')
+        self.assertIsNone(store.restore(session.pid, 0))
+
+
+class FakeRequest(object):
+    def __init__(self, GET):
+        self.GET = GET
+
+
+class FakeEngineSocket(EventEmitter):
+    def __init__(self, sid, GET=None):
+        super(FakeEngineSocket, self).__init__()
+        self.id = sid
+        self.request = FakeRequest(GET or {})
+        self.ready_state = EngineSocket.STATE_OPEN
+        self.written = []
+
+    def write(self, data, priority=None):
+        self.written.append(data)
+
+    def close(self):
+        self.ready_state = EngineSocket.STATE_CLOSED
+
+
+def decode(written):
+    return [(int(data[0]), json.loads(data[1:]) if len(data) > 1 else None) for data in written]
+
+
+class ClientRecoveryTest(TestCase):
+    def setUp(self):
+        self.server = SocketIOServer(recovery={'max_packets': 10, 'max_age': 60}, registry={'sweep_interval': 0})
+        self.adapter = self.server.of('/').adapter
+
+    def connect(self, engine_socket):
+        client = Client(self.server, engine_socket)
+        client.connect('/')
+        client.recover()
+        return client
+
+    def broadcast(self, message, rooms=(), exceptions=()):
+        self.adapter.broadcast({'type': SocketIOParser.EVENT, 'data': ['message', message]},
+                               {'rooms': list(rooms), 'except': list(exceptions), 'flags': set()})
+
+    def test_missed_broadcasts_replayed(self):
+        first = FakeEngineSocket('sid1')
+        client = self.connect(first)
+        client.namespace_socket['/'].join('chat')
+        other = self.connect(FakeEngineSocket('sid2'))
+        other.namespace_socket['/'].join('chat')
+
+        self.broadcast('a', ['chat'])
+        self.broadcast('b')
+        pid = client.session.pid
+        self.assertEqual([(SocketIOParser.CONNECT, {'pid': pid}),
+                          (SocketIOParser.EVENT, ['message', 'a']),
+                          (SocketIOParser.EVENT, ['message', 'b'])], decode(first.written))
+
+        # The transport drops, the client received a only
+        first.ready_state = EngineSocket.STATE_CLOSED
+        first.emit('close', 'transport close')
+        self.assertNotIn('sid1', self.adapter.rooms.get('chat', {}))
+
+        # Broadcast while the client is away, sid2's own broadcast excludes sid2 only
+        other.namespace_socket['/'].to('chat').emit('message', 'c')
+        self.broadcast('d', ['lobby'])
+        self.broadcast('e', ['chat'], exceptions=['sid1'])
+        self.broadcast('f')
+
+        second = FakeEngineSocket('sid3', {'pid': pid, 'offset': '1'})
+        client = self.connect(second)
+
+        self.assertEqual([(SocketIOParser.CONNECT, {'pid': client.session.pid}),
+                          (SocketIOParser.EVENT, ['message', 'b']),
+                          (SocketIOParser.EVENT, ['message', 'c']),
+                          (SocketIOParser.EVENT, ['message', 'f'])], decode(second.written))
+        self.assertIn('chat', client.namespace_socket['/'].rooms)
+        self.assertIn('sid3', self.adapter.rooms['chat'])
+        # The new session counts the replayed events, as the client does
+        self.assertEqual(3, client.session.offset)
+        self.assertNotIn(pid, self.server.recovery.sessions)
+
+    def test_old_sid_not_restored(self):
+        first = FakeEngineSocket('sid1')
+        client = self.connect(first)
+        client.namespace_socket['/'].join('chat')
+        first.ready_state = EngineSocket.STATE_CLOSED
+        first.emit('close', 'transport close')
+
+        self.broadcast('a', ['chat'])
+
+        # Knowing the sid, which is public, is not enough to take the session over
+        second = FakeEngineSocket('sid2', {'pid': 'sid1', 'offset': '0'})
+        other = self.connect(second)
+
+        self.assertEqual([(SocketIOParser.CONNECT, {'pid': other.session.pid})], decode(second.written))
+        self.assertNotIn('chat', other.namespace_socket['/'].rooms)
+        self.assertIn(client.session.pid, self.server.recovery.sessions)
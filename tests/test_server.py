@@ -55,3 +55,23 @@ class ServerTest(SocketIOServerBaseTest):
         self.assertEqual(response.content, 'ok')
 
         self.assertEqual(result['packet'], 'hello')
+
+    def test_introspection(self):
+        gevent.sleep(0.5)
+        server = SocketIOServer.default_server
+        server.namespaces['/'].on('connection', lambda socket: socket.join('lobby'))
+
+        response = requests.get(self.root_url + '?transport=polling')
+        packet = next(EngineParser.decode_payload(bytearray(response.content)))[0]
+        sid = json.loads(packet['data'])['sid']
+
+        root = [namespace for namespace in server.describe_namespaces() if namespace['name'] == '/'][0]
+        self.assertTrue(root['sockets'] >= 1)
+        self.assertIn(('lobby', 1), server.describe_rooms('/'))
+        self.assertIsNone(server.describe_rooms('/missing'))
+
+        details = server.describe_socket(sid)
+        self.assertEqual('polling', details['transport'])
+        self.assertTrue(details['packets_sent'] >= 1)
+        self.assertIn('lobby', details['namespaces']['/']['rooms'])
+        self.assertEqual(0, details['namespaces']['/']['pending_acks'])